@@ -7,4 +7,11 @@ ENDPOINT = ""
 SSID = ""
 PSK = ""
 
+# Optionally, a fixed (ip, netmask, gateway, dns) for the clock, so it can
+# reconnect without waiting on DHCP.
+# IFCONFIG = ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+# Or, without one, how long your router's DHCP leases last, in seconds, so
+# the last one can be reused when reconnecting within half that time.
+# LEASE_S = 86400
+
 COUNTRY = "GB"  # Change to your local two-letter ISO 3166-1 country code
@@ -0,0 +1,1494 @@
+"""Rough benchmarks for the clock's data handling.
+
+Runs under CPython or the MicroPython unix port, from the repo root:
+
+    python benchmark.py [--json results.json]
+    micropython benchmark.py [--json results.json]
+
+Memory is measured with tracemalloc on CPython, and as the drop in
+gc.mem_free() with the collector disabled on MicroPython.
+
+With --json, every result is also written to a file, tagged with the
+runtime and commit. Compare two such files, e.g. from before and after a
+change, with:
+
+    python benchmark.py --compare before.json after.json
+"""
+
+import gc
+import io
+import json
+import sys
+import time
+
+import random
+
+from departures import DepartureTable, iter_departures
+from colour import Colour, to8
+from compositor import ADD, MAX, NORMAL, Compositor, Layer
+from effects import EMITTER, Drops, Pulse, Sparkle
+from framebuffer import FrameBuffer
+from positions import PositionTable
+from isotime import iso_to_epoch
+from scheduler import PollScheduler
+import http_client
+from timesource import ServerClock
+from governor import RequestGovernor
+
+try:
+    import uasyncio
+except ImportError:
+    import asyncio as uasyncio
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    # Only needed for the network benchmarks and for loading main.py off the
+    # board, which run on CPython.
+    import emulator
+    from emulator.server import StandInServer
+except ImportError:
+    emulator = None
+    StandInServer = None
+
+DATA_DIR = "example data"
+TIMES_FILE = DATA_DIR + "/times.json"
+
+# Synthetic feed sizes, in train records.
+FEED_SIZES = (4, 20, 200, 2000)
+REPEATS = 20
+ROUNDS = 3
+
+# Every result so far, for --json: dicts of benchmark, case and metrics.
+RESULTS = []
+
+
+def ticks_us():
+    # perf_counter first: the emulator replaces ticks_us() with simulated time.
+    if hasattr(time, "perf_counter"):
+        return int(time.perf_counter() * 1000000)
+    return time.ticks_us()
+
+
+def ticks_diff(end, start):
+    if not hasattr(time, "perf_counter"):
+        return time.ticks_diff(end, start)
+    return end - start
+
+
+def measure(fn, repeats=REPEATS):
+    """Return (mean time per call in us, peak bytes allocated by one call).
+
+    The time is the best of ROUNDS runs of `repeats` calls, which steadies it
+    enough to compare between commits.
+    """
+
+    elapsed = None
+    for _ in range(ROUNDS):
+        start = ticks_us()
+        for _ in range(repeats):
+            fn()
+        mean = ticks_diff(ticks_us(), start) / repeats
+        if elapsed is None or mean < elapsed:
+            elapsed = mean
+
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else:
+        # No peak tracking on MicroPython; with gc off, the drop in free
+        # memory is the total allocated, which is an upper bound.
+        gc.disable()
+        before = gc.mem_free()
+        fn()
+        peak = before - gc.mem_free()
+        gc.enable()
+    return elapsed, peak
+
+
+def profile(fn, repeats=REPEATS):
+    """Return (mean us per call, peak heap, bytes allocated) for fn().
+
+    Bytes allocated are the total allocated by one call, which is what drives
+    the collector on MicroPython. CPython doesn't track that, so it's None
+    there and only the peak is known.
+    """
+
+    elapsed, peak = measure(fn, repeats)
+    # With gc off, MicroPython's measure() peak is in fact the total allocated.
+    return elapsed, peak, None if tracemalloc is not None else peak
+
+
+def record(benchmark, case, **metrics):
+    """Keep a result for --json. Metrics should all be lower-is-better."""
+
+    result = {"benchmark": benchmark, "case": case}
+    result.update(metrics)
+    RESULTS.append(result)
+
+
+def retained(fn):
+    """Return (result of fn(), bytes still allocated while it's held)."""
+
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+        result = fn()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    else:
+        before = gc.mem_free()
+        result = fn()
+        gc.collect()
+        size = before - gc.mem_free()
+    return result, size
+
+
+def synthetic_feed(records):
+    """Build a /api/times body with the given number of train records."""
+
+    with open(TIMES_FILE) as f:
+        sample = json.load(f)
+    feed = [sample[i % len(sample)] for i in range(records)]
+    return json.dumps(feed).encode()
+
+
+def parse_json(body):
+    """The original approach: materialise the whole payload then walk it."""
+
+    count = 0
+    for train in json.loads(body):
+        train["actualPredictedTime"]
+        count += 1
+    return count
+
+
+def parse_stream(body):
+    count = 0
+    for _ in iter_departures(io.BytesIO(body)):
+        count += 1
+    return count
+
+
+def bench_parse():
+    print("== /api/times parsing: json.loads vs iter_departures ==")
+    with open(TIMES_FILE, "rb") as f:
+        feeds = [("times.json", f.read())]
+    for size in FEED_SIZES:
+        feeds.append((f"synthetic x{size}", synthetic_feed(size)))
+
+    for name, body in feeds:
+        before_us, before_peak = measure(lambda: parse_json(body))
+        after_us, after_peak = measure(lambda: parse_stream(body))
+        print(f"{name:>16} ({len(body)} bytes): "
+              f"json {before_us:.0f} us / {before_peak} B peak, "
+              f"stream {after_us:.0f} us / {after_peak} B peak")
+        record("parse", name + " json", us=before_us, peak_bytes=before_peak)
+        record("parse", name + " stream", us=after_us, peak_bytes=after_peak)
+
+
+def bench_departure_memory():
+    print("== Memory held by a parsed departures model ==")
+    for size in (4, 20, 200):
+        body = synthetic_feed(size)
+        trains = list(iter_departures(io.BytesIO(body)))
+
+        def as_objects():
+            table = DepartureTable()
+            for train in trains:
+                table.add(train)
+            return [departure for departure in table]
+
+        def as_table():
+            table = DepartureTable()
+            for train in trains:
+                table.add(train)
+            return table
+
+        # Warm up, so interning the strings isn't counted against one layout.
+        as_objects()
+        _, dicts = retained(lambda: json.loads(body))
+        _, objects = retained(as_objects)
+        _, table = retained(as_table)
+        print(f"{size:>4} records: dicts {dicts} B, Departure objects {objects} B, DepartureTable {table} B")
+        record("departure_memory", f"{size} records", dicts_bytes=dicts, objects_bytes=objects, table_bytes=table)
+
+
+def split_timestamp(timestamp):
+    """The original decoder: split into parts, then time.mktime()."""
+
+    date_part, time_part = timestamp.split("T")
+    year, month, day = map(int, date_part.split("-"))
+    time_part = time_part.split(".")[0]
+    hour, minute, second = map(int, time_part.split(":"))
+    return time.mktime((year, month, day, hour, minute, second, 0, 0, 0))
+
+
+def bench_timestamps(count=1000):
+    print("== Timestamp decoding: split + mktime vs iso_to_epoch ==")
+    timestamp = "2025-01-04T08:50:28.0000000+00:00"
+    for name, decode in (("split", split_timestamp), ("iso_to_epoch", iso_to_epoch)):
+        def run():
+            for _ in range(count):
+                decode(timestamp)
+        elapsed, allocated = measure(run, repeats=5)
+        # measure() gives the total allocated on MicroPython, which is what
+        # matters for GC pressure, but only peak live bytes on CPython.
+        print(f"{name:>13}: {elapsed / count:.2f} us, {allocated / count:.1f} B per timestamp")
+        record("timestamps", name, us=elapsed / count, peak_bytes=allocated / count)
+
+
+def synthetic_day(seed=1, headway=720, start=5 * 3600 + 1800, end=24 * 3600):
+    """A day of arrivals at one platform, in seconds since midnight.
+
+    Trains nominally every `headway` seconds, each running up to five minutes
+    late, with the odd cancellation leaving a longer gap.
+    """
+
+    random.seed(seed)
+    arrivals = []
+    t = start
+    while t < end:
+        if random.random() > 0.05:
+            arrivals.append(t + random.randrange(0, 300))
+        t += headway
+    return sorted(arrivals)
+
+
+def replay_polling(arrivals, next_delay, sample=10):
+    """Replay a day of polls against recorded arrivals.
+
+    Args:
+        arrivals: Arrival times, from synthetic_day().
+        next_delay: Function taking the waits (in seconds) seen by a poll
+            and returning the delay before the next one.
+        sample: Seconds between staleness samples.
+
+    Returns:
+        Tuple of (polls, mean data age, mean data age with a train within five
+        minutes), ages in seconds.
+    """
+
+    start, end = arrivals[0] - 3600, arrivals[-1]
+    polls = 0
+    t = start
+    next_poll = start
+    fetched = start
+    ages = []
+    close_ages = []
+    upcoming = 0
+    while t < end:
+        if t >= next_poll:
+            polls += 1
+            fetched = t
+            waits = [a - t for a in arrivals if 0 <= a - t < 3600]
+            next_poll = t + next_delay(waits)
+        while upcoming < len(arrivals) and arrivals[upcoming] < t:
+            upcoming += 1
+        ages.append(t - fetched)
+        if upcoming < len(arrivals) and arrivals[upcoming] - t < 300:
+            close_ages.append(t - fetched)
+        t += sample
+    return polls, sum(ages) / len(ages), sum(close_ages) / len(close_ages)
+
+
+def bench_polling():
+    print("== Polling over a replayed day: fixed 120 s vs PollScheduler ==")
+    arrivals = synthetic_day()
+    scheduler = PollScheduler()
+    for name, next_delay in (("fixed", lambda waits: 120), ("adaptive", scheduler.success)):
+        polls, age, close_age = replay_polling(arrivals, next_delay)
+        print(f"{name:>9}: {polls} requests, data age mean {age:.0f} s, "
+              f"{close_age:.0f} s with a train under 5 min away")
+        record("polling", name, requests=polls, age_s=age, close_age_s=close_age)
+    print(f"scheduler: {scheduler.report()}")
+
+
+def bench_connections(requests=20):
+    print("== /api/times over TLS: cold vs kept-alive connections ==")
+    with StandInServer(use_tls=True) as server:
+        cold = []
+        for _ in range(requests):
+            client = server.client()
+            start = ticks_us()
+            response = client.get("/api/times/WTL/1")
+            response.content
+            response.close()
+            cold.append(ticks_diff(ticks_us(), start))
+            client.close()
+
+        client = server.client()
+        warm = []
+        for _ in range(requests):
+            start = ticks_us()
+            response = client.get("/api/times/WTL/1")
+            response.content
+            response.close()
+            warm.append(ticks_diff(ticks_us(), start))
+        # The first request on the shared client pays for the handshake.
+        warm = warm[1:]
+        client.close()
+
+    print(f"cold: {sum(cold) / len(cold):.0f} us/request, {len(cold)} connects")
+    print(f"warm: {sum(warm) / len(warm):.0f} us/request, {client.connects} connect")
+    record("connections", "cold", us=sum(cold) / len(cold))
+    record("connections", "warm", us=sum(warm) / len(warm))
+
+
+def bench_refcache(boots=10):
+    import os
+    import tempfile
+
+    import metro_api
+
+    print("== Station mapping at boot, over TLS: nothing on flash vs the cached copy ==")
+    cwd = os.getcwd()
+    saved = metro_api.client, metro_api.governor
+    timings = {"cold": [], "warm": []}
+    with StandInServer(use_tls=True) as server, tempfile.TemporaryDirectory() as tmp:
+        # The cache's file is relative to where the clock runs from.
+        os.chdir(tmp)
+        metro_api.client = server.client()
+        try:
+            for _ in range(boots):
+                for name in ("cold", "warm"):
+                    # Each boot starts with a fresh budget, as on the board.
+                    metro_api.governor = RequestGovernor()
+                    if name == "cold" and os.path.exists("ref_stations.json"):
+                        os.remove("ref_stations.json")
+                    # As after a reboot: nothing in memory, and no connection.
+                    metro_api.stations_cache._entry = None
+                    metro_api.client.close()
+                    start = ticks_us()
+                    metro_api.get_station_mapping()
+                    timings[name].append(ticks_diff(ticks_us(), start))
+        finally:
+            metro_api.client.close()
+            metro_api.client, metro_api.governor = saved
+            os.chdir(cwd)
+    for name, elapsed in timings.items():
+        mean = sum(elapsed) / len(elapsed)
+        print(f"{name}: {mean / 1000:.1f} ms")
+        record("refcache", name, us=mean)
+    print(f"{server.requests} requests for {boots} boots of each")
+
+
+def _frame_stats(intervals):
+    """Return (mean, p99, max) of frame intervals, in us."""
+
+    intervals = sorted(intervals)
+    mean = sum(intervals) / len(intervals)
+    p99 = intervals[int(len(intervals) * 0.99)]
+    return mean, p99, intervals[-1]
+
+
+async def _render_while_fetching(fetch, fps=60, seconds=2.0):
+    """Tick a 'render' loop at fps while fetch() runs; return frame intervals."""
+
+    intervals = []
+    done = []
+
+    async def fetcher():
+        while not done:
+            await fetch()
+            # A blocking fetch never yields on its own.
+            await uasyncio.sleep(0)
+
+    task = uasyncio.create_task(fetcher())
+    frame_s = 1 / fps
+    start = last = ticks_us()
+    while ticks_diff(last, start) < seconds * 1000000:
+        await uasyncio.sleep(frame_s)
+        now = ticks_us()
+        intervals.append(ticks_diff(now, last))
+        last = now
+    done.append(True)
+    await task
+    return intervals
+
+
+def bench_pipeline(delay=0.25):
+    print(f"== 60 fps frame timing while fetching from a server with {delay * 1000:.0f} ms latency ==")
+    with StandInServer(delay=delay) as server:
+        blocking = server.client()
+
+        async def fetch_blocking():
+            response = blocking.get("/api/times/WTL/1")
+            response.content
+            response.close()
+
+        non_blocking = server.async_client()
+
+        async def fetch_async():
+            response = await non_blocking.get("/api/times/WTL/1")
+            await response.content()
+            await response.close()
+
+        async def idle():
+            await uasyncio.sleep(0.1)
+
+        for name, fetch in (("no fetch", idle), ("blocking", fetch_blocking), ("async", fetch_async)):
+            intervals = uasyncio.run(_render_while_fetching(fetch))
+            mean, p99, worst = _frame_stats(intervals)
+            print(f"{name:>9}: mean {mean / 1000:.1f} ms, p99 {p99 / 1000:.1f} ms, max {worst / 1000:.1f} ms")
+            record("pipeline", name, frame_us=mean, frame_p99_us=p99, frame_max_us=worst)
+        blocking.close()
+
+
+def bench_subscriptions():
+    import metro_api
+
+    print("== Fetching N platforms: sequential vs concurrent ==")
+
+    def latency(path):
+        # 100 ms plus 25 ms per platform number, so endpoints differ.
+        return 0.1 + 0.025 * int(path.rsplit("/", 1)[1])
+
+    async def run_all():
+        for count in (1, 2, 4, 8):
+            subscriptions = [("WTL", platform) for platform in range(1, count + 1)]
+            slowest = max(latency(f"/{platform}") for _, platform in subscriptions)
+            line = f"{count} platforms (slowest {slowest * 1000:.0f} ms):"
+            for concurrency in (1, count):
+                # Budgeted as main.py does, for this many platforms polled
+                # every 30 s at the fastest.
+                metro_api.governor = RequestGovernor()
+                metro_api.governor.size(count, 30)
+                start = ticks_us()
+                departures, errors = await metro_api.fetch_subscriptions(subscriptions, concurrency)
+                elapsed = ticks_diff(ticks_us(), start) / 1000
+                line += f" concurrency {concurrency}: {elapsed:.0f} ms,"
+                record("subscriptions", f"{count} platforms concurrency {concurrency}", ms=elapsed)
+            print(line.rstrip(","))
+        for client in metro_api.async_clients:
+            await client.close()
+
+    with StandInServer(delay=latency) as server:
+        saved = metro_api.async_clients, metro_api.server_clock, metro_api.governor
+        metro_api.async_clients = [server.async_client() for _ in range(8)]
+        # Readings of the server's clock taken here are in real time, not
+        # the emulator's, so keep them out of later runs.
+        metro_api.server_clock = ServerClock()
+        uasyncio.run(run_all())
+        metro_api.async_clients, metro_api.server_clock, metro_api.governor = saved
+
+
+class CountingStrip:
+    """Stands in for plasma.WS2812, counting the native calls made to it."""
+
+    def __init__(self, num_leds):
+        self.num_leds = num_leds
+        self.calls = 0
+
+    def set_rgb(self, index, r, g, b):
+        self.calls += 1
+
+    def set_hsv(self, index, h, s=1.0, v=1.0):
+        self.calls += 1
+
+
+def bench_framebuffer(frames=10):
+    print("== Drawing a frame: every pixel to the strip vs FrameBuffer ==")
+    red = (0, 1.0, 0.5)
+    for num_leds in (96, 144, 300):
+        for lit in (0, 4, 20):
+            for moving in (False, True):
+                # Evenly spread trains, each moving one LED per frame if moving.
+                sequence = [
+                    [(j * num_leds // lit + (k if moving else 0)) % num_leds for j in range(lit)]
+                    for k in range(frames)
+                ]
+
+                strip = CountingStrip(num_leds)
+
+                def direct():
+                    for positions in sequence:
+                        for i in range(num_leds):
+                            if i not in positions:
+                                strip.set_rgb(i, 0, 0, 0)
+                            else:
+                                strip.set_hsv(i, *red)
+
+                framebuffer = FrameBuffer(num_leds)
+                buffered_strip = CountingStrip(num_leds)
+                framebuffer.show(buffered_strip)
+
+                def buffered():
+                    for positions in sequence:
+                        framebuffer.clear()
+                        for position in positions:
+                            framebuffer.set_hsv(position, *red)
+                        framebuffer.show(buffered_strip)
+
+                case = f"{num_leds} LEDs {lit} lit {'moving' if moving else 'still'}"
+                line = f"{case:>25}:"
+                for name, fn, counter in (("direct", direct, strip), ("framebuffer", buffered, buffered_strip)):
+                    calls = counter.calls
+                    elapsed, peak = measure(fn)
+                    frame_calls = (counter.calls - calls) / ((ROUNDS * REPEATS + 1) * frames)
+                    line += f" {name} {elapsed / frames:.0f} us / {frame_calls:.0f} calls,"
+                    record("framebuffer", f"{case} {name}", us=elapsed / frames, strip_calls=frame_calls)
+                print(line.rstrip(","))
+
+
+def load_main():
+    """Import main.py, through the emulator's hardware fakes off the board.
+
+    Returns None if neither the board's modules nor the emulator are here.
+    """
+
+    try:
+        import main
+        return main
+    except ImportError:
+        if emulator is None:
+            return None
+    emulator.install()
+    try:
+        import main
+    finally:
+        # main keeps its fake strip; put real time and the real loop back.
+        emulator.uninstall()
+    return main
+
+
+class _Discard:
+    def write(self, text):
+        return len(text)
+
+
+def quiet(fn):
+    """Wrap fn so its print() output is thrown away, where the runtime allows.
+
+    The cost of formatting the output is still counted.
+    """
+
+    try:
+        from contextlib import redirect_stdout
+    except ImportError:
+        return fn
+
+    sink = _Discard()
+
+    def run():
+        with redirect_stdout(sink):
+            return fn()
+
+    return run
+
+
+def parse_table(body):
+    table = DepartureTable()
+    for train in iter_departures(io.BytesIO(body)):
+        table.add(train)
+    table.sort()
+    return table
+
+
+class PixelStrip(CountingStrip):
+    """A CountingStrip that also keeps what it's sent."""
+
+    def __init__(self, num_leds):
+        super().__init__(num_leds)
+        self.pixels = bytearray(num_leds * 3)
+
+    def set_rgb(self, index, r, g, b):
+        self.calls += 1
+        self.pixels[index * 3] = r
+        self.pixels[index * 3 + 1] = g
+        self.pixels[index * 3 + 2] = b
+
+
+def bench_power(num_leds=96, budget=400):
+    print(f"== Power budget, {num_leds} LEDs at {budget} mA: show() time with and without a limit ==")
+    strip = PixelStrip(num_leds)
+
+    def frames(budget, fill):
+        framebuffer = FrameBuffer(num_leds, budget)
+        framebuffer.fill(*fill)
+        framebuffer.show(strip)
+        flip = [0]
+
+        def frame():
+            # One train moving, as most frames on the clock look.
+            flip[0] ^= 1
+            framebuffer.set_rgb(10 + flip[0], 127, 0, 0)
+            framebuffer.set_rgb(11 - flip[0], *fill)
+            framebuffer.show(strip)
+
+        return frame
+
+    for name, fill in (("dark", (0, 0, 0)), ("bright", (200, 200, 200))):
+        line = f"{name:>6}:"
+        for limit, label in ((None, "no limit"), (budget, "limited")):
+            elapsed, peak = measure(frames(limit, fill))
+            line += f" {label} {elapsed:.1f} us,"
+            record("power", f"{name} {label}", us=elapsed)
+        print(line.rstrip(","))
+
+
+def bench_colour(num_leds=96, fills=50):
+    print(f"== Full-strip fills per second, {num_leds} LEDs: float set_hsv vs integer Colour ==")
+    strip = CountingStrip(num_leds)
+    framebuffer = FrameBuffer(num_leds)
+    colour = Colour(framebuffer)
+    plain = Colour(framebuffer, dither=False)
+    levels = [i / fills for i in range(fills)]
+
+    def strip_hsv(hue):
+        # As examples/pulse.py does it. The conversion happens natively on
+        # the board, so this only counts the cost of making the calls.
+        def run():
+            for v in levels:
+                for i in range(num_leds):
+                    strip.set_hsv(i, hue(i), 1.0, v)
+        return run
+
+    def framebuffer_hsv(hue):
+        def run():
+            for v in levels:
+                for i in range(num_leds):
+                    framebuffer.set_hsv(i, hue(i), 1.0, v)
+        return run
+
+    def colour_hsv(colour):
+        # Every pixel a different colour, as examples/fire.py does.
+        def run():
+            for v in levels:
+                value = to8(v)
+                for i in range(num_leds):
+                    colour.set_hsv(i, i, 255, value)
+                colour.next_frame()
+        return run
+
+    def fill(colour):
+        def run():
+            for v in levels:
+                colour.fill_hsv(128, 255, to8(v))
+                colour.next_frame()
+        return run
+
+    same = lambda i: 0.5
+    rainbow = lambda i: i / 256
+    cases = (
+        ("one colour", "strip.set_hsv", strip_hsv(same)),
+        ("one colour", "FrameBuffer.set_hsv", framebuffer_hsv(same)),
+        ("one colour", "Colour.fill_hsv", fill(plain)),
+        ("one colour", "dithered fill_hsv", fill(colour)),
+        ("per pixel", "strip.set_hsv", strip_hsv(rainbow)),
+        ("per pixel", "FrameBuffer.set_hsv", framebuffer_hsv(rainbow)),
+        ("per pixel", "Colour.set_hsv", colour_hsv(plain)),
+        ("per pixel", "dithered set_hsv", colour_hsv(colour)),
+    )
+    for group, name, fn in cases:
+        elapsed, peak = measure(fn, repeats=3)
+        rate = fills * 1000000 / elapsed
+        print(f"{group:>10}, {name:>19}: {rate:.0f} fills/s")
+        record("colour", f"{group} {name}", us_per_fill=elapsed / fills)
+
+
+def _layers(count, num_leds):
+    """A stack like the clock's: an ambient arc at the bottom, sparse on top."""
+
+    layers = []
+    for z in range(count):
+        layer = Layer(num_leds, z, opacity=255 - z * 20, blend=(NORMAL, ADD, MAX)[z % 3])
+        if z == 0:
+            for i in range(num_leds // 3, num_leds // 2):
+                layer.set_rgb(i, 40, 20, 0)
+        else:
+            for i in range(z, num_leds, num_leds // 4):
+                layer.set_rgb(i, 10 * z, 200, 255 - 30 * z)
+        layers.append(layer)
+    return layers
+
+
+def bench_compositor(num_leds=96):
+    print(f"== Compositing {num_leds} LEDs: time per frame by layers and what changed ==")
+    framebuffer = FrameBuffer(num_leds)
+    for count in (1, 3, 6):
+        layers = _layers(count, num_leds)
+        compositor = Compositor(num_leds)
+        for layer in layers:
+            compositor.add(layer)
+        compositor.compose(framebuffer)
+        top, bottom = layers[-1], layers[0]
+        flip = [0]
+
+        def touch(layer):
+            flip[0] ^= 1
+            layer.set_rgb(5, 100 * flip[0], 0, 0)
+
+        def everything():
+            for layer in layers:
+                layer.mark(0, num_leds)
+
+        scenarios = (
+            ("nothing", lambda: None),
+            ("top pixel", lambda: touch(top)),
+            ("bottom pixel", lambda: touch(bottom)),
+            ("all layers", everything),
+        )
+        line = f"{count} layers:"
+        for name, change in scenarios:
+            blends = compositor.blends
+
+            def frame():
+                change()
+                compositor.compose(framebuffer)
+
+            elapsed, peak = measure(frame)
+            per_frame = (compositor.blends - blends) / (ROUNDS * REPEATS + 1)
+            line += f" {name} {elapsed:.0f} us ({per_frame:.0f} blends),"
+            record("compositor", f"{count} layers {name}", us=elapsed, blends=per_frame)
+        print(line.rstrip(","))
+
+
+def _move_to_target(current, target, up, down):
+    # examples/sparkles.py's loop, on its lists of [r, g, b] lists.
+    for i in range(len(current)):
+        for c in range(3):
+            if current[i][c] < target[i][c]:
+                current[i][c] = min(current[i][c] + up, target[i][c])
+            elif current[i][c] > target[i][c]:
+                current[i][c] = max(current[i][c] - down, target[i][c])
+
+
+def bench_effects(num_leds=96, frames=200):
+    print(f"== Effects on {num_leds} LEDs: frames per second, example loops vs effects ({EMITTER}) ==")
+    random.seed(3)
+    background, colour = [50, 50, 0], [255, 255, 0]
+    strip = CountingStrip(num_leds)
+
+    def example_sparkles():
+        # examples/sparkles.py's main loop, with its display_current().
+        current = [[0] * 3 for i in range(num_leds)]
+        target = [[0] * 3 for i in range(num_leds)]
+        for _ in range(frames):
+            for i in range(num_leds):
+                if 0.005 > random.uniform(0, 1):
+                    target[i] = colour
+                if current[i] == target[i]:
+                    target[i] = background
+            _move_to_target(current, target, 2, 2)
+            for i in range(num_leds):
+                strip.set_rgb(i, current[i][0], current[i][1], current[i][2])
+
+    def example_snow():
+        # examples/weather.py's snow(), moving at ANIMATION_SPEED = 1.
+        current = [[0] * 3 for i in range(num_leds)]
+        target = [[0] * 3 for i in range(num_leds)]
+        for _ in range(frames):
+            for i in range(num_leds):
+                if 0.01 > random.uniform(0, 1):
+                    current[i] = [227, 227, 227]
+                else:
+                    target[i] = [54, 54, 54]
+            _move_to_target(current, target, 1, 1)
+            for i in range(num_leds):
+                strip.set_rgb(i, current[i][0], current[i][1], current[i][2])
+
+    def effect(make):
+        def run():
+            framebuffer = FrameBuffer(num_leds)
+            effect = make(framebuffer)
+            for _ in range(frames):
+                effect.step()
+                framebuffer.show(strip)
+        return run
+
+    def pulse():
+        framebuffer = FrameBuffer(num_leds)
+        pulse = Pulse(frames)
+        for _ in range(frames):
+            pulse.fill(framebuffer, 255, 0, 0)
+            pulse.next_frame()
+            framebuffer.show(strip)
+
+    cases = (
+        ("sparkles", "example", example_sparkles),
+        ("sparkles", "Sparkle", effect(lambda canvas: Sparkle(canvas, background, colour))),
+        ("snow", "example", example_snow),
+        ("snow", "Drops", effect(lambda canvas: Drops(canvas, (54, 54, 54), (227, 227, 227), down=1))),
+        ("pulse", "Pulse", pulse),
+    )
+    for group, name, fn in cases:
+        calls = strip.calls
+        elapsed, peak = measure(fn, repeats=2)
+        frame_calls = (strip.calls - calls) / ((ROUNDS * 2 + 1) * frames)
+        fps = frames * 1000000 / elapsed
+        print(f"{group:>9}, {name:>8}: {fps:.0f} fps, {frame_calls:.0f} strip calls / frame")
+        record("effects", f"{group} {name}", us_per_frame=elapsed / frames, strip_calls=frame_calls)
+
+
+def bench_tracking(minutes=30):
+    print(f"== Trains between fetches: tracked and redrawn locally, {minutes} simulated minutes ==")
+    # Imported here, so off the board it picks up the emulator's clock.
+    from tracking import TrainTracker
+
+    num_leds = 96
+    positions = PositionTable(num_leds, 1)
+    layer = Layer(num_leds)
+
+    def draw():
+        tracker = TrainTracker()
+        now = time.time()
+        tracker.update([now + 90 + 60 * i for i in range(8)], now, (255, 0, 0), time.ticks_ms())
+        return measure(lambda: tracker.draw(layer, positions, time.ticks_ms()))[0]
+
+    elapsed = simulated(draw)
+    print(f"draw, 8 trains: {elapsed:.0f} us")
+    record("tracking", "draw 8 trains", us=elapsed)
+
+    if emulator is None:
+        print("skipped main.py run: needs the emulator")
+        return
+    emulation = emulator.install(end=emulator.DEFAULT_START + minutes * 60)
+    try:
+        with StandInServer(times=emulator.live_times(emulation.clock)) as server:
+            emulator.use_stand_in(server)
+            quiet(lambda: emulator.run_script("main.py"))()
+        strip = emulation.led_strips[0]
+    finally:
+        emulator.uninstall()
+    print(f"{server.requests} API requests, {strip.calls} strip calls; LEDs lit at the end: {strip.lit()}")
+    record("tracking", f"{minutes} minutes", requests=server.requests)
+
+
+def bench_timebase(days=3, drift=150e-6):
+    print(f"== Timebase over {days} simulated days, crystal {drift * 1e6:.0f} ppm fast, NTP out for 12 h ==")
+    if emulator is None:
+        print("skipped: needs the emulator")
+        return
+    from timebase import Timebase
+
+    emulation = emulator.install()
+    clock = emulation.clock
+    ntptime = emulation.modules["ntptime"]
+    clock.ticks_drift = drift
+    clock.rtc_drift = drift
+    timebase = Timebase()
+    errors = []
+    outage = (86400, 86400 + 12 * 3600)
+
+    async def watch():
+        while clock.wall() < emulator.DEFAULT_START + days * 86400:
+            await uasyncio.sleep(600)
+            elapsed = clock.wall() - emulator.DEFAULT_START
+            ntptime.fail = outage[0] <= elapsed < outage[1]
+            errors.append((elapsed, abs(timebase.now_ms() / 1000 - clock.wall()), abs(clock.rtc() - clock.wall())))
+
+    async def main():
+        task = uasyncio.create_task(timebase.run())
+        await watch()
+        task.cancel()
+
+    # Set only at boot, as main.py used to, the RTC would be this far out.
+    boot_only = days * 86400 * drift
+    try:
+        quiet(lambda: uasyncio.run(main()))()
+    finally:
+        emulator.uninstall()
+
+    settled = [error for elapsed, error, rtc in errors if elapsed > 12 * 3600]
+    in_outage = [error for elapsed, error, rtc in errors if outage[0] <= elapsed < outage[1]]
+    rtc_worst = max(rtc for elapsed, rtc_error, rtc in errors)
+    print(f"{timebase.report()}")
+    print(f"worst error once settled {max(settled):.2f} s, during the outage {max(in_outage):.2f} s, "
+          f"RTC {rtc_worst:.2f} s; RTC set only at boot: {boot_only:.1f} s")
+    record("timebase", f"{drift * 1e6:.0f} ppm", error_s=max(settled), outage_error_s=max(in_outage))
+
+
+def bench_timesource(minutes=15):
+    print("== Time from the API when NTP fails: simulated seconds from boot to the first correct frame ==")
+    if emulator is None:
+        print("skipped: needs the emulator")
+        return
+    import metro_api
+    from timebase import Timebase
+
+    cases = (
+        # (name, RTC error at boot, NTP fails, NTP delay, NTP skew, server skew)
+        ("NTP fine", 0, False, 0, 0, 0),
+        ("RTC 3 h out, NTP down", -3 * 3600, True, 0, 0, 0),
+        ("RTC 3 h out, NTP slow", -3 * 3600, False, 5, 0, 0),
+        ("NTP 1 h out", 0, False, 0, 3600, 0),
+        ("server 20 s out", 0, False, 0, 0, 20),
+    )
+    for name, rtc, ntp_fails, ntp_delay, ntp_skew, server_skew in cases:
+        emulation = emulator.install()
+        clock = emulation.clock
+        clock.rtc_offset = rtc
+        ntptime = emulation.modules["ntptime"]
+        ntptime.fail = ntp_fails
+        ntptime.delay = ntp_delay
+        ntptime.skew = ntp_skew
+        saved = metro_api.server_clock, metro_api.governor, http_client.uasyncio
+        metro_api.server_clock = ServerClock()
+        metro_api.governor = RequestGovernor()
+        # http_client was imported before the emulator; have it mark its
+        # sockets as in flight, so simulated time doesn't run on past them.
+        http_client.uasyncio = emulation.modules["uasyncio"]
+        timebase = Timebase(resync=120, server=metro_api.server_clock)
+        start = clock.wall()
+        first = [None]
+        fetched = [None]
+        errors = []
+
+        async def scenario(server):
+            client = server.async_client()
+            task = uasyncio.create_task(timebase.run())
+            while clock.wall() < start + minutes * 60:
+                try:
+                    await metro_api.fetch_departures("WTL", 1, client=client)
+                except Exception:
+                    pass
+                timebase.check()
+                if fetched[0] is None:
+                    fetched[0] = clock.wall() - start
+                # How far out a frame drawn now would be.
+                error = abs(timebase.now_ms() / 1000 - clock.wall())
+                errors.append(error)
+                if first[0] is None and error < 2:
+                    first[0] = clock.wall() - start
+                await uasyncio.sleep(30)
+            task.cancel()
+            await client.close()
+
+        try:
+            with StandInServer(times=emulator.live_times(clock, skew=server_skew), clock=clock, skew=server_skew) as server:
+                quiet(lambda: uasyncio.run(scenario(server)))()
+        finally:
+            metro_api.server_clock, metro_api.governor, http_client.uasyncio = saved
+            emulator.uninstall()
+        worst = max(errors[len(errors) // 2:])
+        boot = "never" if first[0] is None else f"{first[0]:.1f} s"
+        print(f"{name:>22}: first fetch {fetched[0]:.1f} s, first correct frame {boot}, worst error later {worst:.1f} s, time from {timebase.source}")
+        record("timesource", name, boot_s=first[0] if first[0] is not None else minutes * 60, error_s=worst)
+
+
+def bench_commute(days=7):
+    print(f"== Commute windows: {days} simulated days, sleeping outside 07:00-08:30 on weekdays ==")
+    if emulator is None:
+        print("skipped main.py run: needs the emulator")
+        return
+    emulation = emulator.install(end=emulator.DEFAULT_START + days * 86400)
+    started = time.perf_counter()
+    try:
+        with StandInServer(times=emulator.live_times(emulation.clock)) as server:
+            emulator.use_stand_in(server)
+            quiet(lambda: emulator.run_script("main.py"))()
+        radio_on = emulation.network.interfaces[0].radio_on()
+        sleeps = emulation.machine.sleeps
+    finally:
+        emulator.uninstall()
+    elapsed = time.perf_counter() - started
+
+    # The default windows: 90 minutes on each of five weekdays.
+    active = days * 5 // 7 * 90 * 60
+    # Trains run all day at the same headway, so polling all day would
+    # make requests at the rate the windows did.
+    before = server.requests * 86400 / active
+    after = server.requests / days
+    print(f"always on: {before:.0f} requests a day, radio on 1440 min a day")
+    print(f"in windows: {after:.0f} requests a day, radio on {radio_on / days / 60:.1f} min a day; "
+          f"{len(sleeps)} lightsleeps, {elapsed:.0f} s to simulate")
+    record("commute", f"{days} days", requests_per_day=after, radio_min_per_day=radio_on / days / 60)
+
+
+def bench_governor(minutes=60, outage=(5, 35)):
+    print(f"== Request governor: one platform of two failing for {outage[1] - outage[0]} of {minutes} simulated minutes, polled every 30 s ==")
+    from governor import Refused
+
+    if emulator is None:
+        print("skipped: needs the emulator")
+        return
+    import metro_api
+
+    failing = "/api/times/WTL/2"
+    kinds = (503, "timeout", "reset")
+
+    def run(governor):
+        emulation = emulator.install()
+        clock = emulation.clock
+        start = clock.wall()
+        down = [False]
+        faults = []
+
+        def fault(path):
+            if down[0] and path.startswith(failing):
+                faults.append(kinds[len(faults) % len(kinds)])
+                return faults[-1]
+            return None
+
+        saved = metro_api.governor, metro_api.async_clients, metro_api.server_clock, http_client.uasyncio
+        metro_api.governor = governor
+        metro_api.server_clock = ServerClock()
+        http_client.uasyncio = emulation.modules["uasyncio"]
+        stats = {"failing ms": 0, "refused ms": 0, "refused": 0, "recovered": None}
+
+        async def poll(server):
+            metro_api.async_clients = [server.async_client() for _ in range(2)]
+            while clock.wall() < start + minutes * 60:
+                minute = (clock.wall() - start) / 60
+                down[0] = outage[0] <= minute < outage[1]
+                began = time.ticks_ms()
+                departures, errors = await metro_api.fetch_subscriptions([("WTL", 1), ("WTL", 2)], timeout=0.5)
+                took = time.ticks_diff(time.ticks_ms(), began)
+                error = errors.get(("WTL", 2))
+                if isinstance(error, Refused):
+                    stats["refused"] += 1
+                    stats["refused ms"] += took
+                elif error is not None:
+                    stats["failing ms"] += took
+                elif not down[0] and minute > outage[1] and stats["recovered"] is None:
+                    stats["recovered"] = minute - outage[1]
+                await uasyncio.sleep(30)
+            for client in metro_api.async_clients:
+                await client.close()
+
+        try:
+            with StandInServer(times=emulator.live_times(clock), clock=clock, fault=fault, stall=1.0) as server:
+                quiet(lambda: uasyncio.run(poll(server)))()
+        finally:
+            metro_api.governor, metro_api.async_clients, metro_api.server_clock, http_client.uasyncio = saved
+            emulator.uninstall()
+        stats["requests"] = sum(1 for path in server.paths if path.startswith(failing))
+        stats["faults"] = len(faults)
+        return stats
+
+    # Nothing held back: every poll tries the failing platform again.
+    before = run(RequestGovernor(burst=10 ** 6, trip=10 ** 6))
+    # Sized as main.py does, for both platforms polled every 30 s.
+    governor = RequestGovernor()
+    governor.size(2, 30)
+    after = run(governor)
+    for name, stats in (("no governor", before), ("governor", after)):
+        recovered = "never" if stats["recovered"] is None else f"{stats['recovered']:.1f} min"
+        print(f"{name:>12}: {stats['requests']} requests to the failing platform, {stats['faults']} failed "
+              f"({stats['failing ms']} ms waiting on them), {stats['refused']} refused at once; "
+              f"back {recovered} after the outage")
+        record("governor", name, requests=stats["requests"], failing_ms=stats["failing ms"])
+
+
+def bench_wifi(minutes=60):
+    print(f"== Wifi supervisor: links dropped three times in {minutes} simulated minutes ==")
+    if emulator is None:
+        print("skipped: needs the emulator")
+        return
+    emulation = emulator.install()
+    clock = emulation.clock
+    # Imported under the emulator, for the fake radio.
+    from network_manager import NetworkManager
+
+    wlan = emulation.network.WLAN(emulation.network.STA_IF)
+    start = clock.monotonic()
+    # A blip, ten minutes of the router rebooting, and another blip.
+    outages = [(start + 300, start + 310), (start + 900, start + 1500), (start + 2000, start + 2005)]
+    wlan.outages = [(begin, end) for begin, end in outages]
+    # Made in the loop it runs in, as its Event needs on CPython 3.9.
+    nm = None
+    back = []
+    wakes = [0]
+
+    async def pipeline():
+        while clock.monotonic() < start + minutes * 60:
+            if not nm.link.is_set():
+                # Woken once when the link is back, not every second.
+                wakes[0] += 1
+                await nm.link_up()
+            await uasyncio.sleep(30)
+
+    async def watch():
+        # When the link is back after each outage, to the half second.
+        for _, end in outages:
+            while clock.monotonic() < end or not wlan.isconnected():
+                await uasyncio.sleep(0.5)
+            back.append(clock.monotonic() - end)
+
+    async def scenario():
+        nonlocal nm
+        nm = NetworkManager("GB")
+        await nm.client("emulator", "emulator")
+        cold = clock.monotonic() - start
+        supervisor = uasyncio.create_task(nm.supervise("emulator", "emulator"))
+        watcher = uasyncio.create_task(watch())
+        await pipeline()
+        supervisor.cancel()
+        watcher.cancel()
+        await uasyncio.sleep(0)
+        return cold
+
+    try:
+        cold = quiet(lambda: uasyncio.run(scenario()))()
+    finally:
+        emulator.uninstall()
+
+    late = back
+    print(f"first connect {cold * 1000:.0f} ms; {nm.report()}")
+    print("link back " + ", ".join(f"{delay:.1f} s" for delay in late) + " after each outage ended; before, it never came back")
+    record("wifi", "reconnect", connect_ms=sum(nm.connect_ms) / len(nm.connect_ms), attempts=nm.attempts, worst_late_s=max(late))
+
+
+def bench_duty(minutes=60, headway=12 * 60):
+    print(f"== Radio between polls: {minutes} simulated minutes of fetches, trains every {headway // 60} min ==")
+    if emulator is None:
+        print("skipped: needs the emulator")
+        return
+
+    # Seconds to connect from scratch, saved by a known BSSID, saved by a
+    # known address, and at random on top: a good access point and a slow one.
+    radios = (("quick AP", (3.0, 1.2, 1.0, 1.0)), ("slow AP", (12.0, 3.0, 4.0, 4.0)))
+    for radio, delays in radios:
+        results = {}
+        # keep_s for each way of spending the gaps: None for no duty
+        # cycling, and "auto" to weigh power save against reconnecting.
+        for name, keep_s in (("always on", None), ("power save", 10 ** 6), ("off", 0), ("auto", "auto")):
+            results[name] = _duty(keep_s, delays, minutes, headway)
+
+        for name, result in results.items():
+            print(f"{radio}, {name:>10}: radio on {result['on']:.0f} s, power save {result['powersave']:.0f} s, "
+                  f"off {result['off']:.0f} s; {result['reconnects']} reconnects, mean {result['connect_ms']:.0f} ms; "
+                  f"{result['mah']:.2f} mAh; fetches late {result['late']:.2f} s mean, {result['worst']:.2f} s worst")
+            record("duty", f"{radio}, {name}", mah=result["mah"], reconnects=result["reconnects"], late_s=result["late"])
+
+
+def _duty(keep_s, delays, minutes, headway):
+    emulation = emulator.install()
+    clock = emulation.clock
+    # Imported under the emulator, for the fake radio.
+    import network_manager
+    from network_manager import NetworkManager
+
+    wlan = emulation.network.WLAN(emulation.network.STA_IF)
+    wlan.connect_delay, wlan.scan_delay, wlan.dhcp_delay, wlan.jitter = delays
+    start = clock.monotonic()
+    # Unjittered, so every mode polls at the same times.
+    scheduler = PollScheduler(30, 600, jitter=0)
+    late = []
+    nm = None
+
+    async def fetches():
+        planned = clock.monotonic()
+        while planned < start + minutes * 60:
+            try:
+                await uasyncio.wait_for(nm.acquire(), 20)
+            except uasyncio.TimeoutError:
+                pass
+            late.append(max(0, clock.monotonic() - planned))
+            # The request itself.
+            await uasyncio.sleep(0.4)
+            now = planned - start
+            delay = scheduler.success([headway - now % headway, 2 * headway - now % headway])
+            nm.release(delay)
+            planned += delay
+            await uasyncio.sleep(max(0, planned - clock.monotonic() - nm.lead_s()))
+
+    async def scenario():
+        nonlocal nm
+        # With the router's day-long DHCP leases given, for reconnects that
+        # skip DHCP too.
+        nm = NetworkManager("GB", lease_s=86400, duty_cycle=keep_s is not None, keep_s=None if keep_s == "auto" else keep_s)
+        await nm.client("emulator", "emulator")
+        supervisor = uasyncio.create_task(nm.supervise("emulator", "emulator"))
+        await fetches()
+        supervisor.cancel()
+        await uasyncio.sleep(0)
+
+    try:
+        quiet(lambda: uasyncio.run(scenario()))()
+        on = wlan.radio_on(network_manager.PM_NONE)
+        powersave = wlan.radio_on(network_manager.PM_POWERSAVE)
+        total = clock.monotonic() - start
+    finally:
+        emulator.uninstall()
+
+    # Connecting draws more than being on.
+    connecting = sum(nm.connect_ms) / 1000
+    on_ma, powersave_ma, connect_ma = nm.radio_ma
+    charge = on * on_ma + powersave * powersave_ma + connecting * (connect_ma - on_ma)
+    return {
+        "on": on,
+        "powersave": powersave,
+        "off": max(0, total - on - powersave),
+        "reconnects": nm.attempts,
+        "connect_ms": sum(nm.connect_ms) / len(nm.connect_ms) if nm.connect_ms else 0,
+        "mah": charge / 3600,
+        "fetches": len(late),
+        "late": sum(late) / len(late),
+        "worst": max(late),
+    }
+
+
+def _ring_error(position, exact, num_leds):
+    """Distance around the ring between two positions, in LEDs."""
+
+    error = abs(position - exact) % num_leds
+    return min(error, num_leds - error)
+
+
+def bench_positions(count=1000):
+    print("== Train positions: minute_to_position vs PositionTable ==")
+    main = load_main()
+    table = PositionTable(main.NUM_LEDS if main else 96, main.OFFSET if main else 1)
+    num_leds, offset = table.num_leds, table.offset
+    times = [seconds * 37 % 3600 for seconds in range(count)]
+    cases = [("PositionTable", lambda: [table.lookup(seconds) for seconds in times])]
+    if main is not None:
+        cases.insert(0, ("minute_to_position",
+                         lambda: [main.minute_to_position(seconds // 60) for seconds in times]))
+    for name, fn in cases:
+        elapsed, peak = measure(fn, repeats=5)
+        # Mean distance from where the train should be, in LEDs.
+        if name == "PositionTable":
+            positions = [led + weight / 256 for led, weight in fn()]
+        else:
+            positions = fn()
+        error = sum(
+            _ring_error(position, (seconds * num_leds / 3600 + offset) % num_leds, num_leds)
+            for position, seconds in zip(positions, times)
+        ) / count
+        print(f"{name:>18}: {elapsed / count:.2f} us per train, mean error {error:.2f} LEDs")
+        record("positions", name, us=elapsed / count, error_leds=error)
+
+
+def bench_failures(failures=6, interval=120):
+    print("== Failed fetches: redrawing the last good departures ==")
+    main = load_main()
+    if main is None:
+        print("skipped: main.py needs the board's modules or the emulator")
+        return
+
+    # main.py reads time.ticks_ms(), so off the board this needs simulated time.
+    simulated(lambda: _failures(main, failures, interval))
+
+
+def _failures(main, failures=6, interval=120):
+    with open(TIMES_FILE, "rb") as f:
+        table = parse_table(f.read())
+    start = table.times[0] - 60
+    # No get(): the failure path mustn't read pixels back from the strip.
+    strip = CountingStrip(main.NUM_LEDS)
+    framebuffer = FrameBuffer(main.NUM_LEDS)
+    last_good = main.LastGoodDepartures()
+
+    def draw(now, status):
+        quiet(lambda: main.update_display(
+            now, now // 60 % 60, table.times if status else (), status, strip, framebuffer, last_good
+        ))()
+        return [i for i in range(main.NUM_LEDS) if any(framebuffer.get(i))]
+
+    draw(start, True)
+    for failure in range(1, failures + 1):
+        now = start + failure * interval
+        calls = strip.calls
+        stale = draw(now, False)
+        level = max(framebuffer.get(i)[2] for i in stale) if stale else 0
+        print(f"failure {failure}: {len(stale)} LEDs lit, blue {level}, {strip.calls - calls} strip calls")
+
+    for name, status in (("success", True), ("failure", False)):
+        elapsed, peak = measure(quiet(lambda: main.update_display(
+            start, start // 60 % 60, table.times, status, strip, framebuffer, last_good
+        )))
+        print(f"{name:>8} path: {elapsed:.0f} us, {peak} B peak")
+        record("failures", name, us=elapsed, peak_bytes=peak)
+
+
+def simulated(fn):
+    """Run fn() in the emulator's simulated time, if this is CPython."""
+
+    if emulator is None:
+        return fn()
+    emulator.install()
+    try:
+        return fn()
+    finally:
+        emulator.uninstall()
+
+
+def bench_frames(seconds=10):
+    print(f"== FrameScheduler at 60 fps over {seconds} s, as render cost grows ==")
+
+    def run(cost_us):
+        # Imported here, so off the board it picks up the emulator's uasyncio.
+        from frames import FrameScheduler
+
+        frames = FrameScheduler(60)
+
+        def render(deadline):
+            time.sleep_us(cost_us(frames.frames))
+
+        async def timed():
+            try:
+                await uasyncio.wait_for(frames.run(render), seconds)
+            except uasyncio.TimeoutError:
+                pass
+
+        uasyncio.run(timed())
+        return frames
+
+    cases = [
+        # Alternate expensive and cheap frames, like a redraw on new data.
+        (f"{cost} us render", lambda frame, cost=cost: cost if frame % 2 else cost // 4)
+        for cost in (1000, 10000, 20000, 40000, 80000)
+    ]
+    # A slow patch, then back to cheap frames: the rate should recover.
+    cases.append(("40000 us, then 1000 us", lambda frame: 40000 if frame < 60 else 1000))
+    for name, cost_us in cases:
+        frames = simulated(lambda: run(cost_us))
+        stats = frames.stats()
+        print(f"{name:>22}: {frames.report()}")
+        record("frames", name, missed=stats["missed"], skipped=stats["skipped"], fps_lost=60 - stats["rate"])
+
+
+def bench_cycle():
+    print("== Full update cycle per stage: parse, waits, positions, render ==")
+    main = load_main()
+    if main is None:
+        print("skipped: main.py needs the board's modules or the emulator")
+        return
+
+    # main.py reads time.ticks_ms(), so off the board this needs simulated time.
+    simulated(lambda: _cycle(main))
+
+
+def _cycle(main):
+    strip = main.led_strip
+    with open(TIMES_FILE, "rb") as f:
+        feeds = [("times.json", f.read())]
+    for size in FEED_SIZES:
+        feeds.append((f"synthetic x{size}", synthetic_feed(size)))
+
+    for name, body in feeds:
+        table = parse_table(body)
+        # Just before the first train, so the feed lands within the hour shown.
+        now = table.times[0] - 60
+        minute = now // 60 % 60
+        waits = main.get_next_train_waits(now, table.times)
+
+        def cycle():
+            departures = parse_table(body)
+            main.update_display(now, minute, departures.times, True, strip)
+
+        stages = (
+            ("parse", lambda: parse_table(body)),
+            ("waits", lambda: main.get_next_train_waits(now, table.times)),
+            ("positions", lambda: [main.positions.lookup(now + wait) for wait in waits]),
+            ("render", quiet(lambda: main.update_display(now, minute, table.times, True, strip))),
+            ("failed", quiet(lambda: main.update_display(now, minute, table.times, False, strip))),
+            ("cycle", quiet(cycle)),
+        )
+        print(f"{name} ({len(body)} bytes, {len(table)} trains):")
+        for stage, fn in stages:
+            calls = strip.calls if hasattr(strip, "calls") else None
+            elapsed, peak, allocated = profile(fn)
+            line = f"{stage:>10}: {elapsed:.0f} us, {peak} B peak"
+            metrics = {"us": elapsed, "peak_bytes": peak}
+            if allocated is not None:
+                line += f", {allocated} B allocated"
+                metrics["alloc_bytes"] = allocated
+            if calls is not None:
+                # Native strip calls per cycle, counted by the emulator's strip.
+                strip_calls = (strip.calls - calls) // (ROUNDS * REPEATS + 1)
+                line += f", {strip_calls} strip calls"
+                metrics["strip_calls"] = strip_calls
+            print(line)
+            record("cycle", f"{name} {stage}", **metrics)
+
+
+def _commit():
+    try:
+        import subprocess
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def write_results(path):
+    with open(path, "w") as f:
+        json.dump({
+            "implementation": sys.implementation.name,
+            "platform": sys.platform,
+            "commit": _commit(),
+            "results": RESULTS,
+        }, f)
+    print(f"Wrote {len(RESULTS)} results to {path}")
+
+
+def compare(old_path, new_path, threshold=0.1):
+    """Print each metric in two --json files side by side.
+
+    Returns the number that got worse by more than `threshold`.
+    """
+
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['implementation']} {old['commit']} -> {new['implementation']} {new['commit']}")
+    before = {(r["benchmark"], r["case"]): r for r in old["results"]}
+    regressions = 0
+    for result in new["results"]:
+        previous = before.get((result["benchmark"], result["case"]))
+        if previous is None:
+            continue
+        for metric, value in result.items():
+            if metric in ("benchmark", "case") or metric not in previous:
+                continue
+            was = previous[metric]
+            change = (value - was) / was if was else 0
+            flag = ""
+            if change > threshold:
+                flag = "  <- worse"
+                regressions += 1
+            print(f"{result['benchmark']} / {result['case']} / {metric}: "
+                  f"{was:.6g} -> {value:.6g} ({change * 100:+.0f}%){flag}")
+    print(f"{regressions} metrics worse by more than {threshold * 100:.0f}%")
+    return regressions
+
+
+def run(argv):
+    if len(argv) > 1 and argv[1] == "--compare":
+        sys.exit(1 if compare(argv[2], argv[3]) else 0)
+
+    bench_parse()
+    bench_timestamps()
+    bench_departure_memory()
+    bench_polling()
+    bench_framebuffer()
+    bench_power()
+    bench_colour()
+    bench_compositor()
+    bench_effects()
+    bench_positions()
+    bench_tracking()
+    bench_timebase()
+    bench_timesource()
+    bench_commute()
+    bench_governor()
+    bench_wifi()
+    bench_duty()
+    bench_failures()
+    bench_frames()
+    bench_cycle()
+    if StandInServer is not None:
+        bench_connections()
+        bench_pipeline()
+        bench_subscriptions()
+        bench_refcache()
+
+    if "--json" in argv:
+        write_results(argv[argv.index("--json") + 1])
+
+
+if __name__ == "__main__":
+    run(sys.argv)
@@ -0,0 +1,126 @@
+"""Integer colour maths for per-frame work: HSV, gamma and dithering.
+
+plasma.WS2812.set_hsv() takes floats, and an effect calling it 96 times a
+frame spends most of its time on float arithmetic and boxing. Here HSV is
+8-bit integers throughout, and Colour writes gamma-corrected pixels straight
+into a FrameBuffer's bytearray.
+
+LED brightness is linear in the value sent, but our eyes aren't, so colours
+are gamma corrected. That squashes the dim end, where the diffused strip
+spends most of its time, into a handful of levels. To get them back, the
+gamma table keeps 8 fractional bits, and temporal dithering rounds each
+pixel up or down on alternate frames so that over 8 frames it averages out
+to the fractional level.
+"""
+
+from array import array
+
+
+GAMMA = 2.8
+
+# Gamma-corrected level for each 8-bit input, as 8.8 fixed point.
+GAMMA16 = array("H", [int((i / 255) ** GAMMA * 255 * 256 + 0.5) for i in range(256)])
+
+# ...and rounded to 8 bits, for when dithering isn't wanted.
+GAMMA8 = bytearray((level + 128) >> 8 for level in GAMMA16)
+
+# Ordered dither thresholds for 8 frames, in 256ths: spread evenly, in
+# bit-reversed order so each half of the cycle gets half the steps.
+DITHER = bytes((0, 128, 64, 192, 32, 160, 96, 224))
+
+
+def hsv8(h, s, v):
+    """Convert 8-bit HSV to 8-bit r, g, b, with integer arithmetic only.
+
+    Args:
+        h: Hue, 0-255 for once round the colour wheel.
+        s: Saturation, 0-255.
+        v: Value (brightness), 0-255.
+    """
+
+    if s == 0:
+        return v, v, v
+    h6 = h * 6
+    region = h6 >> 8
+    f = h6 & 0xFF
+    p = v * (256 - s) >> 8
+    q = v * (256 - (s * f >> 8)) >> 8
+    t = v * (256 - (s * (256 - f) >> 8)) >> 8
+    if region == 0:
+        return v, t, p
+    if region == 1:
+        return q, v, p
+    if region == 2:
+        return p, v, t
+    if region == 3:
+        return p, q, v
+    if region == 4:
+        return t, p, v
+    return v, p, q
+
+
+def to8(x):
+    """Scale a 0.0-1.0 float to 0-255, e.g. to reuse plasma-style colours."""
+
+    return int(x * 255 + 0.5)
+
+
+class Colour:
+    """Draw gamma-corrected, optionally dithered, colours into a FrameBuffer.
+
+    Call next_frame() once per frame so the dither moves on.
+
+    Args:
+        framebuffer: The FrameBuffer to draw into.
+        dither: Dither the dim end with 8-frame temporal dithering.
+    """
+
+    def __init__(self, framebuffer, dither=True):
+        self.framebuffer = framebuffer
+        self.dither = dither
+        self.frame = 0
+
+    def next_frame(self):
+        self.frame = (self.frame + 1) & 7
+
+    def set_rgb(self, index, r, g, b):
+        """Set one pixel from an uncorrected 8-bit colour."""
+
+        # Offset the dither by pixel, so neighbours don't flicker in step.
+        t = DITHER[(self.frame + index) & 7] if self.dither else 128
+        pixels = self.framebuffer.pixels
+        i = index * 3
+        pixels[i] = min(255, (GAMMA16[r] + t) >> 8)
+        pixels[i + 1] = min(255, (GAMMA16[g] + t) >> 8)
+        pixels[i + 2] = min(255, (GAMMA16[b] + t) >> 8)
+        self.framebuffer.mark(index, index + 1)
+
+    def set_hsv(self, index, h, s, v):
+        r, g, b = hsv8(h, s, v)
+        self.set_rgb(index, r, g, b)
+
+    def fill_rgb(self, r, g, b, start=0, end=None):
+        """Fill pixels [start, end) with one uncorrected 8-bit colour."""
+
+        framebuffer = self.framebuffer
+        if end is None:
+            end = framebuffer.num_leds
+        r16 = GAMMA16[r]
+        g16 = GAMMA16[g]
+        b16 = GAMMA16[b]
+        # One pixel per dither step, starting from the step pixel `start` is
+        # on; without dithering, they're all the same.
+        pattern = bytearray(24)
+        for k in range(8):
+            t = DITHER[(self.frame + start + k) & 7] if self.dither else 128
+            pattern[k * 3] = min(255, (r16 + t) >> 8)
+            pattern[k * 3 + 1] = min(255, (g16 + t) >> 8)
+            pattern[k * 3 + 2] = min(255, (b16 + t) >> 8)
+        # Then tile it across the span with slice assignment, in C.
+        n = (end - start) * 3
+        framebuffer.pixels[start * 3:end * 3] = (pattern * (n // 24 + 1))[:n]
+        framebuffer.mark(start, end)
+
+    def fill_hsv(self, h, s, v, start=0, end=None):
+        r, g, b = hsv8(h, s, v)
+        self.fill_rgb(r, g, b, start, end)
@@ -0,0 +1,106 @@
+"""When the clock is wanted: weekday commute windows, with days off.
+
+The clock is only looked at on the way out of the door, but it used to poll
+the API and keep the radio and LEDs on around the clock, unless someone
+unplugged it. A CommuteSchedule says which times of which days it's needed,
+and how long until that next changes, so main.py can blank the display, turn
+the radio off and sleep the board until the next window.
+
+Times are UK local seconds since the epoch (Timebase.local()), and windows
+are seconds past local midnight, all integers.
+"""
+
+import time
+
+from isotime import days_since_epoch
+
+
+MONDAY_TO_FRIDAY = (0, 1, 2, 3, 4)
+# 07:00 to 08:30 on weekdays.
+WINDOWS = ((MONDAY_TO_FRIDAY, 7 * 3600, 8 * 3600 + 30 * 60),)
+# Furthest ahead, in days, to look for the next window.
+LOOKAHEAD = 400
+
+# The epoch's weekday, Monday = 0, as time.gmtime() numbers them.
+_EPOCH_WEEKDAY = time.gmtime(0)[6]
+
+
+class CommuteSchedule:
+    """Windows of the day the clock should be running in.
+
+    Args:
+        windows: (weekdays, start, end) for each window, with weekdays
+            numbered from Monday = 0 and start and end in seconds past
+            midnight.
+        overrides: Dates given as (year, month, day), mapped to the
+            (start, end) windows to use that day instead; () for a day off.
+    """
+
+    def __init__(self, windows=WINDOWS, overrides=None):
+        self.windows = windows
+        self.overrides = {}
+        for (year, month, day), day_windows in (overrides or {}).items():
+            self.overrides[days_since_epoch(year, month, day)] = tuple(day_windows)
+
+        # Seconds the radio has been on, and since when, for report().
+        self.on = 0
+        self._since = None
+        self._first = None
+
+    def on_day(self, day):
+        """The (start, end) windows on a day, counted from the epoch."""
+
+        if day in self.overrides:
+            return self.overrides[day]
+        weekday = (day + _EPOCH_WEEKDAY) % 7
+        return [(start, end) for weekdays, start, end in self.windows if weekday in weekdays]
+
+    def active(self, local):
+        """Whether a local time is in a window."""
+
+        day, second = divmod(local, 86400)
+        for start, end in self.on_day(day):
+            if start <= second < end:
+                return True
+        return False
+
+    def until_change(self, local):
+        """Seconds from a local time until the next window starts or ends,
+        or None if there are no more windows."""
+
+        day, second = divmod(local, 86400)
+        for ahead in range(LOOKAHEAD):
+            edges = []
+            for start, end in self.on_day(day + ahead):
+                edges.append(start)
+                edges.append(end)
+            for edge in sorted(edges):
+                change = ahead * 86400 + edge - second
+                if change > 0:
+                    return change
+        return None
+
+    def woke(self, now):
+        """Note the radio going on at `now`, in seconds."""
+
+        if self._first is None:
+            self._first = now
+        self._since = now
+
+    def slept(self, now):
+        """Note the radio going off at `now`, in seconds."""
+
+        if self._since is not None:
+            self.on += now - self._since
+            self._since = None
+
+    def report(self, requests, now):
+        """Requests and radio-on time a day since the radio first went on,
+        given the requests made and the time now."""
+
+        on = self.on
+        if self._since is not None:
+            on += now - self._since
+        # At least a day, so one window isn't taken for all day.
+        days = max(now - (self._first or now), 86400) / 86400
+        return f"{requests / days:.0f} requests a day, radio on {on / days / 60:.0f} min a day"
@@ -0,0 +1,188 @@
+"""Stack several drawings on the LED ring, each in its own layer.
+
+Trains, a clock hand, a sunrise arc or tide times can each draw into a Layer
+without knowing about the others; a Compositor blends the layers, in z
+order, into the FrameBuffer that goes to the strip.
+
+Blending is incremental. Each layer tracks the span it has drawn over, and
+the compositor keeps the blended result of the stack up to each layer, so a
+change to one layer only re-blends that span of that layer and the ones
+above it. A layer that hasn't changed costs nothing, and a frame in which
+nothing changed costs almost nothing.
+"""
+
+from framebuffer import Canvas
+
+
+# Blend modes. With NORMAL, black pixels are transparent and anything else
+# covers what's below; ADD sums with what's below, saturating; MAX keeps the
+# brighter of the two, channel by channel.
+NORMAL = 0
+ADD = 1
+MAX = 2
+
+
+class Layer(Canvas):
+    """One drawing in a Compositor's stack.
+
+    Draw into it as into any Canvas. Changing z needs the layer removing
+    from and re-adding to its Compositor.
+
+    Args:
+        num_leds: The number of LEDs on the clock face.
+        z: Stacking order; higher layers go on top.
+        opacity: How strongly the layer shows, 0-255.
+        blend: How the layer combines with those below: NORMAL, ADD or MAX.
+    """
+
+    def __init__(self, num_leds, z=0, opacity=255, blend=NORMAL):
+        super().__init__(num_leds)
+        self.z = z
+        self._opacity = opacity
+        self._blend = blend
+        self._visible = True
+
+    @property
+    def opacity(self):
+        return self._opacity
+
+    @opacity.setter
+    def opacity(self, value):
+        if value != self._opacity:
+            self._opacity = value
+            self.mark(0, self.num_leds)
+
+    @property
+    def blend(self):
+        return self._blend
+
+    @blend.setter
+    def blend(self, value):
+        if value != self._blend:
+            self._blend = value
+            self.mark(0, self.num_leds)
+
+    @property
+    def visible(self):
+        return self._visible
+
+    @visible.setter
+    def visible(self, value):
+        if value != self._visible:
+            self._visible = value
+            self.mark(0, self.num_leds)
+
+
+class Compositor:
+    """Blend a stack of Layers into a FrameBuffer.
+
+    Args:
+        num_leds: The number of LEDs on the clock face.
+    """
+
+    def __init__(self, num_leds):
+        self.num_leds = num_leds
+        self.layers = []
+        # Blended result of the stack up to and including each layer.
+        self._blended = []
+        self._background = bytes(num_leds * 3)
+        # Whether the whole frame needs copying out, even if no layer changed.
+        self._refresh = False
+        # Layer blends done, to see what compositing costs.
+        self.blends = 0
+
+    def add(self, layer):
+        """Add a layer, above any others with the same z."""
+
+        index = len(self.layers)
+        while index and self.layers[index - 1].z > layer.z:
+            index -= 1
+        self.layers.insert(index, layer)
+        self._blended.insert(index, bytearray(self.num_leds * 3))
+        self._restack(index)
+
+    def remove(self, layer):
+        index = self.layers.index(layer)
+        del self.layers[index]
+        del self._blended[index]
+        self._restack(index)
+
+    def _restack(self, index):
+        # Everything from here up now sits on a different stack.
+        for layer in self.layers[index:]:
+            layer.mark(0, self.num_leds)
+        # If the top layer went, nothing above needs re-blending, but the
+        # frame still needs the new top copying out.
+        if index == len(self.layers):
+            self._refresh = True
+
+    def compose(self, framebuffer):
+        """Blend whatever has changed into framebuffer.
+
+        Returns:
+            The number of layers re-blended.
+        """
+
+        num_leds = self.num_leds
+        start, end = num_leds, 0
+        below = self._background
+        blends = 0
+        for layer, blended in zip(self.layers, self._blended):
+            layer_start, layer_end = layer.take_dirty()
+            # Once a span changes, every layer above must be re-blended over it.
+            if layer_start < start:
+                start = layer_start
+            if layer_end > end:
+                end = layer_end
+            if start < end:
+                _blend(layer, below, blended, start * 3, end * 3)
+                blends += 1
+            below = blended
+        if self._refresh:
+            start, end = 0, num_leds
+            self._refresh = False
+        if start < end:
+            framebuffer.pixels[start * 3:end * 3] = below[start * 3:end * 3]
+            framebuffer.mark(start, end)
+        self.blends += blends
+        return blends
+
+
+# Bytes of a layer checked at a time for being all black, which most of a
+# sparse layer is.
+_CHUNK = 48
+_BLACK = bytes(_CHUNK)
+
+
+def _blend(layer, below, out, a, b):
+    """Blend layer's pixels over below into out, for bytes [a, b)."""
+
+    # Black is transparent in every mode, so start from what's below and
+    # only work through the chunks with something in them.
+    out[a:b] = below[a:b]
+    # 0-255 to 0-256, so full opacity is exact with a shift.
+    opacity = layer.opacity + (layer.opacity >> 7)
+    if not layer.visible or not opacity:
+        return
+
+    src = layer.pixels
+    mode = layer.blend
+    for chunk in range(a, b, _CHUNK):
+        chunk_end = min(chunk + _CHUNK, b)
+        if src[chunk:chunk_end] == _BLACK[:chunk_end - chunk]:
+            continue
+        if mode == ADD:
+            for i in range(chunk, chunk_end):
+                v = below[i] + (src[i] * opacity >> 8)
+                out[i] = v if v < 255 else 255
+        elif mode == MAX:
+            for i in range(chunk, chunk_end):
+                v = src[i] * opacity >> 8
+                if v > below[i]:
+                    out[i] = v
+        else:
+            for i in range(chunk, chunk_end, 3):
+                if src[i] or src[i + 1] or src[i + 2]:
+                    for j in range(i, i + 3):
+                        u = below[j]
+                        out[j] = u + ((src[j] - u) * opacity >> 8)
@@ -0,0 +1,293 @@
+"""Departure data from the Metro /api/times endpoint.
+
+The times payload is a JSON list of one flat object per train. We only use a
+handful of fields, so rather than letting `response.json()` build the whole
+list of dicts on the Pico heap, we scan the body a chunk at a time and pull out
+just the values we need.
+
+Parsed departures are kept in a DepartureTable: parallel arrays of small
+integers, with the repeated strings (line, destination, last event) interned
+as one-byte codes in shared StringTables. A full set of departures then costs
+a few hundred bytes instead of kilobytes of dicts.
+"""
+
+from array import array
+
+from isotime import iso_to_epoch
+
+# Bytes read from the response body per chunk.
+CHUNK_SIZE = 256
+
+# Field keys we extract, as they appear in the raw JSON.
+_KEY_TRN = b'"trn"'
+_KEY_DUE_IN = b'"dueIn"'
+_KEY_PREDICTED = b'"actualPredictedTime"'
+_KEY_LINE = b'"line"'
+_KEY_DESTINATION = b'"destination"'
+_KEY_LAST_EVENT = b'"lastEvent"'
+_KEY_LAST_EVENT_TIME = b'"lastEventTime"'
+
+# Byte values compared directly, as `int in bytes` isn't reliable on MicroPython.
+_QUOTE = 34  # '"'
+_COMMA = 44  # ','
+_CLOSE = 125  # '}'
+_SPACE = 32  # ' ' and anything below it is whitespace in this feed
+
+
+def _field(buf, key, start, end):
+    """Return the raw bytes of the value for key within buf[start:end].
+
+    String values are returned without their quotes. Returns None if the key
+    isn't present in the record.
+    """
+
+    i = buf.find(key, start, end)
+    if i < 0:
+        return None
+    i = buf.find(b":", i + len(key), end)
+    if i < 0:
+        return None
+    i += 1
+    while i < end and buf[i] <= _SPACE:
+        i += 1
+    if i >= end:
+        return None
+
+    if buf[i] == _QUOTE:
+        j = buf.find(b'"', i + 1, end)
+        if j < 0:
+            return None
+        return buf[i + 1:j]
+
+    j = i
+    while j < end:
+        c = buf[j]
+        if c == _COMMA or c == _CLOSE or c <= _SPACE:
+            break
+        j += 1
+    value = buf[i:j]
+    return None if value == b"null" else value
+
+
+def _text(buf, key, start, end):
+    value = _field(buf, key, start, end)
+    return value.decode() if value is not None else None
+
+
+class DepartureParser:
+    """Incremental parser for a /api/times response body.
+
+    Feed it the body a chunk at a time, in whatever sizes arrive; each call
+    returns the trains completed by that chunk. Only the unfinished tail of a
+    single train record is held between calls, so memory is bounded by the
+    record size rather than the size of the whole payload. Records are split
+    on '}', which is safe because each train is a flat object with no braces
+    in its values.
+
+    The latest lastEventTime seen, in epoch seconds, is kept in
+    `latest_event`: a recent reading of the server's clock.
+    """
+
+    def __init__(self):
+        self._buf = b""
+        self.latest_event = None
+
+    def feed(self, chunk):
+        """Parse a chunk of the body.
+
+        Returns:
+            List of (trn, due_in, actual_predicted_time, line, destination,
+            last_event) tuples for each train completed by this chunk. due_in
+            is an int and the rest are strings; any missing field is None.
+        """
+
+        buf = self._buf + chunk if self._buf else chunk
+        trains = []
+
+        start = 0
+        while True:
+            end = buf.find(b"}", start)
+            if end < 0:
+                break
+            record = buf.find(b"{", start, end)
+            if record >= 0:
+                predicted = _field(buf, _KEY_PREDICTED, record, end)
+                if predicted is not None:
+                    due_in = _field(buf, _KEY_DUE_IN, record, end)
+                    trains.append((
+                        _text(buf, _KEY_TRN, record, end),
+                        int(due_in) if due_in else None,
+                        predicted.decode(),
+                        _text(buf, _KEY_LINE, record, end),
+                        _text(buf, _KEY_DESTINATION, record, end),
+                        _text(buf, _KEY_LAST_EVENT, record, end),
+                    ))
+                event_time = _field(buf, _KEY_LAST_EVENT_TIME, record, end)
+                if event_time is not None:
+                    event_time = iso_to_epoch(event_time.decode())
+                    if self.latest_event is None or event_time > self.latest_event:
+                        self.latest_event = event_time
+            start = end + 1
+
+        # Keep only the unfinished record; drop anything before its opening brace.
+        record = buf.find(b"{", start)
+        self._buf = buf[record:] if record >= 0 else b""
+        return trains
+
+
+def iter_departures(stream, chunk_size=CHUNK_SIZE):
+    """Yield the fields we use from each train in a /api/times response body.
+
+    Args:
+        stream: Anything with a read(n) method returning bytes, e.g. the
+        `raw` body of a response.
+        chunk_size: Number of bytes to read at a time.
+
+    Yields:
+        Tuple of (trn, due_in, actual_predicted_time, line, destination,
+        last_event), as DepartureParser.feed().
+    """
+
+    parser = DepartureParser()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        for train in parser.feed(chunk):
+            yield train
+
+
+class StringTable:
+    """Interns repeated strings as small integer codes, shared across polls.
+
+    Code 0 is reserved for a missing value, and for anything that arrives
+    once all 255 other codes are taken, so codes always fit in a byte.
+    """
+
+    def __init__(self, names=()):
+        self._names = [""]
+        self._codes = {}
+        for name in names:
+            self.code(name)
+
+    def __len__(self):
+        return len(self._names)
+
+    def code(self, name):
+        if not name:
+            return 0
+        code = self._codes.get(name)
+        if code is None:
+            if len(self._names) > 255:
+                return 0
+            code = len(self._names)
+            self._names.append(name)
+            self._codes[name] = code
+        return code
+
+    def name(self, code):
+        return self._names[code]
+
+
+# Seeded with the values we expect, so the usual ones have stable codes.
+LINES = StringTable(("GREEN", "YELLOW"))
+DESTINATIONS = StringTable((
+    "Airport", "South Hylton", "St. James", "South Shields",
+    "Monument", "Pelaw", "Park Lane", "Regent Centre", "Four Lane Ends",
+))
+EVENTS = StringTable(("APPROACHING", "ARRIVED", "DEPARTED", "READY_TO_START"))
+
+
+class Departure:
+    """One departure, as read back from a DepartureTable.
+
+    line, destination and last_event are codes into LINES, DESTINATIONS and
+    EVENTS; time is the predicted departure in epoch seconds (UTC); due_in
+    is minutes, or -1 if the feed didn't say.
+    """
+
+    __slots__ = ("time", "due_in", "trn", "line", "destination", "last_event", "subscription")
+
+    def __init__(self, time, due_in, trn, line, destination, last_event, subscription):
+        self.time = time
+        self.due_in = due_in
+        self.trn = trn
+        self.line = line
+        self.destination = destination
+        self.last_event = last_event
+        self.subscription = subscription
+
+    def __repr__(self):
+        return (f"Departure({self.trn}, {LINES.name(self.line)} to {DESTINATIONS.name(self.destination)}, "
+                f"due {self.due_in} min, {EVENTS.name(self.last_event)})")
+
+
+class DepartureTable:
+    """A set of departures, held as parallel arrays rather than objects.
+
+    Each column is indexed by departure. `subscription` is the index of the
+    subscription (station and platform) a departure came from, when several
+    are fetched together.
+    """
+
+    def __init__(self):
+        self.times = array("l")
+        self.due_in = array("h")
+        self.trn = array("H")
+        self.line = bytearray()
+        self.destination = bytearray()
+        self.last_event = bytearray()
+        self.subscription = bytearray()
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, i):
+        return Departure(
+            self.times[i], self.due_in[i], self.trn[i], self.line[i],
+            self.destination[i], self.last_event[i], self.subscription[i],
+        )
+
+    def __iter__(self):
+        for i in range(len(self.times)):
+            yield self[i]
+
+    def add(self, train, subscription=0):
+        """Append a train, as returned by DepartureParser.feed()."""
+
+        trn, due_in, predicted, line, destination, last_event = train
+        self.times.append(iso_to_epoch(predicted))
+        self.due_in.append(due_in if due_in is not None else -1)
+        self.trn.append(int(trn) if trn and trn.isdigit() else 0)
+        self.line.append(LINES.code(line))
+        self.destination.append(DESTINATIONS.code(destination))
+        self.last_event.append(EVENTS.code(last_event))
+        self.subscription.append(subscription)
+
+    def take(self, other, subscription):
+        """Append the departures in another table from one subscription,
+        as when that subscription's fetch fails and its last ones stand in.
+        Call sort() after."""
+
+        for i in range(len(other)):
+            if other.subscription[i] == subscription:
+                self.times.append(other.times[i])
+                self.due_in.append(other.due_in[i])
+                self.trn.append(other.trn[i])
+                self.line.append(other.line[i])
+                self.destination.append(other.destination[i])
+                self.last_event.append(other.last_event[i])
+                self.subscription.append(subscription)
+
+    def sort(self):
+        """Put the departures in order of predicted time."""
+
+        times = self.times
+        order = sorted(range(len(times)), key=lambda i: times[i])
+        self.times = array("l", [times[i] for i in order])
+        self.due_in = array("h", [self.due_in[i] for i in order])
+        self.trn = array("H", [self.trn[i] for i in order])
+        self.line = bytearray([self.line[i] for i in order])
+        self.destination = bytearray([self.destination[i] for i in order])
+        self.last_event = bytearray([self.last_event[i] for i in order])
+        self.subscription = bytearray([self.subscription[i] for i in order])
@@ -1,18 +1,14 @@
-import urequests
-import json
 import uasyncio
 import plasma
 from plasma import plasma_stick
 import time
 import WIFI_CONFIG
 from network_manager import NetworkManager
-import urequests
 from machine import RTC
 import ntptime
 
 
-# We'll move parts to a separate file eventually.
-# from metro_api import get_station_mapping, get_platform_info
+from metro_api import api_get, get_station_mapping, get_platform_info, governor
 
 
 # Number of LEDs around clock face
@@ -51,61 +47,22 @@ def blank_leds():
         led_strip.set_hsv(i, 0, 0, 0)
 
 
-def get_station_mapping():
-    """Retrieve and parse station mappings from API query.
-
-    TODO: move to separate module.
-    """
-
-    try:
-        response = urequests.get("https://metro-rti.nexus.org.uk/api/stations")
-        stations_data = response.json()
-
-        name_to_code = {}
-        for code, name in stations_data.items():
-            name_to_code[name] = code
-
-        return name_to_code
-    except Exception as e:
-        print(f"Error fetching station data: {e}")
-        return {}
-
-
-def get_platform_info(station_code):
-    """Get platform information for a station.
-
-    Args:
-        station_code: Three letter station code (e.g. 'MTS')
-
-    Returns:
-        List of helper text strings for each platform
-
-    TODO: Move to separate module.
-    """
-    try:
-        response = urequests.get(
-            "https://metro-rti.nexus.org.uk/api/stations/platforms"
-        )
-        platforms_data = response.json()
-
-        if station_code not in platforms_data:
-            return []
-
-        station_platforms = platforms_data[station_code]
-        helper_texts = [platform["helperText"] for platform in station_platforms]
-
-        return helper_texts
-
-    except Exception as e:
-        print(f"Error fetching platform data: {e}")
-        return []
-
-
 def get_platform_times(station_code, platform_num):
+    path = f"/api/times/{station_code}/{platform_num}"
     try:
-        url = f"https://metro-rti.nexus.org.uk/api/times/{station_code}/{platform_num}"
-        response = urequests.get(url)
-        times_data = response.json()
+        # Refused at once while the endpoint is failing, or we're over budget.
+        governor.check(path)
+        try:
+            # Over the shared kept-alive connection, not a new one each time.
+            response = api_get(path)
+            try:
+                times_data = response.json()
+            finally:
+                response.close()
+        except Exception:
+            governor.failure(path)
+            raise
+        governor.success(path)
 
         departure_times = []
         for train in times_data:
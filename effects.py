@@ -0,0 +1,256 @@
+"""Animated effects for the LED ring: fades, sparkles, rain and snow, pulses.
+
+The examples keep the strip as a list of [r, g, b] lists and step it towards
+a target with a Python loop per channel per LED, then make another pass to
+send every pixel. Here the current and target colours are flat bytearrays,
+the same layout as a Canvas, and each frame is one call over the whole
+buffer. On the board that call is compiled with MicroPython's viper emitter
+to machine code working on the raw bytes; elsewhere it's plain Python that
+skips the runs of the buffer that have already arrived.
+
+Effects draw into a Canvas (usually a Layer), so the FrameBuffer only sends
+the pixels that changed.
+"""
+
+import sys
+from random import randrange, random
+
+from colour import GAMMA8
+
+
+# Bytes compared at a time before stepping through them one by one.
+BLOCK = 48
+
+EMITTER = "python"
+
+
+def fade_to(current, target, up, down):
+    """Move every byte of `current` towards `target`, by at most a step.
+
+    Args:
+        current: Bytearray to change, e.g. a Canvas's pixels.
+        target: Bytearray of what to move towards, the same length.
+        up: Most to add to a byte below its target.
+        down: Most to take off a byte above its target.
+
+    Returns:
+        The number of bytes changed; 0 once everything has arrived.
+    """
+
+    changed = 0
+    for block in range(0, len(current), BLOCK):
+        end = block + BLOCK
+        if current[block:end] == target[block:end]:
+            continue
+        for i in range(block, min(end, len(current))):
+            c = current[i]
+            t = target[i]
+            if c < t:
+                current[i] = t if c + up > t else c + up
+                changed += 1
+            elif c > t:
+                current[i] = t if c - down < t else c - down
+                changed += 1
+    return changed
+
+
+if sys.implementation.name == "micropython":
+    import micropython
+
+    # Type names like ptr8 only exist inside viper functions, so this can't
+    # even be defined on CPython.
+    @micropython.viper
+    def fade_to(current, target, up: int, down: int) -> int:
+        src = ptr8(current)
+        dst = ptr8(target)
+        n = int(len(current))
+        changed = 0
+        i = 0
+        while i < n:
+            c = src[i]
+            t = dst[i]
+            if c < t:
+                c += up
+                src[i] = t if c > t else c
+                changed += 1
+            elif c > t:
+                c -= down
+                src[i] = t if c < t else c
+                changed += 1
+            i += 1
+        return changed
+
+    EMITTER = "viper"
+
+
+def _count(expected):
+    """A whole number of events, averaging `expected` over many frames."""
+
+    count = int(expected)
+    if random() < expected - count:
+        count += 1
+    return count
+
+
+class Fade:
+    """Fade a Canvas towards target colours, a step per frame.
+
+    Set colours in `target` with set_target() or fill_target(), or write to
+    it directly, then call step() once a frame.
+
+    Args:
+        canvas: The Canvas (or Layer) to draw into.
+        up: Most a channel rises per frame.
+        down: Most a channel falls per frame.
+    """
+
+    def __init__(self, canvas, up=1, down=1):
+        self.canvas = canvas
+        self.target = bytearray(len(canvas.pixels))
+        self.up = up
+        self.down = down
+
+    def set_target(self, index, r, g, b):
+        i = index * 3
+        target = self.target
+        target[i] = r
+        target[i + 1] = g
+        target[i + 2] = b
+
+    def fill_target(self, r, g, b):
+        self.target[:] = bytes((r, g, b)) * self.canvas.num_leds
+
+    def settled(self):
+        """Whether every pixel has reached its target."""
+
+        return self.canvas.pixels == self.target
+
+    def step(self):
+        """Move the canvas on a frame. Returns the number of bytes changed."""
+
+        changed = fade_to(self.canvas.pixels, self.target, self.up, self.down)
+        if changed:
+            self.canvas.mark(0, self.canvas.num_leds)
+        return changed
+
+
+class Sparkle(Fade):
+    """Pixels that fade up to a sparkle colour, then back to the background.
+
+    As examples/sparkles.py, but only the pixels mid-sparkle are looked at
+    each frame rather than all of them.
+
+    Args:
+        canvas: The Canvas (or Layer) to draw into.
+        background: (r, g, b) between sparkles.
+        colour: (r, g, b) at the peak of a sparkle.
+        chance: Chance each frame that a given pixel starts to sparkle.
+        up, down: Most a channel changes per frame, as Fade.
+    """
+
+    def __init__(self, canvas, background, colour, chance=0.005, up=2, down=2):
+        super().__init__(canvas, up, down)
+        self.background = bytes(background)
+        self.colour = bytes(colour)
+        self.chance = chance
+        self.fill_target(*background)
+        # Indexes of pixels heading for the sparkle colour.
+        self._rising = set()
+
+    def step(self):
+        canvas = self.canvas
+        pixels = canvas.pixels
+        target = self.target
+        for index in list(self._rising):
+            i = index * 3
+            if pixels[i:i + 3] == self.colour:
+                target[i:i + 3] = self.background
+                self._rising.discard(index)
+        for _ in range(_count(self.chance * canvas.num_leds)):
+            index = randrange(canvas.num_leds)
+            target[index * 3:index * 3 + 3] = self.colour
+            self._rising.add(index)
+        return super().step()
+
+
+class Drops(Fade):
+    """Rain or snow: drops that appear at once, then fade into a backdrop.
+
+    As in examples/weather.py. Drops are painted straight into the canvas,
+    for an abrupt change to the drop colour, and fade out at `down` a frame.
+
+    Args:
+        canvas: The Canvas (or Layer) to draw into.
+        backdrop: (r, g, b) between drops.
+        colour: (r, g, b) of a new drop.
+        chance: Chance each frame that a drop lands on a given pixel.
+        down: How quickly drops fade, per channel per frame.
+    """
+
+    def __init__(self, canvas, backdrop, colour, chance=0.01, down=2):
+        super().__init__(canvas, up=down, down=down)
+        self.colour = colour
+        self.chance = chance
+        self.fill_target(*backdrop)
+
+    def step(self):
+        canvas = self.canvas
+        r, g, b = self.colour
+        for _ in range(_count(self.chance * canvas.num_leds)):
+            canvas.set_rgb(randrange(canvas.num_leds), r, g, b)
+        return super().step()
+
+
+class Pulse:
+    """A brightness that rises and falls smoothly, for pulsing a colour.
+
+    The levels for one cycle are worked out once, gamma corrected so the
+    pulse looks even to the eye, and stepped through a frame at a time.
+
+    Args:
+        frames: Frames per cycle.
+        low: Dimmest level, 0-255.
+        high: Brightest level, 0-255.
+    """
+
+    def __init__(self, frames=60, low=0, high=255):
+        levels = bytearray(frames)
+        for i in range(frames):
+            # A triangle wave, smoothed to ease in and out at each end.
+            x = 1 - abs(2 * i / frames - 1)
+            x = x * x * (3 - 2 * x)
+            levels[i] = GAMMA8[int(low + (high - low) * x + 0.5)]
+        self.levels = levels
+        self.frame = 0
+
+    def next_frame(self):
+        self.frame = (self.frame + 1) % len(self.levels)
+
+    def level(self):
+        """The current brightness, 0-255."""
+
+        return self.levels[self.frame]
+
+    def at(self, phase):
+        """The brightness at a point in the cycle, 0-255, for pulses timed
+        by a clock rather than by frames.
+
+        Args:
+            phase: How far through the cycle, 0-255.
+        """
+
+        return self.levels[phase * len(self.levels) >> 8]
+
+    def scale(self, r, g, b):
+        """A colour dimmed to the current brightness."""
+
+        level = self.levels[self.frame] + 1
+        return r * level >> 8, g * level >> 8, b * level >> 8
+
+    def fill(self, canvas, r, g, b, start=0, end=None):
+        """Fill pixels [start, end) of a Canvas with the pulsed colour."""
+
+        if end is None:
+            end = canvas.num_leds
+        canvas.pixels[start * 3:end * 3] = bytes(self.scale(r, g, b)) * (end - start)
+        canvas.mark(start, end)
@@ -0,0 +1,177 @@
+"""Run the clock's MicroPython code unmodified on a workstation.
+
+install() puts fakes for the Pico-only modules (plasma, machine, network,
+rp2, ntptime, urequests, uasyncio, micropython, WIFI_CONFIG) into
+sys.modules and points the time module at a simulated clock. After that,
+main.py and friends import and run under CPython:
+
+    import emulator
+
+    emulation = emulator.install(end=emulator.DEFAULT_START + 3600)
+    with emulator.StandInServer() as server:
+        emulator.use_stand_in(server)
+        emulator.run_script("main.py")
+
+The fakes stay installed until uninstall(). The clock's own modules
+imported meanwhile keep references to them, so uninstall() forgets those
+again, and the next emulation imports them afresh; anything still holding
+one keeps the old fakes.
+"""
+
+import asyncio
+import os
+import runpy
+import sys
+import types
+
+from emulator import hardware
+from emulator import requests as urequests
+from emulator.clock import DEFAULT_START, SimClock, SimLoopPolicy, SimulationEnd, make_uasyncio, patch_time
+from emulator.server import StandInServer, live_times
+
+
+# The clock's own modules live here, next to the emulator package.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Emulation:
+    """What install() set up: the clock, and the fake modules by name."""
+
+    def __init__(self, clock, modules, restore_time):
+        self.clock = clock
+        self.modules = modules
+        self._restore_time = restore_time
+        self._imported = set(sys.modules)
+        # timebase.ntp_time, as it was before install() replaced it.
+        self._ntp_time = None
+
+    def __getattr__(self, name):
+        try:
+            return self.modules[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    @property
+    def led_strips(self):
+        """Every WS2812 created so far, in order."""
+        return hardware.WS2812.instances
+
+
+_current = None
+
+
+def _wifi_config():
+    config = types.ModuleType("WIFI_CONFIG")
+    config.SSID = "emulator"
+    config.PSK = "emulator"
+    config.COUNTRY = "GB"
+    config.ENDPOINT = ""
+    return config
+
+
+def install(clock=None, start=DEFAULT_START, end=None):
+    """Install the fake modules and simulated time.
+
+    Args:
+        clock: SimClock to run on; a new one from start to end if None.
+        start: Wall time to start at, in UTC epoch seconds.
+        end: Wall time at which sleeps raise SimulationEnd, or None to run on.
+
+    Returns:
+        An Emulation, giving access to the clock and fake modules.
+    """
+
+    global _current
+    if _current is not None:
+        uninstall()
+    if clock is None:
+        clock = SimClock(start, end)
+
+    plasma, plasma_stick = hardware.make_plasma()
+    modules = {
+        "plasma": plasma,
+        "plasma.plasma_stick": plasma_stick,
+        "machine": hardware.make_machine(clock),
+        "network": hardware.make_network(clock),
+        "rp2": hardware.make_rp2(),
+        "ntptime": hardware.make_ntptime(clock),
+        "micropython": hardware.make_micropython(),
+        "uasyncio": make_uasyncio(clock),
+        "urequests": urequests,
+        "WIFI_CONFIG": _wifi_config(),
+    }
+    hardware.WS2812.instances = []
+    sys.modules.update(modules)
+    asyncio.set_event_loop_policy(SimLoopPolicy(clock))
+    _current = Emulation(clock, modules, patch_time(clock))
+    # SNTP goes to the fake ntptime rather than the network; imported now if
+    # it wasn't already, so under the fakes.
+    import timebase
+
+    _current._ntp_time = timebase.ntp_time
+    timebase.ntp_time = modules["ntptime"].query
+    return _current
+
+
+def uninstall():
+    """Remove the fakes and put real time back."""
+
+    global _current
+    if _current is None:
+        return
+    timebase = sys.modules.get("timebase")
+    if timebase is not None:
+        timebase.ntp_time = _current._ntp_time
+    for name in _current.modules:
+        sys.modules.pop(name, None)
+    # The clock's modules imported under the fakes are bound to them.
+    for name in set(sys.modules) - _current._imported:
+        path = getattr(sys.modules[name], "__file__", None) or ""
+        if path and os.path.dirname(os.path.abspath(path)) == ROOT:
+            del sys.modules[name]
+    _current._restore_time()
+    asyncio.set_event_loop_policy(None)
+    urequests.redirect_to(None)
+    _current = None
+
+
+def use_stand_in(server):
+    """Send the clock's API requests to a StandInServer."""
+
+    import metro_api
+
+    if server.clock is None and _current is not None:
+        # Date headers in simulated time, as the clock reads the time off them.
+        server.clock = _current.clock
+    urequests.redirect_to(server.base_url)
+    # Breakers and budget start afresh, as they were about another server.
+    metro_api.governor = metro_api.RequestGovernor()
+    metro_api.client = server.client()
+    metro_api.async_clients = [
+        server.async_client(timeout=metro_api.REQUEST_TIMEOUT) for _ in range(metro_api.MAX_CONCURRENT)
+    ]
+    # Any further clients fetch_subscriptions() adds go to the server too.
+    metro_api.AsyncHTTPClient = lambda host, port=None, **kwargs: server.async_client(**kwargs)
+
+
+def run_script(path="main.py"):
+    """Run a script as __main__ until the simulated clock reaches its end.
+
+    Returns the script's globals, or None if it was stopped part way.
+    """
+
+    try:
+        return runpy.run_path(path, run_name="__main__")
+    except SimulationEnd:
+        pass
+
+    # Let the tasks the script left behind finish cancelling, quietly.
+    loop = asyncio.get_event_loop()
+    tasks = asyncio.all_tasks(loop)
+    for task in tasks:
+        task.cancel()
+    end, _current.clock.end = _current.clock.end, None
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    _current.clock.end = end
+    loop.close()
+    return None
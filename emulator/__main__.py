@@ -0,0 +1,56 @@
+"""Run main.py against the stand-in server in simulated time.
+
+    python -m emulator [--minutes N] [--cpu-scale X] [script]
+    python -m emulator [minutes] [script]
+
+Trains run every 12 minutes, on time. Opening a connection takes as long as
+a TLS handshake does on the board. Prints the script's output, then
+which LEDs were left lit.
+"""
+
+import argparse
+import time
+
+import emulator
+
+# Seconds a TLS handshake with the API takes on the board.
+HANDSHAKE_S = 2
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m emulator")
+    # [minutes] [script], as the emulator first took them, or just [script].
+    parser.add_argument("positional", nargs="*", metavar="[minutes] [script]")
+    parser.add_argument("--minutes", type=float, default=60, help="simulated minutes to run for")
+    parser.add_argument(
+        "--cpu-scale", type=float, default=0,
+        help="simulated seconds per real second spent computing; around 50 roughly matches an RP2040",
+    )
+    args = parser.parse_args()
+    positional = args.positional
+    if positional:
+        try:
+            args.minutes = float(positional[0])
+            positional = positional[1:]
+        except ValueError:
+            pass
+    if len(positional) > 1:
+        parser.error("expected at most [minutes] [script]")
+    args.script = positional[0] if positional else "main.py"
+
+    emulation = emulator.install(end=emulator.DEFAULT_START + args.minutes * 60)
+    emulation.clock.cpu_scale = args.cpu_scale
+    started = time.perf_counter()
+    with emulator.StandInServer(times=emulator.live_times(emulation.clock), handshake=HANDSHAKE_S) as server:
+        emulator.use_stand_in(server)
+        emulator.run_script(args.script)
+    elapsed = time.perf_counter() - started
+
+    for strip in emulation.led_strips:
+        print(f"LEDs lit: {strip.lit()} ({strip.calls} strip calls)")
+    print(f"{args.minutes:.0f} simulated minutes in {elapsed:.1f} s; {server.requests} API requests")
+    emulator.uninstall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Simulated time for running the clock's code on a workstation.
+
+SimClock is the single source of time: the fake RTC, time.time(), the ticks
+functions and the event loop all read it. Time only moves when something
+sleeps, so a day of polling can run in seconds and every run is repeatable.
+
+Real network I/O to a stand-in server still happens. While a request is in
+flight the simulated clock follows real time, so server latency shows up in
+simulated time the way it would on hardware.
+
+Computation is free by default. Set cpu_scale to charge real time spent
+computing to the clock, scaled up to roughly how much slower the board is,
+so frame budgets can be checked here as they'd be on the board.
+"""
+
+import asyncio
+import calendar
+import selectors
+import sys
+import time as _time
+import types
+
+# The real functions, captured before patch_time() replaces them; anything
+# running outside simulated time (such as the stand-in server) uses these.
+_gmtime = _time.gmtime
+_time_now = _time.time
+_monotonic = _time.monotonic
+real_sleep = _time.sleep
+
+# MicroPython's ticks_ms() and friends wrap at 2**30.
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+# Default start: 07:00 UTC on a Monday in January.
+DEFAULT_START = calendar.timegm((2025, 1, 6, 7, 0, 0))
+
+
+class SimulationEnd(Exception):
+    """Raised out of sleeps and the event loop once the clock reaches `end`."""
+
+
+class SimClock:
+    """Simulated wall and monotonic time.
+
+    Args:
+        start: Wall time to start at, in UTC epoch seconds.
+        end: Optional wall time at which to stop the simulation.
+    """
+
+    def __init__(self, start=DEFAULT_START, end=None):
+        self._wall = float(start)
+        self._monotonic = 0.0
+        self.end = end
+        # Requests currently waiting on real I/O; see SimLoop.
+        self.in_flight = 0
+        # Seconds the RTC is off from true time; set by the RTC and NTP fakes.
+        self.rtc_offset = 0.0
+        # Fraction by which the RTC runs fast (positive) or slow.
+        self.rtc_drift = 0.0
+        # ...and the same for the ticks counters, which on the board run off
+        # the same crystal.
+        self.ticks_drift = 0.0
+        # Simulated seconds charged per real second spent computing.
+        self.cpu_scale = 0.0
+        self._busy_since = _monotonic()
+
+    def charge(self):
+        """Charge real time spent computing since last time to the clock."""
+
+        now = _monotonic()
+        if self.cpu_scale:
+            busy = (now - self._busy_since) * self.cpu_scale
+            self._wall += busy
+            self._monotonic += busy
+        self._busy_since = now
+
+    def wall(self):
+        """True wall time, in epoch seconds."""
+        self.charge()
+        return self._wall
+
+    def monotonic(self):
+        self.charge()
+        return self._monotonic
+
+    def rtc(self):
+        """What the board's RTC reads, including any offset and drift."""
+        self.charge()
+        return self._wall + self.rtc_offset + self._monotonic * self.rtc_drift
+
+    def set_rtc(self, seconds):
+        self.charge()
+        self.rtc_offset = seconds - self._wall - self._monotonic * self.rtc_drift
+
+    def advance(self, seconds):
+        """Move the clock on by time spent waiting, rather than computing."""
+
+        if seconds > 0:
+            self._wall += seconds
+            self._monotonic += seconds
+        self._busy_since = _monotonic()
+        if self.end is not None and self._wall >= self.end:
+            raise SimulationEnd()
+
+    def sleep(self, seconds):
+        self.charge()
+        self.advance(seconds)
+
+    # MicroPython's time functions, bound to this clock.
+
+    def time(self):
+        return int(self.rtc())
+
+    def time_ns(self):
+        return int(self.rtc() * 1000000000)
+
+    def gmtime(self, secs=None):
+        if secs is None:
+            secs = self.rtc()
+        t = _gmtime(secs)
+        # MicroPython gives an 8-tuple: no isdst.
+        return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+    def mktime(self, t):
+        # The RTC is UTC and MicroPython's mktime() does no timezone work.
+        return calendar.timegm(tuple(t[:6]) + (0, 0, 0))
+
+    def ticks_ms(self):
+        return int(self.monotonic() * (1 + self.ticks_drift) * 1000) & TICKS_MAX
+
+    def ticks_us(self):
+        return int(self.monotonic() * (1 + self.ticks_drift) * 1000000) & TICKS_MAX
+
+    def ticks_cpu(self):
+        return self.ticks_us()
+
+    @staticmethod
+    def ticks_add(ticks, delta):
+        return (ticks + delta) & TICKS_MAX
+
+    @staticmethod
+    def ticks_diff(end, start):
+        return ((end - start + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+    def sleep_ms(self, ms):
+        self.sleep(ms / 1000)
+
+    def sleep_us(self, us):
+        self.sleep(us / 1000000)
+
+
+class _SimSelector:
+    """Selector wrapper that jumps simulated time instead of waiting.
+
+    With nothing in flight, an idle wait is skipped and the clock advanced
+    to the next timer. While a request is in flight we really wait, and the
+    clock advances by however long that took.
+    """
+
+    def __init__(self, selector, clock):
+        self._selector = selector
+        self._clock = clock
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+    def select(self, timeout=None):
+        clock = self._clock
+        clock.charge()
+        if clock.in_flight or timeout is None:
+            start = _monotonic()
+            events = self._selector.select(timeout)
+            clock.advance(_monotonic() - start)
+            return events
+        events = self._selector.select(0)
+        if not events:
+            clock.advance(timeout)
+        return events
+
+
+class SimLoop(asyncio.SelectorEventLoop):
+    """Event loop running on a SimClock."""
+
+    def __init__(self, clock):
+        super().__init__(selectors.DefaultSelector())
+        self._sim_clock = clock
+        self._selector = _SimSelector(self._selector, clock)
+        # Timers due within this much are run now; keep it tight.
+        self._clock_resolution = 1e-6
+
+    def time(self):
+        return self._sim_clock.monotonic()
+
+
+class SimLoopPolicy(asyncio.DefaultEventLoopPolicy):
+    def __init__(self, clock):
+        super().__init__()
+        self._clock = clock
+
+    def new_event_loop(self):
+        return SimLoop(self._clock)
+
+
+class _InFlightReader:
+    """StreamReader wrapper marking the clock as waiting on real I/O."""
+
+    def __init__(self, reader, clock):
+        self._reader = reader
+        self._clock = clock
+
+    async def _wait(self, coro):
+        self._clock.in_flight += 1
+        try:
+            return await coro
+        finally:
+            self._clock.in_flight -= 1
+
+    async def read(self, n=-1):
+        return await self._wait(self._reader.read(n))
+
+    async def readline(self):
+        return await self._wait(self._reader.readline())
+
+    async def readexactly(self, n):
+        return await self._wait(self._reader.readexactly(n))
+
+
+def make_uasyncio(clock):
+    """Build a `uasyncio` module for CPython, running on the given clock."""
+
+    module = types.ModuleType("uasyncio")
+    for name in dir(asyncio):
+        if not name.startswith("_"):
+            setattr(module, name, getattr(asyncio, name))
+
+    async def sleep_ms(ms):
+        await asyncio.sleep(ms / 1000)
+
+    async def wait_for_ms(aw, timeout):
+        return await asyncio.wait_for(aw, timeout / 1000)
+
+    async def open_connection(host, port, **kwargs):
+        clock.in_flight += 1
+        try:
+            reader, writer = await asyncio.open_connection(host, port, **kwargs)
+        finally:
+            clock.in_flight -= 1
+        return _InFlightReader(reader, clock), writer
+
+    class ThreadSafeFlag:
+        def __init__(self):
+            self._event = asyncio.Event()
+
+        def set(self):
+            self._event.set()
+
+        def clear(self):
+            self._event.clear()
+
+        async def wait(self):
+            await self._event.wait()
+            self._event.clear()
+
+    module.sleep_ms = sleep_ms
+    module.wait_for_ms = wait_for_ms
+    module.open_connection = open_connection
+    module.ThreadSafeFlag = ThreadSafeFlag
+    return module
+
+
+def patch_time(clock):
+    """Point the time module's functions at clock, MicroPython style.
+
+    Returns a function that puts the originals back. time.monotonic() and
+    time.perf_counter() are left alone, so real elapsed time can still be
+    measured.
+    """
+
+    names = (
+        "time", "time_ns", "gmtime", "localtime", "mktime", "sleep", "sleep_ms", "sleep_us",
+        "ticks_ms", "ticks_us", "ticks_cpu", "ticks_add", "ticks_diff",
+    )
+    module = sys.modules["time"]
+    saved = {name: getattr(module, name) for name in names if hasattr(module, name)}
+    for name in names:
+        setattr(module, name, getattr(clock, "gmtime" if name == "localtime" else name))
+
+    def restore():
+        for name in names:
+            if name in saved:
+                setattr(module, name, saved[name])
+            else:
+                delattr(module, name)
+
+    return restore
@@ -0,0 +1,404 @@
+"""Fakes for the Pico's hardware modules: plasma, machine, network, rp2, ntptime.
+
+Each make_* function builds a module object bound to a SimClock, ready to be
+dropped into sys.modules by emulator.install().
+"""
+
+import asyncio
+import colorsys
+import random
+import types
+
+
+class WS2812:
+    """In-memory stand-in for plasma.WS2812.
+
+    Pixels live in `pixels`, a flat bytearray of r, g, b per LED. `calls`
+    counts set_rgb / set_hsv / get calls, the native round-trips that cost
+    time on the real board. Every strip created is kept in `instances`, so
+    a script's strip can be found after it has run.
+    """
+
+    instances = []
+
+    def __init__(self, num_leds, pio=0, sm=0, dat=15, freq=800000, color_order=None, rgbw=False):
+        self.num_leds = num_leds
+        self.color_order = color_order
+        self.pixels = bytearray(num_leds * 3)
+        self.calls = 0
+        self.started = False
+        WS2812.instances.append(self)
+
+    def start(self, fps=60):
+        self.started = True
+        self.fps = fps
+
+    def set_rgb(self, index, r, g, b, w=0):
+        self.calls += 1
+        i = index * 3
+        self.pixels[i] = int(r) & 0xFF
+        self.pixels[i + 1] = int(g) & 0xFF
+        self.pixels[i + 2] = int(b) & 0xFF
+
+    def set_hsv(self, index, h, s=1.0, v=1.0, w=0):
+        r, g, b = colorsys.hsv_to_rgb(h % 1.0, min(1.0, max(0.0, s)), min(1.0, max(0.0, v)))
+        self.set_rgb(index, r * 255, g * 255, b * 255)
+
+    def get(self, index):
+        self.calls += 1
+        i = index * 3
+        return (self.pixels[i], self.pixels[i + 1], self.pixels[i + 2], 0)
+
+    def clear(self):
+        self.pixels = bytearray(self.num_leds * 3)
+
+    def lit(self):
+        """Indexes of LEDs that aren't black."""
+        pixels = self.pixels
+        return [i for i in range(self.num_leds) if pixels[i * 3] or pixels[i * 3 + 1] or pixels[i * 3 + 2]]
+
+
+def make_plasma():
+    plasma = types.ModuleType("plasma")
+    plasma.WS2812 = WS2812
+    for i, name in enumerate(("RGB", "RBG", "GRB", "GBR", "BRG", "BGR")):
+        setattr(plasma, "COLOR_ORDER_" + name, i)
+
+    plasma_stick = types.ModuleType("plasma.plasma_stick")
+    plasma_stick.DAT = 15
+    plasma.plasma_stick = plasma_stick
+    return plasma, plasma_stick
+
+
+def make_machine(clock):
+    machine = types.ModuleType("machine")
+
+    class RTC:
+        def datetime(self, value=None):
+            if value is not None:
+                year, month, day, _, hour, minute, second = value[:7]
+                clock.set_rtc(clock.mktime((year, month, day, hour, minute, second)))
+                return None
+            year, month, day, hour, minute, second, weekday, _ = clock.gmtime()
+            return (year, month, day, weekday, hour, minute, second, 0)
+
+    class Pin:
+        IN = 0
+        OUT = 1
+        PULL_UP = 1
+        PULL_DOWN = 2
+
+        def __init__(self, pin, mode=IN, pull=None, value=None):
+            self.pin = pin
+            self._value = value or 0
+
+        def value(self, value=None):
+            if value is None:
+                return self._value
+            self._value = 1 if value else 0
+
+        def on(self):
+            self._value = 1
+
+        def off(self):
+            self._value = 0
+
+        def toggle(self):
+            self._value ^= 1
+
+    class Timer:
+        ONE_SHOT = 0
+        PERIODIC = 1
+
+        def __init__(self, id=-1, **kwargs):
+            if kwargs:
+                self.init(**kwargs)
+
+        def init(self, mode=PERIODIC, period=-1, callback=None, freq=None):
+            # Callbacks aren't simulated; the examples using this only refresh data.
+            self.callback = callback
+
+        def deinit(self):
+            self.callback = None
+
+    machine.RTC = RTC
+    machine.Pin = Pin
+    machine.Timer = Timer
+    machine.unique_id = lambda: b"\xe6\x61\x40\x00\x00\x00\x00\x00"
+    machine.freq = lambda hz=None: 125000000
+    machine.reset = lambda: None
+    machine.sleeps = []
+
+    def lightsleep(ms=None):
+        machine.sleeps.append(("light", ms))
+        clock.sleep(ms / 1000 if ms else 0)
+
+    def deepsleep(ms=None):
+        machine.sleeps.append(("deep", ms))
+        clock.sleep(ms / 1000 if ms else 0)
+
+    machine.lightsleep = lightsleep
+    machine.deepsleep = deepsleep
+    return machine
+
+
+class WLAN:
+    """Fake network.WLAN interface.
+
+    connect() completes `connect_delay` simulated seconds later, less
+    `scan_delay` if given the access point's BSSID and `dhcp_delay` if an
+    address was set with ifconfig(). Tests can call drop() and restore() to
+    take the link down and back up, or list (start, end) times in
+    `outages`, in the clock's monotonic seconds, during which the access
+    point can't be reached and any link is lost. Each association also
+    takes up to `jitter` seconds longer, at random from `seed`, as a busy
+    channel would. radio_on() says how long the interface has been active
+    in all, or with a given power management mode; `connects` and `scans`
+    count the calls to each. ifconfig("dhcp") blocks and raises OSError
+    unless the link is up, as the real one does; ipconfig(dhcp4=True)
+    doesn't wait.
+    """
+
+    BSSID = b"\x28\xcd\xc1\x00\x00\xa1"
+    # Seconds ifconfig("dhcp") waits for a lease before giving up, as lwIP's.
+    DHCP_WAIT = 10
+    # Power management modes for config(pm=...). Only told apart here; the
+    # board's values are the cyw43 driver's.
+    PM_NONE = 1
+    PM_PERFORMANCE = 2
+    PM_POWERSAVE = 3
+
+    def __init__(self, clock, interface, connect_delay=2.0, scan_delay=0.8, dhcp_delay=0.7, jitter=0.0, seed=1):
+        self._clock = clock
+        self.interface = interface
+        self.connect_delay = connect_delay
+        self.scan_delay = scan_delay
+        self.dhcp_delay = dhcp_delay
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self.outages = []
+        self._static = False
+        self._active = False
+        self._ssid = None
+        self._connected_at = None
+        self._dropped = False
+        self._config = {"pm": 0, "channel": 6, "mac": b"\x28\xcd\xc1\x00\x00\x01"}
+        self._ifconfig = ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+        self.connects = 0
+        self.scans = 0
+        # Seconds active with each pm mode, and since when in the current one.
+        self._on_for = {}
+        self._on_since = None
+
+    def _account(self):
+        if self._on_since is not None:
+            pm = self._config["pm"]
+            now = self._clock.monotonic()
+            self._on_for[pm] = self._on_for.get(pm, 0.0) + now - self._on_since
+            self._on_since = now
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = bool(value)
+        if self._active and self._on_since is None:
+            self._on_since = self._clock.monotonic()
+        if not self._active:
+            # Off and on again forgets a fixed address.
+            self._static = False
+            self._connected_at = None
+            self._account()
+            self._on_since = None
+
+    def radio_on(self, pm=None):
+        """Simulated seconds the interface has been active, in all or with
+        power management mode `pm`."""
+        self._account()
+        if pm is None:
+            return sum(self._on_for.values())
+        return self._on_for.get(pm, 0.0)
+
+    def connect(self, ssid=None, key=None, bssid=None, **kwargs):
+        self.connects += 1
+        self._ssid = ssid
+        self._dropped = False
+        delay = self.connect_delay
+        if bssid == self.BSSID:
+            delay -= self.scan_delay
+        if self._static:
+            delay -= self.dhcp_delay
+        delay += self._random.uniform(0, self.jitter)
+        self._connected_at = self._clock.monotonic() + delay
+
+    def _out(self):
+        now = self._clock.monotonic()
+        for start, end in self.outages:
+            if start <= now < end:
+                return True
+        return False
+
+    def disconnect(self):
+        self._connected_at = None
+
+    def isconnected(self):
+        if self._out():
+            # Out of reach: the link, or the connect under way, is lost.
+            self._connected_at = None
+            return False
+        return (
+            self._active
+            and not self._dropped
+            and self._connected_at is not None
+            and self._clock.monotonic() >= self._connected_at
+        )
+
+    def status(self, param=None):
+        if param == "rssi":
+            return -55
+        if self.isconnected():
+            return 3  # STAT_GOT_IP
+        if self._connected_at is not None and not self._dropped:
+            return 1  # STAT_CONNECTING
+        if self._active and self._out():
+            return -2  # STAT_NO_AP_FOUND
+        return 0  # STAT_IDLE
+
+    def ifconfig(self, value=None):
+        if value is None:
+            return self._ifconfig if self.isconnected() else ("0.0.0.0",) * 4
+        if value == "dhcp":
+            # Blocks until DHCP gives a lease, which can't happen before
+            # the link is up, as the real one does.
+            if not self.isconnected():
+                self._clock.sleep(self.DHCP_WAIT)
+                raise OSError("timeout waiting for DHCP to get IP address")
+            self._clock.sleep(self.dhcp_delay)
+            self._static = False
+            return
+        self._static = True
+        self._ifconfig = tuple(value)
+
+    def ipconfig(self, *args, dhcp4=None, **kwargs):
+        """Only dhcp4=True, which goes back to DHCP at once."""
+        if dhcp4:
+            self._static = False
+
+    def scan(self):
+        """The one access point, unless it's out of reach; takes scan_delay."""
+        self.scans += 1
+        self._clock.sleep(self.scan_delay)
+        if self._out():
+            return []
+        return [(b"emulator", self.BSSID, self._config["channel"], -55, 3, False)]
+
+    def config(self, *args, **kwargs):
+        if args:
+            if args[0] == "ssid":
+                return self._ssid
+            return self._config.get(args[0])
+        self._account()
+        self._config.update(kwargs)
+
+    def drop(self):
+        """Simulate losing the link."""
+        self._dropped = True
+
+    def restore(self):
+        """Let a dropped link come back."""
+        self._dropped = False
+
+
+def make_network(clock):
+    network = types.ModuleType("network")
+    network.STA_IF = 0
+    network.AP_IF = 1
+    network.STAT_IDLE = 0
+    network.STAT_CONNECTING = 1
+    network.STAT_WRONG_PASSWORD = -3
+    network.STAT_NO_AP_FOUND = -2
+    network.STAT_CONNECT_FAIL = -1
+    network.STAT_GOT_IP = 3
+    # One interface of each kind, as on the board, so tests can reach them.
+    network.interfaces = {}
+
+    def WLAN_factory(interface=0):
+        if interface not in network.interfaces:
+            network.interfaces[interface] = WLAN(clock, interface)
+        return network.interfaces[interface]
+
+    WLAN_factory.PM_NONE = WLAN.PM_NONE
+    WLAN_factory.PM_PERFORMANCE = WLAN.PM_PERFORMANCE
+    WLAN_factory.PM_POWERSAVE = WLAN.PM_POWERSAVE
+    network.WLAN = WLAN_factory
+    return network
+
+
+def make_rp2():
+    rp2 = types.ModuleType("rp2")
+    rp2.country_code = None
+
+    def country(code=None):
+        if code is None:
+            return rp2.country_code
+        rp2.country_code = code
+
+    rp2.country = country
+    return rp2
+
+
+def make_ntptime(clock):
+    """Fake ntptime: settime() sets the RTC to true time.
+
+    Set `fail` to make settime() raise, as it does when NTP is unreachable;
+    it blocks for `timeout` seconds first, as the real one does. Set `delay`
+    for a slow server, in seconds, and `skew` for one giving the wrong time.
+
+    query() stands in for timebase.ntp_time(), which install() points at it:
+    the same answers, awaited in simulated time rather than blocking, and
+    never coming while `fail` is set.
+    """
+
+    ntptime = types.ModuleType("ntptime")
+    ntptime.host = "pool.ntp.org"
+    ntptime.timeout = 1
+    ntptime.fail = False
+    ntptime.delay = 0
+    ntptime.skew = 0
+    ntptime.calls = 0
+
+    def time():
+        ntptime.calls += 1
+        if ntptime.fail:
+            clock.sleep(ntptime.timeout)
+            raise OSError(110)  # ETIMEDOUT
+        clock.sleep(min(ntptime.delay, ntptime.timeout))
+        if ntptime.delay > ntptime.timeout:
+            raise OSError(110)
+        return int(clock.wall() + ntptime.skew)
+
+    def settime():
+        clock.set_rtc(time())
+
+    async def query():
+        ntptime.calls += 1
+        if ntptime.fail:
+            # No reply, however long the caller waits.
+            await asyncio.Event().wait()
+        await asyncio.sleep(ntptime.delay)
+        return int(clock.wall() + ntptime.skew)
+
+    ntptime.time = time
+    ntptime.query = query
+    ntptime.settime = settime
+    return ntptime
+
+
+def make_micropython():
+    micropython = types.ModuleType("micropython")
+    micropython.const = lambda value: value
+    micropython.native = lambda fn: fn
+    micropython.viper = lambda fn: fn
+    micropython.mem_info = lambda *args: None
+    micropython.alloc_emergency_exception_buf = lambda size: None
+    micropython.schedule = lambda fn, arg: fn(arg)
+    return micropython
@@ -0,0 +1,85 @@
+"""A urequests stand-in for CPython, built on http.client.
+
+Requests for the Metro API host are sent to the stand-in server instead, if
+one has been set with redirect_to().
+"""
+
+import http.client
+import json as _json
+
+API_URL = "https://metro-rti.nexus.org.uk"
+
+# Base URL that API requests are rewritten to, e.g. "http://127.0.0.1:8080".
+_redirect = None
+
+
+def redirect_to(base_url):
+    global _redirect
+    _redirect = base_url
+
+
+class Response:
+    def __init__(self, status_code, reason, headers, content):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self._content = content
+        self.raw = None
+
+    @property
+    def content(self):
+        return self._content
+
+    @property
+    def text(self):
+        return self._content.decode("utf-8")
+
+    def json(self):
+        return _json.loads(self._content)
+
+    def close(self):
+        pass
+
+
+def request(method, url, data=None, json=None, headers=None, timeout=None):
+    if _redirect is not None and url.startswith(API_URL):
+        url = _redirect + url[len(API_URL):]
+
+    scheme, _, rest = url.partition("://")
+    host, _, path = rest.partition("/")
+    if scheme == "https":
+        import ssl
+
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        connection = http.client.HTTPSConnection(host, timeout=timeout, context=context)
+    else:
+        connection = http.client.HTTPConnection(host, timeout=timeout)
+
+    headers = dict(headers or {})
+    if json is not None:
+        data = _json.dumps(json)
+        headers.setdefault("Content-Type", "application/json")
+    try:
+        connection.request(method, "/" + path, body=data, headers=headers)
+        response = connection.getresponse()
+        return Response(response.status, response.reason, dict(response.getheaders()), response.read())
+    finally:
+        connection.close()
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
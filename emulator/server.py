@@ -0,0 +1,274 @@
+"""A local stand-in for the Metro API, serving the files in example data/.
+
+Runs in a background thread, speaks HTTP/1.1 with keep-alive, and can add
+latency per endpoint, fail requests or serve over TLS, so the clock's
+network code can be exercised and benchmarked without touching the real
+service.
+"""
+
+import email.utils
+import hashlib
+import http.server
+import json
+import os
+import socket
+import ssl
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+
+from emulator.clock import _gmtime, _time_now, real_sleep
+
+# When the reference data last changed, for its Last-Modified header.
+REF_MODIFIED = "Mon, 06 Jan 2025 00:00:00 GMT"
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "example data")
+
+
+def read_example(name):
+    with open(os.path.join(DATA_DIR, name), "rb") as f:
+        return f.read()
+
+
+def _timestamp(seconds):
+    return time.strftime("%Y-%m-%dT%H:%M:%S.0000000+00:00", _gmtime(seconds))
+
+
+def live_times(clock, headway=720, phase=0, count=4, skew=0):
+    """A `times` function for StandInServer serving trains that run on time.
+
+    Trains leave every `headway` seconds, at multiples of it plus `phase`
+    past the epoch, and each response lists the next `count` of them as
+    seen from the clock's true time, plus `skew` seconds for a server
+    whose clock is out.
+    """
+
+    def times(station_code, platform):
+        now = clock.wall() + skew
+        first = now - (now - phase) % headway + headway
+        trains = []
+        for i in range(count):
+            due = first + i * headway
+            trains.append({
+                "trn": str(100 + int(due // headway) % 50),
+                "lastEvent": "DEPARTED",
+                "lastEventLocation": f"{station_code} Platform {platform}",
+                "lastEventTime": _timestamp(now),
+                "destination": "South Shields",
+                "dueIn": int((due - now) // 60),
+                "line": "YELLOW",
+                "actualPredictedTime": _timestamp(due),
+            })
+        return json.dumps(trains).encode()
+
+    return times
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response is expected (timeouts, resets).
+        pass
+
+
+class StandInServer:
+    """Local HTTP/1.1 server answering Metro API paths from example data/.
+
+    Args:
+        use_tls: Serve over TLS with a throwaway self-signed certificate
+            (needs the openssl command line tool).
+        delay: Latency in seconds added to every response: either a number,
+            or a function taking the request path so each endpoint can have
+            its own.
+        times: Body for /api/times requests: bytes, or a function taking
+            (station_code, platform) and returning bytes. Defaults to
+            example data/times.json.
+        clock: SimClock to stamp Date headers from, rather than real time.
+        skew: Seconds the server's Date headers are out by.
+        fault: Function taking the request path and returning how to fail
+            it: an HTTP status such as 503, "timeout" to hang up after
+            `stall` seconds without answering, "reset" to drop the
+            connection at once, or None to answer normally.
+        stall: Real seconds a "timeout" fault hangs for.
+        handshake: Simulated seconds each new connection from client() or
+            async_client() takes to open, blocking, as a TLS handshake
+            does on the board. Needs `clock`.
+
+    The reference data, /api/stations and /api/stations/platforms, comes
+    with an ETag and Last-Modified, and a request with either validator
+    matching gets a 304 instead, counted in `not_modified`.
+    """
+
+    def __init__(self, use_tls=False, delay=0, times=None, clock=None, skew=0, fault=None, stall=1.0, handshake=0):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def date_time_string(self, timestamp=None):
+                if timestamp is None:
+                    timestamp = server.clock.wall() if server.clock is not None else _time_now()
+                return email.utils.formatdate(timestamp + server.skew, usegmt=True)
+
+            def _fail(self, fault):
+                server.faults += 1
+                if fault == "timeout":
+                    real_sleep(server.stall)
+                elif fault == "reset":
+                    # Close with a RST rather than a FIN.
+                    self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+                else:
+                    self.send_error(fault)
+                    return
+                self.close_connection = True
+
+            def do_GET(self):
+                server.requests += 1
+                server.paths.append(self.path)
+                delay = server.delay(self.path) if callable(server.delay) else server.delay
+                if delay:
+                    real_sleep(delay)
+                fault = server.fault(self.path) if server.fault is not None else None
+                if fault is not None:
+                    self._fail(fault)
+                    return
+                body = server.body(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                etag = server.etag(self.path)
+                if etag is not None:
+                    # If-None-Match, when given, overrides If-Modified-Since.
+                    if "If-None-Match" in self.headers:
+                        unchanged = self.headers["If-None-Match"] == etag
+                    else:
+                        unchanged = self.headers.get("If-Modified-Since") == REF_MODIFIED
+                    if unchanged:
+                        server.not_modified += 1
+                        self.send_response(304)
+                        self.send_header("ETag", etag)
+                        self.end_headers()
+                        return
+                self.send_response(200)
+                if etag is not None:
+                    self.send_header("ETag", etag)
+                    self.send_header("Last-Modified", REF_MODIFIED)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.delay = delay
+        self.times = times
+        self.clock = clock
+        self.skew = skew
+        self.fault = fault
+        self.stall = stall
+        self.handshake = handshake
+        self.requests = 0
+        self.faults = 0
+        self.not_modified = 0
+        self.paths = []
+        self.use_tls = use_tls
+        self._files = {}
+        self._httpd = _Server(("127.0.0.1", 0), Handler)
+        self.port = self._httpd.server_address[1]
+        self._tmp = None
+        if use_tls:
+            self._tmp = tempfile.TemporaryDirectory()
+            cert = os.path.join(self._tmp.name, "cert.pem")
+            key = os.path.join(self._tmp.name, "key.pem")
+            subprocess.run(
+                ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                 "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+                check=True, capture_output=True,
+            )
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(cert, key)
+            self._httpd.socket = context.wrap_socket(self._httpd.socket, server_side=True)
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def _file(self, name):
+        if name not in self._files:
+            self._files[name] = read_example(name)
+        return self._files[name]
+
+    def body(self, path):
+        """Response body for an API path, or None for a 404."""
+
+        path = path.split("?")[0]
+        if path == "/api/stations":
+            return self._file("stations.json")
+        if path == "/api/stations/platforms":
+            return self._file("platforms.json")
+        if path.startswith("/api/times/"):
+            if self.times is None:
+                return self._file("times.json")
+            if callable(self.times):
+                station_code, platform = path[len("/api/times/"):].split("/")[:2]
+                return self.times(station_code, int(platform))
+            return self.times
+        return None
+
+    def etag(self, path):
+        """ETag for an API path's body, or None if it's not reference data."""
+
+        path = path.split("?")[0]
+        if path not in ("/api/stations", "/api/stations/platforms"):
+            return None
+        return '"' + hashlib.sha1(self.body(path)).hexdigest()[:16] + '"'
+
+    @property
+    def base_url(self):
+        return f"{'https' if self.use_tls else 'http'}://127.0.0.1:{self.port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._tmp is not None:
+            self._tmp.cleanup()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _shake(self):
+        if self.handshake:
+            self.clock.sleep(self.handshake)
+
+    def client(self, **kwargs):
+        from http_client import HTTPClient
+
+        server = self
+
+        class Client(HTTPClient):
+            def _connect(self):
+                super()._connect()
+                server._shake()
+
+        return Client("127.0.0.1", self.port, use_tls=self.use_tls, **kwargs)
+
+    def async_client(self, **kwargs):
+        from http_client import AsyncHTTPClient
+
+        server = self
+
+        class Client(AsyncHTTPClient):
+            async def _connect(self):
+                await super()._connect()
+                server._shake()
+
+        return Client("127.0.0.1", self.port, use_tls=self.use_tls, **kwargs)
@@ -0,0 +1,270 @@
+"""A framebuffer for the LED strip, so only changed pixels go to the hardware.
+
+Every set_rgb() / set_hsv() on plasma.WS2812 is a native call, and redrawing
+all 96 pixels each update costs 96 of them even when one train has moved one
+LED. Renderers draw into a FrameBuffer instead; show() compares the drawn
+frame with what the strip was last sent and pushes only the differences.
+
+A FrameBuffer can also keep the strip within a current budget. A WS2812
+draws roughly in proportion to the levels it's sent, so a running total of
+every channel's level gives the current the frame would draw. The total is
+updated over the span drawn since the last show(), so it costs nothing when
+little changes; if it goes over budget, everything is dimmed to fit.
+"""
+
+# Pixels compared at a time by show() before looking at them one by one.
+BLOCK = 16
+
+# Milliamps one WS2812 channel draws at full level, and each LED draws when
+# dark.
+MA_PER_CHANNEL = 20
+MA_IDLE = 1
+
+
+def hsv_to_rgb(h, s, v):
+    """Convert HSV (each 0.0-1.0) to 8-bit r, g, b, as plasma.WS2812 does."""
+
+    i = int(h * 6.0)
+    f = h * 6.0 - i
+    v *= 255.0
+    p = int(v * (1.0 - s))
+    q = int(v * (1.0 - f * s))
+    t = int(v * (1.0 - (1.0 - f) * s))
+    v = int(v)
+    i %= 6
+    if i == 0:
+        return v, t, p
+    if i == 1:
+        return q, v, p
+    if i == 2:
+        return p, v, t
+    if i == 3:
+        return p, q, v
+    if i == 4:
+        return t, p, v
+    return v, p, q
+
+
+class Canvas:
+    """Pixels to draw on, as a flat bytearray of r, g, b per LED.
+
+    Writes are tracked as a dirty range, so whatever consumes the pixels
+    only has to look at the span drawn over since it last did.
+    """
+
+    def __init__(self, num_leds):
+        self.num_leds = num_leds
+        self.pixels = bytearray(num_leds * 3)
+        # The last colour given to set_hsv(), and its RGB.
+        self._hsv = None
+        self._rgb = None
+        # Dirty range of LED indexes, [start, end); empty when start >= end.
+        self._start = 0
+        self._end = num_leds
+
+    def _touch(self, index):
+        if index < self._start:
+            self._start = index
+        if index >= self._end:
+            self._end = index + 1
+
+    def mark(self, start, end):
+        """Mark pixels [start, end) as drawn over, after writing to `pixels`."""
+
+        if start < self._start:
+            self._start = start
+        if end > self._end:
+            self._end = end
+
+    def set_rgb(self, index, r, g, b):
+        i = index * 3
+        pixels = self.pixels
+        if pixels[i] != r or pixels[i + 1] != g or pixels[i + 2] != b:
+            pixels[i] = r
+            pixels[i + 1] = g
+            pixels[i + 2] = b
+            self._touch(index)
+
+    def set_hsv(self, index, h, s=1.0, v=1.0):
+        # Frames tend to use one colour over and over, so remember the last.
+        if (h, s, v) != self._hsv:
+            self._hsv = (h, s, v)
+            self._rgb = hsv_to_rgb(h, s, v)
+        r, g, b = self._rgb
+        self.set_rgb(index, r, g, b)
+
+    def add_rgb(self, index, r, g, b):
+        """Add a colour to a pixel, saturating at 255."""
+
+        i = index * 3
+        pixels = self.pixels
+        self.set_rgb(index, min(255, pixels[i] + r), min(255, pixels[i + 1] + g), min(255, pixels[i + 2] + b))
+
+    def draw_between(self, index, weight, r, g, b):
+        """Draw a colour part way from one pixel to the next, anti-aliased.
+
+        Args:
+            index: The pixel the colour starts on.
+            weight: How far towards the next pixel it is, 0-255.
+            r, g, b: The colour, split between the two pixels by weight.
+        """
+
+        lead = 256 - weight
+        self.add_rgb(index, r * lead >> 8, g * lead >> 8, b * lead >> 8)
+        if weight:
+            self.add_rgb((index + 1) % self.num_leds, r * weight >> 8, g * weight >> 8, b * weight >> 8)
+
+    def get(self, index):
+        i = index * 3
+        pixels = self.pixels
+        return pixels[i], pixels[i + 1], pixels[i + 2]
+
+    def fill(self, r, g, b):
+        pixels = self.pixels
+        for i in range(0, len(pixels), 3):
+            pixels[i] = r
+            pixels[i + 1] = g
+            pixels[i + 2] = b
+        self._start = 0
+        self._end = self.num_leds
+
+    def clear(self):
+        """Set every pixel to black."""
+
+        # Bytearray slice assignment is one memset, rather than a Python loop.
+        self.pixels[:] = bytes(len(self.pixels))
+        self._start = 0
+        self._end = self.num_leds
+
+    def dirty(self):
+        """Whether anything may have changed since the dirty range was taken."""
+
+        return self._start < self._end
+
+    def take_dirty(self):
+        """Return the dirty range as (start, end), and reset it."""
+
+        span = (self._start, self._end)
+        self._start = self.num_leds
+        self._end = 0
+        return span
+
+
+class FrameBuffer(Canvas):
+    """A Canvas for the strip itself, sending only changed pixels to it.
+
+    A copy of what the strip was last sent is kept to diff against.
+
+    Args:
+        num_leds: The number of LEDs on the strip.
+        budget_ma: Most milliamps the strip may draw, or None for no limit.
+    """
+
+    def __init__(self, num_leds, budget_ma=None):
+        super().__init__(num_leds)
+        self._shown = bytearray(num_leds * 3)
+        self.budget_ma = budget_ma
+        # Brightness everything is sent at, in 256ths, to stay within budget.
+        self.scale = 256
+        # The pixels as drawn, before scaling, when show() last looked at
+        # them, and the sum of all their levels.
+        self._drawn = bytearray(num_leds * 3)
+        self._levels = 0
+        # We don't know what the strip holds yet.
+        self.invalidate()
+
+    def estimate_ma(self):
+        """Milliamps the frame as drawn would draw, before any scaling.
+
+        Up to date as of the last show().
+        """
+
+        return self.num_leds * MA_IDLE + self._levels * MA_PER_CHANNEL // 255
+
+    def _count(self, start, end):
+        """Bring the level total up to date over pixels [start, end)."""
+
+        a = start * 3
+        b = end * 3
+        drawn = self.pixels[a:b]
+        self._levels += sum(drawn) - sum(self._drawn[a:b])
+        self._drawn[a:b] = drawn
+
+    def _budget_scale(self):
+        if self.budget_ma is None:
+            return 256
+        lit = self._levels * MA_PER_CHANNEL // 255
+        allowed = self.budget_ma - self.num_leds * MA_IDLE
+        if lit <= allowed:
+            return 256
+        return max(0, allowed) * 256 // lit
+
+    def invalidate(self):
+        """Forget what the strip holds, so the next show() sends every pixel."""
+
+        for i in range(len(self._shown)):
+            self._shown[i] = self.pixels[i] ^ 1
+        self._start = 0
+        self._end = self.num_leds
+
+    def show(self, strip):
+        """Send the pixels that changed since the last show() to the strip.
+
+        Args:
+            strip: A plasma.WS2812, or anything with set_rgb(index, r, g, b).
+
+        Returns:
+            The number of pixels sent.
+        """
+
+        pixels = self.pixels
+        shown = self._shown
+        start, end = self.take_dirty()
+        if start < end:
+            self._count(start, end)
+        scale = self._budget_scale()
+        if scale != self.scale:
+            # Everything changes brightness, so everything goes again.
+            self.scale = scale
+            start, end = 0, self.num_leds
+        if scale < 256:
+            return self._show_scaled(strip, start, end)
+        sent = 0
+        # Most of a frame is usually unchanged, and comparing a block of
+        # pixels as a slice is much cheaper than one at a time in Python.
+        for block in range(start, end, BLOCK):
+            block_end = min(block + BLOCK, end)
+            if pixels[block * 3:block_end * 3] == shown[block * 3:block_end * 3]:
+                continue
+            for index in range(block, block_end):
+                i = index * 3
+                r = pixels[i]
+                g = pixels[i + 1]
+                b = pixels[i + 2]
+                if shown[i] != r or shown[i + 1] != g or shown[i + 2] != b:
+                    strip.set_rgb(index, r, g, b)
+                    shown[i] = r
+                    shown[i + 1] = g
+                    shown[i + 2] = b
+                    sent += 1
+        return sent
+
+    def _show_scaled(self, strip, start, end):
+        """show(), for when every pixel is dimmed to stay within budget."""
+
+        pixels = self.pixels
+        shown = self._shown
+        scale = self.scale
+        sent = 0
+        for index in range(start, end):
+            i = index * 3
+            r = pixels[i] * scale >> 8
+            g = pixels[i + 1] * scale >> 8
+            b = pixels[i + 2] * scale >> 8
+            if shown[i] != r or shown[i + 1] != g or shown[i + 2] != b:
+                strip.set_rgb(index, r, g, b)
+                shown[i] = r
+                shown[i + 1] = g
+                shown[i + 2] = b
+                sent += 1
+        return sent
@@ -0,0 +1,130 @@
+"""Run the display at a fixed frame rate, keeping an eye on the frame budget.
+
+FrameScheduler calls a render function every 1/rate seconds, timed against
+time.ticks_us() deadlines rather than sleeping a fixed time after each frame,
+so the rate holds however long a frame takes to draw. (Microseconds, because
+1000 // 60 ms would run at 62.5 fps.) It measures how long
+each render takes. Frames that overrun have their missed slots skipped
+rather than rushed to catch up, and if overruns keep happening the rate is
+halved until they stop, then raised again once there's room.
+
+Uses MicroPython's ticks functions; under CPython, run it in the emulator.
+"""
+
+import time
+
+try:
+    import uasyncio
+except ImportError:
+    import asyncio as uasyncio
+
+
+class FrameScheduler:
+    """Call a render function at a steady frame rate.
+
+    Args:
+        rate: Frames per second to aim for, e.g. UPDATES.
+        min_rate: Slowest the rate is allowed to drop to.
+        window: Seconds' worth of frames between decisions to raise the rate.
+        tolerance: Missed deadlines in a window before the rate is halved.
+        headroom: Share of the faster rate's frame time the slowest render
+            in a window must fit in before the rate is raised again.
+    """
+
+    def __init__(self, rate=60, min_rate=10, window=2, tolerance=3, headroom=0.75):
+        self.target_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.window = window
+        self.tolerance = tolerance
+        self.headroom = headroom
+
+        # Totals since starting.
+        self.frames = 0
+        self.missed = 0
+        self.skipped = 0
+        self.render_us = 0
+        self.render_us_max = 0
+
+        # Since the last rate decision.
+        self._window_frames = 0
+        self._window_missed = 0
+        self._window_max = 0
+
+    def period_us(self):
+        return 1000000 // self.rate
+
+    def _record(self, render_us, missed, skipped):
+        self.frames += 1
+        self.render_us += render_us
+        if render_us > self.render_us_max:
+            self.render_us_max = render_us
+        if missed:
+            self.missed += 1
+            self.skipped += skipped
+            self._window_missed += 1
+        if render_us > self._window_max:
+            self._window_max = render_us
+
+        self._window_frames += 1
+        # Slow down as soon as it's clear frames don't fit, but only speed up
+        # after a whole window of them have.
+        if self._window_frames >= self.window * self.rate or self._window_missed > self.tolerance:
+            self._adjust()
+
+    def _adjust(self):
+        if self._window_missed > self.tolerance and self.rate > self.min_rate:
+            self.rate = max(self.min_rate, self.rate // 2)
+        elif self._window_missed == 0 and self.rate < self.target_rate:
+            faster = min(self.target_rate, self.rate * 2)
+            if self._window_max < 1000000 // faster * self.headroom:
+                self.rate = faster
+        self._window_frames = 0
+        self._window_missed = 0
+        self._window_max = 0
+
+    async def run(self, render):
+        """Call render() once a frame, forever.
+
+        Args:
+            render: Function taking the frame's start time, in ticks_us.
+        """
+
+        deadline = time.ticks_us()
+        while True:
+            start = time.ticks_us()
+            render(deadline)
+            render_us = time.ticks_diff(time.ticks_us(), start)
+
+            period = self.period_us()
+            deadline = time.ticks_add(deadline, period)
+            late = time.ticks_diff(time.ticks_us(), deadline)
+            if late > 0:
+                # Drop the frames we've already missed, rather than racing
+                # through them to catch up.
+                skipped = late // period + 1
+                deadline = time.ticks_add(deadline, skipped * period)
+                self._record(render_us, True, skipped)
+            else:
+                self._record(render_us, False, 0)
+
+            # Sleeping even 0 ms lets the fetch task run.
+            await uasyncio.sleep_ms(max(0, time.ticks_diff(deadline, time.ticks_us())) // 1000)
+
+    def stats(self):
+        """Frame statistics since starting, as a dictionary."""
+
+        return {
+            "rate": self.rate,
+            "frames": self.frames,
+            "missed": self.missed,
+            "skipped": self.skipped,
+            "render_us_mean": self.render_us // self.frames if self.frames else 0,
+            "render_us_max": self.render_us_max,
+        }
+
+    def report(self):
+        stats = self.stats()
+        return (f"{stats['frames']} frames at {stats['rate']} fps, {stats['missed']} missed "
+                f"({stats['skipped']} skipped), render mean {stats['render_us_mean']} us, "
+                f"max {stats['render_us_max']} us")
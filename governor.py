@@ -0,0 +1,206 @@
+"""Stop the clock hammering the API when it's failing.
+
+Every API call used to catch its own errors and hand back empty results, and
+the caller would simply try again next time round. Through an outage that
+meant a full TLS connect to a failing endpoint on every cycle. A
+RequestGovernor sits in front of all outbound requests instead:
+
+- A token bucket caps how many requests go out in all, however many
+  callers there are: a burst, then one every so often. size() fits it to
+  the platforms polled and how often, so polling itself is never refused.
+- Each endpoint has a circuit breaker. A few failures in a row open it, and
+  while it's open requests to that endpoint are refused straight away, with
+  no connect attempt, so callers fall back on what they have cached. Once it
+  has been open a while, one trial request is let through (half-open): if
+  that succeeds the breaker closes, and if not it opens again for twice as
+  long.
+
+Refused requests raise Refused, an OSError, so callers already handling
+network errors handle them too. Times are time.ticks_ms(), via timesource.
+"""
+
+from timesource import ticks_diff, ticks_ms
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# Requests that can go in a burst, and milliseconds to earn each one back,
+# at least; size() allows more for more platforms polled.
+BURST = 6
+REFILL_MS = 15000
+# Failures in a row that open a breaker...
+TRIP = 3
+# ...for this many milliseconds at first, doubling each time its trial
+# request fails, up to the most.
+OPEN_MS = 30000
+OPEN_MAX_MS = 15 * 60 * 1000
+
+
+class Refused(OSError):
+    """A request the governor wouldn't let go: over budget, or its endpoint's
+    breaker is open."""
+
+
+class TokenBucket:
+    """Allow `burst` requests at once, then one per `refill_ms`.
+
+    Credit is kept in milliseconds, so it tops up by plain integer addition.
+    """
+
+    def __init__(self, burst=BURST, refill_ms=REFILL_MS):
+        self.burst = burst
+        self.refill_ms = refill_ms
+        self._credit = burst * refill_ms
+        self._ticks = None
+
+    def _fill(self, ticks):
+        if self._ticks is not None:
+            elapsed = max(0, ticks_diff(ticks, self._ticks))
+            self._credit = min(self.burst * self.refill_ms, self._credit + elapsed)
+        self._ticks = ticks
+
+    def ready(self, ticks):
+        """Whether a request could go at `ticks`."""
+
+        self._fill(ticks)
+        return self._credit >= self.refill_ms
+
+    def take(self, ticks):
+        """Spend a request, if there's one to spend. Returns whether there was."""
+
+        if not self.ready(ticks):
+            return False
+        self._credit -= self.refill_ms
+        return True
+
+    def wait_ms(self, ticks):
+        """Milliseconds until a request could go."""
+
+        self._fill(ticks)
+        return max(0, self.refill_ms - self._credit)
+
+
+class CircuitBreaker:
+    """Closed, open or half-open, for one endpoint.
+
+    Args:
+        trip: Failures in a row that open it.
+        open_ms: Milliseconds it stays open at first.
+        max_open_ms: Most it stays open, however often trials fail.
+    """
+
+    def __init__(self, trip=TRIP, open_ms=OPEN_MS, max_open_ms=OPEN_MAX_MS):
+        self.trip = trip
+        self.open_ms = open_ms
+        self.max_open_ms = max_open_ms
+        self.state = CLOSED
+        # Failures in a row, and times opened in all.
+        self.failures = 0
+        self.opens = 0
+        self._open_for = open_ms
+        self._opened = 0
+        # When the half-open trial request went, or None if none has.
+        self._trial = None
+
+    def allow(self, ticks):
+        """Whether a request may go at `ticks`; if half-open, it's the trial."""
+
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if ticks_diff(ticks, self._opened) < self._open_for:
+                return False
+            self.state = HALF_OPEN
+        # One trial at a time; one that never reported back, say because it
+        # was cancelled, gives way after as long as the breaker was open.
+        if self._trial is not None and ticks_diff(ticks, self._trial) < self._open_for:
+            return False
+        self._trial = ticks
+        return True
+
+    def retry_ms(self, ticks):
+        """Milliseconds until a request will be allowed, 0 if it would be now."""
+
+        if self.state != OPEN:
+            return 0
+        return max(0, self._open_for - ticks_diff(ticks, self._opened))
+
+    def success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._open_for = self.open_ms
+        self._trial = None
+
+    def failure(self, ticks):
+        self.failures += 1
+        if self.state == HALF_OPEN:
+            self._open_for = min(self.max_open_ms, self._open_for * 2)
+        elif self.state != CLOSED or self.failures < self.trip:
+            return
+        self.state = OPEN
+        self.opens += 1
+        self._opened = ticks
+        self._trial = None
+
+
+class RequestGovernor:
+    """A shared request budget, and a circuit breaker per endpoint.
+
+    Call check() before each request, then success() or failure() after it.
+    Args are as for TokenBucket and CircuitBreaker.
+    """
+
+    def __init__(self, burst=BURST, refill_ms=REFILL_MS, trip=TRIP, open_ms=OPEN_MS, max_open_ms=OPEN_MAX_MS):
+        self.budget = TokenBucket(burst, refill_ms)
+        self.trip = trip
+        self.open_ms = open_ms
+        self.max_open_ms = max_open_ms
+        self.breakers = {}
+        # Requests let go, and refused without a connect attempt.
+        self.sent = 0
+        self.refused = 0
+
+    def size(self, requests, interval_s):
+        """Allow for `requests` requests every `interval_s` seconds, as a
+        poll of that many platforms at the fastest poll rate makes, with a
+        burst of two polls' worth. Never allows less than before."""
+
+        burst = max(self.budget.burst, 2 * requests)
+        refill_ms = min(self.budget.refill_ms, interval_s * 1000 // max(1, requests))
+        self.budget = TokenBucket(burst, refill_ms)
+
+    def breaker(self, endpoint):
+        """The CircuitBreaker for an endpoint, made on first use."""
+
+        if endpoint not in self.breakers:
+            self.breakers[endpoint] = CircuitBreaker(self.trip, self.open_ms, self.max_open_ms)
+        return self.breakers[endpoint]
+
+    def check(self, endpoint):
+        """Let a request to `endpoint` go, or raise Refused."""
+
+        ticks = ticks_ms()
+        breaker = self.breaker(endpoint)
+        if not self.budget.ready(ticks):
+            self.refused += 1
+            raise Refused(f"Over the request budget, for {self.budget.wait_ms(ticks) // 1000} s")
+        if not breaker.allow(ticks):
+            self.refused += 1
+            raise Refused(f"{endpoint} failing, retrying in {breaker.retry_ms(ticks) // 1000} s")
+        self.budget.take(ticks)
+        self.sent += 1
+
+    def success(self, endpoint):
+        self.breaker(endpoint).success()
+
+    def failure(self, endpoint):
+        self.breaker(endpoint).failure(ticks_ms())
+
+    def report(self):
+        failing = [f"{endpoint} {breaker.state}" for endpoint, breaker in self.breakers.items() if breaker.state != CLOSED]
+        report = f"{self.sent} requests, {self.refused} refused"
+        if failing:
+            report += f"; {', '.join(failing)}"
+        return report
@@ -0,0 +1,555 @@
+"""Minimal HTTP/1.1 client with keep-alive, for talking to a single API host.
+
+urequests opens a new socket for every request, which on the Pico means a DNS
+lookup, TCP connect and full TLS handshake each time. Here we hold one
+connection open between requests, remember the resolved address, and quietly
+reconnect if the server has dropped the socket in the meantime.
+
+HTTPClient uses blocking sockets; AsyncHTTPClient does the same over uasyncio
+streams, so the event loop keeps running while a request is in flight.
+"""
+
+import json
+import socket
+import time
+
+try:
+    import ssl
+except ImportError:
+    import ussl as ssl
+
+try:
+    import uasyncio
+except ImportError:
+    import asyncio as uasyncio
+
+from timesource import ticks_diff, ticks_ms
+
+# How long a resolved address is reused before asking DNS again, in seconds.
+DNS_TTL = 60 * 60
+
+
+def _client_context():
+    """TLS context that, like urequests, doesn't verify the server certificate."""
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    if hasattr(context, "check_hostname"):
+        context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def _wrap_tls(sock, host, context=None):
+    if context is None and hasattr(ssl, "SSLContext"):
+        context = _client_context()
+    if context is not None:
+        return context.wrap_socket(sock, server_hostname=host)
+    return ssl.wrap_socket(sock, server_hostname=host)
+
+
+def _request_head(method, path, host, headers):
+    lines = [f"{method} {path} HTTP/1.1", f"Host: {host}", "Connection: keep-alive"]
+    for name, value in headers.items():
+        lines.append(f"{name}: {value}")
+    lines.append("\r\n")
+    return "\r\n".join(lines).encode()
+
+
+def _parse_status_line(line):
+    """Return (version, status_code, reason) from an HTTP status line."""
+
+    if not line:
+        raise OSError("Connection closed by server")
+    parts = line.decode().split(None, 2)
+    reason = parts[2].strip() if len(parts) > 2 else ""
+    return parts[0], int(parts[1]), reason
+
+
+def _add_header(headers, line):
+    name, _, value = line.decode().partition(":")
+    headers[name.strip()] = value.strip()
+
+
+def _body_framing(method, version, status_code, headers):
+    """Work out how the response body is delimited.
+
+    Returns:
+        Tuple of (length, chunked, keep_alive). length is None when the body
+        runs until the server closes the connection.
+    """
+
+    lower = {name.lower(): value for name, value in headers.items()}
+    keep_alive = version == "HTTP/1.1" and lower.get("connection", "").lower() != "close"
+    if method == "HEAD" or status_code in (204, 304):
+        return 0, False, keep_alive
+    if "chunked" in lower.get("transfer-encoding", "").lower():
+        return None, True, keep_alive
+    if "content-length" in lower:
+        return int(lower["content-length"]), False, keep_alive
+    return None, False, False
+
+
+def _read_exactly(stream, n):
+    """Read n bytes, looping over short reads. Raises OSError on early EOF."""
+
+    data = b""
+    while len(data) < n:
+        chunk = stream.read(n - len(data))
+        if not chunk:
+            raise OSError("Connection closed mid-response")
+        data += chunk
+    return data
+
+
+class _BodyReader:
+    """File-like reader for a response body of known length."""
+
+    def __init__(self, stream, length):
+        self._stream = stream
+        self._remaining = length
+
+    def read(self, n=-1):
+        if self._remaining is not None:
+            if self._remaining <= 0:
+                return b""
+            if n < 0 or n > self._remaining:
+                n = self._remaining
+        chunk = self._stream.read(n) if n >= 0 else self._stream.read()
+        if not chunk:
+            if self._remaining:
+                raise OSError("Connection closed mid-response")
+            return b""
+        if self._remaining is not None:
+            self._remaining -= len(chunk)
+        return chunk
+
+    def done(self):
+        return self._remaining is not None and self._remaining <= 0
+
+
+class _ChunkedReader:
+    """File-like reader for a body sent with Transfer-Encoding: chunked."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._remaining = 0
+        self._finished = False
+
+    def _next_chunk(self):
+        line = self._stream.readline()
+        if not line:
+            raise OSError("Connection closed mid-response")
+        self._remaining = int(line.split(b";")[0].strip(), 16)
+        if self._remaining == 0:
+            # Skip any trailers up to the blank line ending the body.
+            while self._stream.readline() not in (b"\r\n", b"\n", b""):
+                pass
+            self._finished = True
+
+    def read(self, n=-1):
+        if self._finished:
+            return b""
+        if self._remaining == 0:
+            self._next_chunk()
+            if self._finished:
+                return b""
+        if n < 0 or n > self._remaining:
+            n = self._remaining
+        chunk = self._stream.read(n)
+        if not chunk:
+            raise OSError("Connection closed mid-response")
+        self._remaining -= len(chunk)
+        if self._remaining == 0:
+            # CRLF after each chunk's data.
+            _read_exactly(self._stream, 2)
+        return chunk
+
+    def done(self):
+        return self._finished
+
+
+class Response:
+    """A response on a kept-alive connection, shaped like a urequests response.
+
+    The body can be streamed from `raw`, or read whole with `content` / `json()`.
+    Call close() when done; any unread body is drained so the connection can be
+    reused for the next request.
+    """
+
+    def __init__(self, client, status_code, reason, headers, raw, keep_alive):
+        self._client = client
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.raw = raw
+        self._keep_alive = keep_alive
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            chunks = []
+            while True:
+                chunk = self.raw.read(512)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            self._content = b"".join(chunks)
+        return self._content
+
+    @property
+    def text(self):
+        return self.content.decode()
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        if self._client is None:
+            return
+        client = self._client
+        self._client = None
+        client._pending = None
+        try:
+            if self._keep_alive:
+                while self.raw.read(512):
+                    pass
+        except OSError:
+            self._keep_alive = False
+        if not (self._keep_alive and self.raw.done()):
+            client.close()
+
+
+class HTTPClient:
+    """Keep-alive HTTP/1.1 client for one host.
+
+    Args:
+        host: Host name to connect to.
+        port: TCP port; defaults to 443 with TLS or 80 without.
+        use_tls: Whether to wrap the connection in TLS.
+        timeout: Socket timeout in seconds for connect and reads.
+        dns_ttl: Seconds to reuse a resolved address for.
+        ssl_context: Optional ssl.SSLContext, e.g. to trust a test server.
+    """
+
+    def __init__(self, host, port=None, use_tls=True, timeout=10, dns_ttl=DNS_TTL, ssl_context=None):
+        self.host = host
+        self.port = port if port is not None else (443 if use_tls else 80)
+        self._use_tls = use_tls
+        self._timeout = timeout
+        self._dns_ttl = dns_ttl
+        self._ssl_context = ssl_context
+
+        self._addr = None
+        self._addr_time = 0
+        self._sock = None
+        self._stream = None
+        self._pending = None
+
+        # Counters, so callers can see how often connections are reused.
+        self.connects = 0
+        self.requests = 0
+        # Milliseconds the last new connection took to open, TLS handshake
+        # and all, or None before the first.
+        self.connect_ms = None
+
+    def _resolve(self):
+        now = time.time()
+        if self._addr is None or now - self._addr_time > self._dns_ttl:
+            self._addr = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0][-1]
+            self._addr_time = now
+        return self._addr
+
+    def _connect(self):
+        addr = self._resolve()
+        sock = socket.socket()
+        try:
+            sock.settimeout(self._timeout)
+            sock.connect(addr)
+            if self._use_tls:
+                sock = _wrap_tls(sock, self.host, self._ssl_context)
+            # MicroPython's sockets, TLS ones included, have read/readline/write
+            # themselves, and its SSL socket has no makefile(); on CPython this
+            # gives an unbuffered file object with the same methods.
+            makefile = getattr(sock, "makefile", None)
+            stream = makefile("rwb", 0) if makefile is not None else sock
+        except Exception:
+            sock.close()
+            # The address may have moved; look it up again next time.
+            self._addr = None
+            raise
+        self._sock = sock
+        self._stream = stream
+        self.connects += 1
+
+    def connected(self):
+        return self._sock is not None
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                if self._stream is not self._sock:
+                    self._stream.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._stream = None
+        self._pending = None
+
+    def _send(self, method, path, headers):
+        data = _request_head(method, path, self.host, headers)
+        while data:
+            sent = self._stream.write(data)
+            data = data[sent:] if sent else b""
+
+    def _read_head(self):
+        version, status_code, reason = _parse_status_line(self._stream.readline())
+        headers = {}
+        while True:
+            line = self._stream.readline()
+            if not line or line in (b"\r\n", b"\n"):
+                break
+            _add_header(headers, line)
+        return version, status_code, reason, headers
+
+    def request(self, method, path, headers=None):
+        """Send a request and return its Response, reconnecting if needed.
+
+        A request on a reused connection that fails before any response arrives
+        is retried once on a fresh connection, as the server has most likely
+        timed out the idle socket.
+        """
+
+        if headers is None:
+            headers = {}
+        if self._pending is not None:
+            # The last response was never closed; drain or drop it first.
+            self._pending.close()
+        for attempt in (0, 1):
+            reused = self._sock is not None
+            if not reused:
+                started = ticks_ms()
+                self._connect()
+                self.connect_ms = ticks_diff(ticks_ms(), started)
+            try:
+                self._send(method, path, headers)
+                version, status_code, reason, resp_headers = self._read_head()
+                break
+            except OSError:
+                self.close()
+                if attempt or not reused:
+                    raise
+        self.requests += 1
+
+        length, chunked, keep_alive = _body_framing(method, version, status_code, resp_headers)
+        raw = _ChunkedReader(self._stream) if chunked else _BodyReader(self._stream, length)
+        self._pending = Response(self, status_code, reason, resp_headers, raw, keep_alive)
+        return self._pending
+
+    def get(self, path, headers=None):
+        return self.request("GET", path, headers)
+
+
+class _AsyncBodyReader:
+    """Async counterpart of _BodyReader, over a uasyncio StreamReader."""
+
+    def __init__(self, reader, length):
+        self._reader = reader
+        self._remaining = length
+
+    async def read(self, n=-1):
+        if self._remaining is not None:
+            if self._remaining <= 0:
+                return b""
+            if n < 0 or n > self._remaining:
+                n = self._remaining
+        chunk = await self._reader.read(n)
+        if not chunk:
+            if self._remaining:
+                raise OSError("Connection closed mid-response")
+            return b""
+        if self._remaining is not None:
+            self._remaining -= len(chunk)
+        return chunk
+
+    def done(self):
+        return self._remaining is not None and self._remaining <= 0
+
+
+class _AsyncChunkedReader:
+    """Async counterpart of _ChunkedReader, over a uasyncio StreamReader."""
+
+    def __init__(self, reader):
+        self._reader = reader
+        self._remaining = 0
+        self._finished = False
+
+    async def read(self, n=-1):
+        if self._finished:
+            return b""
+        if self._remaining == 0:
+            line = await self._reader.readline()
+            if not line:
+                raise OSError("Connection closed mid-response")
+            self._remaining = int(line.split(b";")[0].strip(), 16)
+            if self._remaining == 0:
+                while (await self._reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                self._finished = True
+                return b""
+        if n < 0 or n > self._remaining:
+            n = self._remaining
+        chunk = await self._reader.read(n)
+        if not chunk:
+            raise OSError("Connection closed mid-response")
+        self._remaining -= len(chunk)
+        if self._remaining == 0:
+            await self._reader.readexactly(2)
+        return chunk
+
+    def done(self):
+        return self._finished
+
+
+class AsyncResponse:
+    """Response from AsyncHTTPClient. Body reads and close() are awaitable."""
+
+    def __init__(self, client, status_code, reason, headers, raw, keep_alive):
+        self._client = client
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.raw = raw
+        self._keep_alive = keep_alive
+
+    async def read(self, n=-1):
+        return await self.raw.read(n)
+
+    async def content(self):
+        chunks = []
+        while True:
+            chunk = await self.raw.read(512)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def json(self):
+        return json.loads(await self.content())
+
+    async def close(self):
+        if self._client is None:
+            return
+        client = self._client
+        self._client = None
+        client._pending = None
+        try:
+            if self._keep_alive:
+                while await self.raw.read(512):
+                    pass
+        except OSError:
+            self._keep_alive = False
+        if not (self._keep_alive and self.raw.done()):
+            await client.close()
+
+
+class AsyncHTTPClient(HTTPClient):
+    """Keep-alive HTTP/1.1 client for one host, using uasyncio streams.
+
+    Nothing here blocks the event loop once the host name is resolved, so other
+    tasks (e.g. rendering) keep running while a request is in flight. Takes the
+    same arguments as HTTPClient; `timeout` bounds the whole request, from
+    connect to the end of the response headers.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._reader = None
+        self._writer = None
+
+    def connected(self):
+        return self._writer is not None
+
+    async def _connect(self):
+        addr = self._resolve()
+        # Connect to the cached address, but keep the real name for TLS.
+        host = addr[0] if isinstance(addr, tuple) else self.host
+        kwargs = {}
+        if self._use_tls:
+            kwargs["ssl"] = self._ssl_context or _client_context()
+            kwargs["server_hostname"] = self.host
+        try:
+            self._reader, self._writer = await uasyncio.open_connection(host, self.port, **kwargs)
+        except OSError:
+            self._addr = None
+            raise
+        self.connects += 1
+
+    async def close(self):
+        writer = self._writer
+        self._reader = None
+        self._writer = None
+        self._pending = None
+        if writer is not None:
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def _exchange(self, method, path, headers):
+        """Send a request and read the response head, reconnecting if needed."""
+
+        for attempt in (0, 1):
+            reused = self._writer is not None
+            if not reused:
+                started = ticks_ms()
+                await self._connect()
+                self.connect_ms = ticks_diff(ticks_ms(), started)
+            try:
+                self._writer.write(_request_head(method, path, self.host, headers))
+                await self._writer.drain()
+                version, status_code, reason = _parse_status_line(await self._reader.readline())
+                resp_headers = {}
+                while True:
+                    line = await self._reader.readline()
+                    if not line or line in (b"\r\n", b"\n"):
+                        break
+                    _add_header(resp_headers, line)
+                return version, status_code, reason, resp_headers
+            except OSError:
+                await self.close()
+                if attempt or not reused:
+                    raise
+
+    async def request(self, method, path, headers=None):
+        """Send a request and return its AsyncResponse.
+
+        Raises uasyncio.TimeoutError if the response headers don't arrive
+        within the client timeout; the connection is dropped in that case.
+        """
+
+        if headers is None:
+            headers = {}
+        if self._pending is not None:
+            await self._pending.close()
+        try:
+            version, status_code, reason, resp_headers = await uasyncio.wait_for(
+                self._exchange(method, path, headers), self._timeout
+            )
+        except uasyncio.TimeoutError:
+            await self.close()
+            raise
+        self.requests += 1
+
+        length, chunked, keep_alive = _body_framing(method, version, status_code, resp_headers)
+        if chunked:
+            raw = _AsyncChunkedReader(self._reader)
+        else:
+            raw = _AsyncBodyReader(self._reader, length)
+        self._pending = AsyncResponse(self, status_code, reason, resp_headers, raw, keep_alive)
+        return self._pending
+
+    async def get(self, path, headers=None):
+        return await self.request("GET", path, headers)
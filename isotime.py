@@ -0,0 +1,103 @@
+"""Decode the API's ISO-8601 timestamps straight into epoch seconds.
+
+The feed's timestamps look like "2025-01-04T08:50:28.0000000+00:00". Every
+field sits at a fixed offset, so rather than splitting the string into lists
+of smaller strings and going through time.mktime(), we read the digits in
+place and do the date arithmetic ourselves. The UTC offset on the end is
+applied explicitly, so times during BST come out right rather than an hour
+adrift.
+"""
+
+import time
+
+
+# Days before the first of each month, in a non-leap year.
+_DAYS_BEFORE_MONTH = (0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334)
+
+_ZERO = 48  # ord("0")
+
+
+def _days_before_year(year):
+    y = year - 1
+    return y * 365 + y // 4 - y // 100 + y // 400
+
+
+def _is_leap(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+# MicroPython ports differ on whether the epoch is 1970 or 2000; match
+# whatever time.time() uses here.
+_EPOCH_DAYS = _days_before_year(time.gmtime(0)[0])
+
+
+def _two(s, i):
+    """The two-digit number starting at s[i]."""
+
+    return (ord(s[i]) - _ZERO) * 10 + ord(s[i + 1]) - _ZERO
+
+
+def days_since_epoch(year, month, day):
+    """Days from the epoch to the given date."""
+
+    days = _days_before_year(year) + _DAYS_BEFORE_MONTH[month - 1] + day - 1
+    if month > 2 and _is_leap(year):
+        days += 1
+    return days - _EPOCH_DAYS
+
+
+def utc_offset(timestamp):
+    """Return the UTC offset at the end of a timestamp, in seconds.
+
+    Understands "+HH:MM", "-HH:MM" and "Z"; a timestamp with no offset is
+    taken to be UTC.
+    """
+
+    n = len(timestamp)
+    if n >= 6:
+        sign = timestamp[n - 6]
+        if sign == "+" or sign == "-":
+            offset = _two(timestamp, n - 5) * 3600 + _two(timestamp, n - 2) * 60
+            return -offset if sign == "-" else offset
+    return 0
+
+
+def iso_to_epoch(timestamp):
+    """Convert an API timestamp to seconds since the epoch, in UTC.
+
+    Args:
+        timestamp: e.g. "2025-01-04T08:50:28.0000000+00:00". Fractional
+        seconds are ignored.
+
+    Returns:
+        Integer seconds since the epoch.
+    """
+
+    year = _two(timestamp, 0) * 100 + _two(timestamp, 2)
+    days = days_since_epoch(year, _two(timestamp, 5), _two(timestamp, 8))
+    seconds = _two(timestamp, 11) * 3600 + _two(timestamp, 14) * 60 + _two(timestamp, 17)
+    return days * 86400 + seconds - utc_offset(timestamp)
+
+
+_MONTHS = "JanFebMarAprMayJunJulAugSepOctNovDec"
+
+
+def http_date_to_epoch(date):
+    """Convert an HTTP Date header to seconds since the epoch, in UTC.
+
+    Args:
+        date: e.g. "Sat, 04 Jan 2025 08:50:30 GMT", the only form servers
+        are allowed to send.
+
+    Returns:
+        Integer seconds since the epoch, or None if it isn't in that form.
+    """
+
+    if len(date) != 29 or not date.endswith(" GMT"):
+        return None
+    month = _MONTHS.find(date[8:11])
+    if month < 0 or month % 3:
+        return None
+    year = _two(date, 12) * 100 + _two(date, 14)
+    days = days_since_epoch(year, month // 3 + 1, _two(date, 5))
+    return days * 86400 + _two(date, 17) * 3600 + _two(date, 20) * 60 + _two(date, 23)
@@ -1,14 +1,20 @@
-import urequests
-import json
 import uasyncio
 import plasma
 from plasma import plasma_stick
 import time
+import machine
 import WIFI_CONFIG
 from network_manager import NetworkManager
-import urequests
-from machine import RTC
-import ntptime
+from metro_api import close_clients, fetch_subscriptions, governor, reopen_ms, server_clock
+from scheduler import PollScheduler
+from departures import DepartureTable
+from framebuffer import FrameBuffer, hsv_to_rgb
+from positions import PositionTable
+from frames import FrameScheduler
+from compositor import ADD, Compositor, Layer
+from tracking import TrainTracker
+from timebase import Timebase
+from commute import CommuteSchedule
 
 
 # Number of LEDs around clock face
@@ -17,6 +23,24 @@ NUM_LEDS = 96
 UPDATES = 60
 # Is the LED strip rotated?
 OFFSET = 1
+# Seconds between departure fetches, at the shortest and longest; in between,
+# this depends on how soon the next train is due.
+POLL_MIN = 30
+POLL_MAX = 600
+# The flat interval we used to poll at, for reporting requests saved.
+POLL_INTERVAL = 120
+# Most milliamps the LEDs may draw. USB gives 500 mA, and the Pico W needs
+# some of that; brighter frames are dimmed to fit.
+POWER_BUDGET = 400
+# Seconds a fetch waits for the wifi link to come back before trying anyway.
+LINK_WAIT = 20
+# Whether to put the radio in power save, or turn it off, between fetches.
+DUTY_CYCLE = True
+# Days off, as (year, month, day), when the clock sleeps through its windows.
+HOLIDAYS = ()
+# Longest single lightsleep, in milliseconds; the RP2040's timer can only
+# wake it about 71 minutes ahead.
+SLEEP_MAX_MS = 60 * 60 * 1000
 
 # Initalise the WS2812 / NeoPixel™ LEDs
 led_strip = plasma.WS2812(
@@ -24,135 +48,88 @@ led_strip = plasma.WS2812(
 )
 led_strip.start()
 
+# Frames are drawn here, and only the pixels that change are sent to the strip
+framebuffer = FrameBuffer(NUM_LEDS, POWER_BUDGET)
+
+# Layers blended into the framebuffer, so other displays can share the ring.
+# Trains go in their own layer, added on top of anything else.
+compositor = Compositor(NUM_LEDS)
+trains_layer = Layer(NUM_LEDS, z=10, blend=ADD)
+compositor.add(trains_layer)
+
+# Where each time past the hour falls on the strip, including between LEDs
+positions = PositionTable(NUM_LEDS, OFFSET)
+
 # Set a red highlight colour at 50% brightness, HSV
 HIGHLIGHT_RED = (0, 1.0, 0.5)
 HIGHLIGHT_BLUE = (0.66, 1.0, 0.5)
+# ...and as RGB, to split between neighbouring LEDs
+HIGHLIGHT_RED_RGB = hsv_to_rgb(*HIGHLIGHT_RED)
+HIGHLIGHT_BLUE_RGB = hsv_to_rgb(*HIGHLIGHT_BLUE)
+# When fetches fail, the last good trains fade over this many seconds...
+STALE_FADE = 600
+# ...down to this brightness, out of 256
+STALE_MIN = 64
 
 def status_handler(mode, status, ip):
     """Report network status while connecting to wifi."""
     print(mode, status, ip)
 
-def get_station_mappings():
-    """Retrieve and parse station mappings from API query.
-
-    returns a dictionary of station names to station codes.
-    """
-
-    try:
-        response = urequests.get("https://metro-rti.nexus.org.uk/api/stations")
-        stations_data = response.json()
-
-        name_to_code = {}
-        for code, name in stations_data.items():
-            name_to_code[name] = code
-
-        return name_to_code
-    except Exception as e:
-        print(f"Error fetching station data: {e}")
-        return {}
-
-def get_platform_info(station_code):
-    """Get platform information for a station.
-
-    Args:
-        station_code: Three letter station code (e.g. 'MTS'),
-        retrieved from the station mapping function.
-
-    Returns:
-        List of helper text strings for each platform
-    """
-    try:
-        response = urequests.get(
-            "https://metro-rti.nexus.org.uk/api/stations/platforms"
-        )
-        platforms_data = response.json()
-
-        if station_code not in platforms_data:
-            return []
-
-        station_platforms = platforms_data[station_code]
-        helper_texts = [platform["helperText"] for platform in station_platforms]
-
-        return helper_texts
-
-    except Exception as e:
-        print(f"Error fetching platform data: {e}")
-        return []
-
-def get_train_times_in_secs_since_epoch(station_code, platform_num):
-    """Query the API for the next train times for a given station and platform.
+async def get_departures(subscriptions, previous=None):
+    """Query the API for the next departures for a list of station platforms.
 
     Args:
-        station_code: Three letter station code (e.g. 'MTS').
-        platform_num: The platform number to query.
+        subscriptions: List of (station_code, platform_num) tuples,
+        e.g. [('MTS', 1), ('MTS', 2)]. These are fetched concurrently.
+        previous: The DepartureTable this returned last time, whose trains
+        stand in for those of any platform that fails this time.
 
     Returns:
-        List of train times in seconds since the epoch.
-        Boolean status flag
+        DepartureTable across all platforms, sorted by time. Its `times`
+        array holds train times in seconds since the epoch, in UTC like
+        the RTC once set by NTP.
+        Boolean status flag, False only if every platform failed.
+        Set of the indexes of the subscriptions that failed, whose trains
+        in the table are the ones from `previous`.
 
     Returning seconds because we have problems passing tuples between functions,
     then into time.mktime(); lots of "'tuple'object has no attribute 'mktime'" errors.
     """
 
     try:
-        url = f"https://metro-rti.nexus.org.uk/api/times/{station_code}/{platform_num}"
-        response = urequests.get(url)
-        train_data = response.json()
-
-        train_times = []
-        for train in train_data:
-            timestamp = train["actualPredictedTime"]
-
-            # Split into date and time parts
-            date_part, time_part = timestamp.split('T')
-
-            # Split the date part into year, month, day
-            year, month, day = map(int, date_part.split('-'))
-
-            # Split the time part into hour, minute, second
-            time_part = time_part.split('.')[0]
-            hour, minute, second = map(int, time_part.split(':'))
-
-            # Not needed, as mktime() ignores the value anyway.
-            # day_of_week = zeller_day(year, month, day)
-
-            # Now assemble the date and time parts into a tuple,
-            # matching the field order of rtc.datetime(),
-            # and pass that to time.mktime() to return seconds since epoch.
-            train_time_secs = time.mktime((year, month, day, hour, minute, second, 0, 0))
-
-            # print(f">>> Train time in seconds: {train_time_secs}")
-
-            # Append the train time to the list
-            train_times.append(train_time_secs)
-
-        return sorted(train_times), True
-
+        # The body is streamed and parsed as it arrives, rather than via
+        # response.json(), so we never hold the full list of train dicts.
+        departures, errors = await fetch_subscriptions(subscriptions)
     except Exception as e:
         print(f"Error fetching departure data: {e}")
-        return [], False
+        departures, errors = DepartureTable(), {subscription: e for subscription in subscriptions}
+
+    failed = set()
+    for subscription, e in errors.items():
+        station_code, platform_num = subscription
+        print(f"Error fetching departure data for {station_code} platform {platform_num}: {e}")
+        failed.add(subscriptions.index(subscription))
+        if previous is not None:
+            departures.take(previous, subscriptions.index(subscription))
+    if failed and previous is not None:
+        departures.sort()
+
+    return departures, not subscriptions or len(failed) < len(subscriptions), failed
 
 
-def get_next_train_waits(current_time_in_seconds, station, platform):
+def get_next_train_waits(current_time_in_seconds, train_times):
     """Return a list of the next train times in seconds from now.
 
     Args:
         current_time_in_seconds: The current time.
-        station: The station code.
-        platform: The platform number.
+        train_times: Train times in seconds since the epoch.
 
     Returns:
         A list of the next train times in seconds from now.
-        Update status boolean
     """
 
-    # Get the train times
-    train_times, status = get_train_times_in_secs_since_epoch(station, platform)
-
     # Calculate the difference between the current time and the train times
-    train_times_diff = [time - current_time_in_seconds for time in train_times]
-
-    return train_times_diff, status
+    return [time - current_time_in_seconds for time in train_times]
 
 
 def minute_to_position(minute, num_leds = NUM_LEDS, offset = OFFSET):
@@ -175,15 +152,58 @@ def minute_to_position(minute, num_leds = NUM_LEDS, offset = OFFSET):
     return position
 
 
-def update_display(current_time_in_seconds, current_time_minutes, station_code, platform_num, led_strip = led_strip):
-    """Main function: retrieve train times and update the LED display.
+class LastGoodDepartures:
+    """The train times last drawn from a successful fetch, and when."""
+
+    def __init__(self):
+        self.times = None
+        self.updated = None
+
+    def remember(self, train_times, current_time_in_seconds):
+        self.times = train_times
+        self.updated = current_time_in_seconds
+
+    def age(self, current_time_in_seconds):
+        return current_time_in_seconds - self.updated
+
+
+last_good = LastGoodDepartures()
+
+# The trains on show, kept moving between fetches
+tracker = TrainTracker()
+
+# UTC and UK time, kept by NTP in the background, or from the API's
+# responses if NTP can't be had
+timebase = Timebase(server=server_clock)
+
+# When the clock runs: weekday mornings. Outside these it sleeps.
+schedule = CommuteSchedule(overrides={day: () for day in HOLIDAYS})
+
+
+def stale_colour(age):
+    """HIGHLIGHT_BLUE, dimmed for departures `age` seconds old."""
+
+    level = max(STALE_MIN, 256 - 256 * age // STALE_FADE)
+    r, g, b = HIGHLIGHT_BLUE_RGB
+    return r * level >> 8, g * level >> 8, b * level >> 8
+
+
+def update_display(current_time_in_seconds, current_time_minutes, train_times, status, led_strip = led_strip, framebuffer = framebuffer, last_good = last_good, layer = trains_layer, compositor = compositor, tracker = tracker, stale = None):
+    """Update the LED display from the latest train times.
 
     Args:
         current_time_in_seconds: The current time in seconds.
         current_time_minutes: The current minute.
-        station_code: The station code.
-        platform_num: The platform number.
+        train_times: Train times in seconds since the epoch.
+        status: Whether the last fetch succeeded, for some platforms at least.
         led_strip: The LED strip object.
+        framebuffer: The FrameBuffer the layers are blended into.
+        last_good: The LastGoodDepartures to redraw from when status is False.
+        layer: The Layer to draw the trains into.
+        compositor: The Compositor holding the layer.
+        tracker: The TrainTracker to hand the trains to, to keep them moving.
+        stale: For each of train_times, whether it's left from before
+            because its platform's fetch failed; those are drawn in blue.
 
     Returns:
         None
@@ -192,82 +212,265 @@ def update_display(current_time_in_seconds, current_time_minutes, station_code,
     print(f"Current time in seconds: {current_time_in_seconds}")
     print(f"Current time in minutes: {current_time_minutes}")
 
-    # Get the next train times
-    train_waits_in_seconds, status = get_next_train_waits(current_time_in_seconds, station_code, 1)
-    print("Got next train waits")
-
-    # If status is True, update the display
+    # If status is True, draw the new trains in red, and remember them
     if status:
-        # calculate the wait times in minutes, and print
-        list_of_minutes = []
-        list_of_positions = []
-        for wait_seconds in train_waits_in_seconds:
-            wait_minutes = wait_seconds // 60
-            arrival_time = (current_time_minutes + (wait_seconds // 60)) % 60
-            # reject train if more than 57 minutes away
-            # (57 because we have diffused LEDs, so it can look like we've just missed
-            # a train when it's actually an hour away. Better to hide it for a few minutes
-            # until the hand has move aside..)
-            if wait_minutes > 57:
-                print(f"Skip train in {wait_minutes} mins, arrives at {arrival_time} minutes past the hour")
-                continue
-            list_of_minutes.append(arrival_time)
-            list_of_positions.append(minute_to_position(arrival_time))
-            print(f"Train in {wait_minutes} minutes, arrives at {arrival_time} minutes past the hour, position {minute_to_position(arrival_time)}")
-
-        # Update the LED strip.
-        for i in range(NUM_LEDS):
-            # Set pixel to black, unless position is in list_of_positions,
-            # in which case set to HIGHLIGHT.
-            if i not in list_of_positions:
-                led_strip.set_rgb(i, 0, 0, 0)
-            else:
-                led_strip.set_hsv(i, *HIGHLIGHT_RED)
+        last_good.remember(train_times, current_time_in_seconds)
+        colour = HIGHLIGHT_RED_RGB
 
     else:
         print("No train data available.")
-        # Change the LED strip to display the previous data, but in blue.
-        for i in range(NUM_LEDS):
-            # Test the pixel colour at this position
-            if led_strip.get(i) == "(155, 0, 0, 0)":
-                continue
-            else:
-                # Pixel wasn't black, so change it to blue
-                led_strip.set_hsv(i, *HIGHLIGHT_BLUE)
+        # Redraw the last good trains from memory, in blue, fading as they
+        # get older. Trains that have left since are dropped.
+        if last_good.times is None:
+            train_times = ()
+            colour = HIGHLIGHT_BLUE_RGB
+        else:
+            age = last_good.age(current_time_in_seconds)
+            print(f"Showing trains from {age} seconds ago")
+            train_times = [time for time in last_good.times if time >= current_time_in_seconds]
+            colour = stale_colour(age)
+        stale = None
+
+    train_waits_in_seconds = get_next_train_waits(current_time_in_seconds, train_times)
+
+    # calculate the wait times in minutes, and print
+    list_of_times = []
+    colours = []
+    for i, wait_seconds in enumerate(train_waits_in_seconds):
+        wait_minutes = wait_seconds // 60
+        arrival_time = (current_time_minutes + (wait_seconds // 60)) % 60
+        # reject train if more than 57 minutes away
+        # (57 because we have diffused LEDs, so it can look like we've just missed
+        # a train when it's actually an hour away. Better to hide it for a few minutes
+        # until the hand has move aside..)
+        if wait_minutes > 57:
+            print(f"Skip train in {wait_minutes} mins, arrives at {arrival_time} minutes past the hour")
+            continue
+        list_of_times.append(current_time_in_seconds + wait_seconds)
+        colours.append(HIGHLIGHT_BLUE_RGB if stale is not None and stale[i] else colour)
+        print(f"Train in {wait_minutes} minutes, arrives at {arrival_time} minutes past the hour")
+
+    # Hand the trains to the tracker, which moves them on from here until
+    # the next update, and draw them as they are now.
+    ticks = time.ticks_ms()
+    tracker.update(list_of_times, current_time_in_seconds, colour, ticks, colours if stale else None)
+    draw_trains(ticks, led_strip, framebuffer, layer, compositor, tracker)
+
+
+def draw_trains(ticks, led_strip = led_strip, framebuffer = framebuffer, layer = trains_layer, compositor = compositor, tracker = tracker):
+    """Draw the tracked trains as of `ticks` (time.ticks_ms()), and send the
+    pixels that changed to the strip."""
+
+    # Black, with the colour at each train's position.
+    tracker.draw(layer, positions, ticks)
+
+    # Blend in what changed, and send only the pixels that changed to the strip.
+    compositor.compose(framebuffer)
+    framebuffer.show(led_strip)
+
+
+class DepartureState:
+    """Latest departures, handed from the fetch task to the render task."""
+
+    def __init__(self):
+        self.departures = DepartureTable()
+        self.status = False
+        # Indexes of the subscriptions whose departures are left from before.
+        self.stale = set()
+        self.updated = uasyncio.Event()
+
+
+async def fetch_task(state, subscriptions, scheduler=None, timebase=timebase, nm=None):
+    """Fetch and parse departures, polling sooner when a train is close.
+
+    With a NetworkManager, each fetch acquires the wifi link, waiting up to
+    LINK_WAIT seconds for it, then goes ahead regardless, so a long outage
+    shows as failed fetches. The link is released until the next fetch,
+    which starts early by however long the radio takes to come back.
+    """
+
+    if scheduler is None:
+        scheduler = PollScheduler(POLL_MIN, POLL_MAX, fixed_interval=POLL_INTERVAL)
+
+    while True:
+        if nm is not None:
+            try:
+                await uasyncio.wait_for(nm.acquire(), LINK_WAIT)
+            except uasyncio.TimeoutError:
+                print(f"Wifi still down; {nm.report()}")
+        state.departures, state.status, state.stale = await get_departures(subscriptions, state.departures)
+        # Each response is also a reading of the server's clock.
+        timebase.check()
+        state.updated.set()
+
+        if state.status:
+            delay = scheduler.success(get_next_train_waits(timebase.now(), state.departures.times))
+        else:
+            delay = scheduler.failure()
+        print(f"Next update in {delay:.0f} s; {scheduler.report()}; API {governor.report()}")
+        if nm is not None:
+            nm.release(delay)
+            print(f"Wifi: {nm.duty_report()}")
+            delay = max(0, delay - nm.lead_s())
+        await uasyncio.sleep(delay)
+
+
+async def render_task(state, led_strip = led_strip, frames = None, tracker = tracker, timebase = timebase):
+    """Redraw the display whenever new departures arrive, and in between
+    whenever the tracked trains move on.
+
+    Runs at UPDATES frames per second through a FrameScheduler, so the strip
+    can be animated independently of the network, and frame times are
+    reported with each redraw from new departures.
+    """
+
+    if frames is None:
+        frames = FrameScheduler(UPDATES)
+
+    def render(deadline):
+        if state.updated.is_set():
+            state.updated.clear()
+            # UTC to compare with train times; the minute is the same in UK time.
+            now = timebase.now()
+            departures = state.departures
+            stale = [i in state.stale for i in departures.subscription] if state.stale else None
+            update_display(now, timebase.local(now) // 60 % 60, departures.times, state.status, led_strip, tracker = tracker, stale = stale)
+            print(f"Frames: {frames.report()}")
+            print(f"Time: {timebase.report()}")
+        else:
+            ticks = time.ticks_ms()
+            if tracker.due(ticks):
+                draw_trains(ticks, led_strip, tracker = tracker)
+
+    await frames.run(render)
+
+
+def blank(led_strip = led_strip, tracker = tracker):
+    """Take every train off the display, leaving the LEDs dark."""
+
+    ticks = time.ticks_ms()
+    tracker.update((), timebase.now(), tracker.colour, ticks)
+    draw_trains(ticks, led_strip, tracker = tracker)
+
+
+def restore(last_good = last_good):
+    """Redraw the last good trains on waking, those that haven't left yet,
+    until the first fetch comes in."""
+
+    if last_good.times is not None:
+        now = timebase.now()
+        update_display(now, timebase.local(now) // 60 % 60, (), False)
+
+
+def in_window(schedule = schedule):
+    """Whether the clock should be running: in a window of the schedule, or
+    the time isn't known well enough to say."""
+
+    return not timebase.synced() or schedule.active(timebase.local())
+
+
+def sleep_until_window(schedule = schedule):
+    """Lightsleep the board until the next window starts.
+
+    Everything stops meanwhile, tasks included; time.ticks_ms() keeps
+    counting, so the timebase still knows the time on waking, and resyncs
+    with NTP on waking if a sync has come due meanwhile.
+    """
+
+    while not in_window(schedule):
+        change = schedule.until_change(timebase.local())
+        if change is None:
+            ms = SLEEP_MAX_MS
+        else:
+            ms = min(SLEEP_MAX_MS, change * 1000)
+        machine.lightsleep(ms)
+
+
+async def run(subscriptions, nm = None, schedule = schedule):
+    """Run the fetch and render tasks side by side, with the time kept
+    in sync in the background, during each window of the schedule.
+
+    Between windows the display is blanked, the radio turned off and the
+    board put to sleep, and on waking the last good trains are redrawn
+    until new ones arrive.
+
+    Args:
+        subscriptions: List of (station_code, platform_num) tuples to show.
+        nm: NetworkManager to keep the wifi link up with, and turn the radio
+            off and back on with, or None to leave it alone.
+        schedule: CommuteSchedule to run to, or None to run all the time.
+    """
+
+    state = DepartureState()
+    poller = PollScheduler(POLL_MIN, POLL_MAX, fixed_interval=POLL_INTERVAL)
+    if schedule is not None:
+        # Know the time before deciding whether to sleep.
+        await timebase.sync()
+
+    while True:
+        if schedule is not None and not in_window(schedule):
+            blank()
+            if nm is not None:
+                # No connections left open on the link about to go.
+                await close_clients()
+                nm.power_down()
+            schedule.slept(timebase.now())
+            print(f"Sleeping until the next window; {schedule.report(poller.polls * len(subscriptions), timebase.now())}")
+            sleep_until_window(schedule)
+            restore()
+
+        tasks = [
+            uasyncio.create_task(timebase.run(nm, LINK_WAIT)),
+            uasyncio.create_task(fetch_task(state, subscriptions, poller, nm = nm)),
+            uasyncio.create_task(render_task(state)),
+        ]
+        if nm is not None:
+            # Brings the radio back after sleeping, and the link after drops.
+            tasks.append(uasyncio.create_task(nm.supervise(WIFI_CONFIG.SSID, WIFI_CONFIG.PSK)))
+        if schedule is None:
+            await tasks[2]
+            return
+        schedule.woke(timebase.now())
+
+        # The time can be corrected meanwhile, so look again every minute.
+        while in_window(schedule):
+            change = schedule.until_change(timebase.local()) if timebase.synced() else None
+            await uasyncio.sleep(60 if change is None else min(60, change))
+        for task in tasks:
+            task.cancel()
+        # Let them finish cancelling before the radio goes.
+        await uasyncio.sleep(0)
 
 
 if __name__ == "__main__":
     # Connect to wifi
-    nm = NetworkManager("GB", status_handler=status_handler)
+    # A fixed address in WIFI_CONFIG saves waiting on DHCP when reconnecting.
+    nm = NetworkManager("GB", status_handler=status_handler, static_ip=getattr(WIFI_CONFIG, "IFCONFIG", None), lease_s=getattr(WIFI_CONFIG, "LEASE_S", None), duty_cycle=DUTY_CYCLE, before_off=close_clients, reopen_ms=reopen_ms)
 
     uasyncio.get_event_loop().run_until_complete(
         nm.client(WIFI_CONFIG.SSID, WIFI_CONFIG.PSK)
     )
 
-    # Get the current time
-    rtc = RTC()
-    ntptime.settime()
-    time.sleep(1)
+    # The time is set from NTP by the timebase once everything is running,
+    # and kept set from then on; until then we go by the RTC.
 
-    # Get the station mappings
-    # station_mappings = get_station_mappings()
+    # Get the station mappings (get_station_mapping and get_platform_info are
+    # in metro_api)
+    # station_mappings = get_station_mapping()
     # Get the platform information for a station
     # station_code = station_mappings["Whitley Bay"]
     # print(f"Station code for Whitley Bay: {station_code}")
     # platform_info = get_platform_info(station_code)
     # print(f"Platform information for Whitley Bay: {platform_info}")
 
-    # Hard-code the station code and platform number
+    # Hard-code the station codes and platform numbers
     # We don't need to do an API lookup, we're not moving that quickly
-    station_code = "WTL"
-    platform_number = 1
-
-    while True:
-        # Update the display
-        current_time = time.localtime()
-        current_time_in_seconds = time.mktime(current_time)
-        current_time_minutes = current_time[4]
-        update_display(current_time_in_seconds, current_time_minutes, station_code, platform_number)
-
-        # Sleep for two minutes
-        time.sleep(120)
+    # Add more (station_code, platform_number) pairs to watch them too,
+    # e.g. ("WTL", 2) for the other direction.
+    subscriptions = [("WTL", 1)]
+    # Enough API requests for every platform at the fastest poll rate.
+    governor.size(len(subscriptions), POLL_MIN)
+
+    # Fetch departures as the scheduler decides, and redraw as new data
+    # arrives, during each commute window; sleep in between.
+    uasyncio.get_event_loop().run_until_complete(run(subscriptions, nm))
@@ -1,28 +1,196 @@
-import urequests
-from network_manager import NetworkManager
-from machine import RTC
-import ntptime
-import time
-import WIFI_CONFIG
 import json
-import uasyncio
+import time
 
+try:
+    import uasyncio
+except ImportError:
+    import asyncio as uasyncio
 
-def get_station_mapping():
-    """Retrieve and parse station mappings from API query."""
+from departures import CHUNK_SIZE, DepartureParser, DepartureTable
+from governor import RequestGovernor
+from http_client import AsyncHTTPClient, HTTPClient
+from timesource import ServerClock, ticks_ms
 
-    try:
-        response = urequests.get('https://metro-rti.nexus.org.uk/api/stations')
-        stations_data = response.json()
 
-        name_to_code = {}
-        for code, name in stations_data.items():
-            name_to_code[name] = code
+API_HOST = "metro-rti.nexus.org.uk"
+STATIONS_PATH = "/api/stations"
+PLATFORMS_PATH = "/api/stations/platforms"
+
+# One kept-alive connection shared by every API call. Swap this for a client
+# pointed elsewhere (e.g. a local stand-in server) to run against test data.
+client = HTTPClient(API_HOST)
+
+# Seconds allowed for a whole departures fetch, from connect to last byte.
+REQUEST_TIMEOUT = 20
+
+# Most platforms fetched at once. Each needs its own TLS connection, and
+# those are expensive in RAM on the Pico.
+MAX_CONCURRENT = 2
+
+# Non-blocking counterparts of `client`, for the departures polled by the main
+# loop, so rendering carries on while a request is in flight. Concurrent
+# fetches use one each; more are added as needed and kept between polls.
+async_clients = [AsyncHTTPClient(API_HOST, timeout=REQUEST_TIMEOUT)]
+
+# Milliseconds a new connection to the API is taken to cost until one has
+# been timed. Most of it is the TLS handshake, which takes the Pico seconds.
+HANDSHAKE_MS = 2000
+
+# Every request to the API goes through this first, so an outage gets
+# backed off from rather than hammered.
+governor = RequestGovernor()
+
+# The API server's time, read off departures responses, to fall back on
+# when NTP can't tell us the time.
+server_clock = ServerClock()
+
+# Station and platform data changes maybe once a year, so keep it on flash
+# and only go back to the API after this many seconds.
+REF_TTL = 30 * 24 * 60 * 60
+
+
+def api_get(path, headers=None):
+    """GET an API path over the shared connection, returning the Response.
+
+    The caller must close() the response so the connection can be reused.
+    """
+
+    return client.get(path, headers)
+
+
+def _header(response, name):
+    """Case-insensitive lookup of a response header, or None."""
+
+    headers = getattr(response, "headers", None) or {}
+    name = name.lower()
+    for key in headers:
+        if key.lower() == name:
+            return headers[key]
+    return None
+
+
+class RefCache:
+    """Reference data from the API, kept on flash with a TTL.
+
+    The payload is reduced to a compact form before it's written, so reading it
+    back at boot is a small local file read rather than a TLS download of the
+    whole network. Once the TTL runs out the API is asked again, using the
+    ETag / Last-Modified validators if the server sent any; if that request
+    fails, the stale copy is served rather than nothing.
+    """
+
+    def __init__(self, endpoint, path, compact, ttl=REF_TTL):
+        """
+        Args:
+            endpoint: API path to fetch.
+            path: File on flash to keep the compact copy in.
+            compact: Function reducing the decoded JSON to what we keep.
+            ttl: Seconds before the cached copy is revalidated.
+        """
+        self._endpoint = endpoint
+        self._path = path
+        self._compact = compact
+        self._ttl = ttl
+        self._entry = None
+
+    def _load(self):
+        try:
+            with open(self._path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, entry):
+        try:
+            with open(self._path, "w") as f:
+                json.dump(entry, f)
+        except OSError as e:
+            print(f"Error writing {self._path}: {e}")
+
+    def expired(self, now=None):
+        if self._entry is None:
+            return True
+        if now is None:
+            now = time.time()
+        return now - self._entry["fetched"] > self._ttl
+
+    def _refresh(self, now):
+        headers = {}
+        if self._entry is not None:
+            if self._entry.get("etag"):
+                headers["If-None-Match"] = self._entry["etag"]
+            if self._entry.get("last_modified"):
+                headers["If-Modified-Since"] = self._entry["last_modified"]
+
+        governor.check(self._endpoint)
+        try:
+            response = api_get(self._endpoint, headers)
+            try:
+                if response.status_code == 304 and self._entry is not None:
+                    self._entry["fetched"] = now
+                elif response.status_code == 200:
+                    self._entry = {
+                        "fetched": now,
+                        "etag": _header(response, "ETag"),
+                        "last_modified": _header(response, "Last-Modified"),
+                        "data": self._compact(response.json()),
+                    }
+                else:
+                    raise OSError(f"HTTP {response.status_code}")
+            finally:
+                response.close()
+        except Exception:
+            governor.failure(self._endpoint)
+            raise
+        governor.success(self._endpoint)
+        self._save(self._entry)
+
+    def get(self):
+        """Return the compact data, from memory or flash where possible.
+
+        Returns None if there is no cached copy and the API can't be reached.
+        """
+
+        if self._entry is None:
+            self._entry = self._load()
+
+        now = time.time()
+        if self.expired(now):
+            try:
+                self._refresh(now)
+            except Exception as e:
+                print(f"Error refreshing {self._endpoint}: {e}")
+
+        return self._entry["data"] if self._entry is not None else None
+
+
+def _compact_stations(stations_data):
+    """Invert the code -> name mapping, which is how we look stations up."""
+
+    return {name: code for code, name in stations_data.items()}
+
 
-        return name_to_code
-    except Exception as e:
-        print(f"Error fetching station data: {e}")
-        return {}
+def _compact_platforms(platforms_data):
+    """Keep only the helper text for each platform, dropping coordinates."""
+
+    return {
+        code: [platform["helperText"] for platform in platforms]
+        for code, platforms in platforms_data.items()
+    }
+
+
+stations_cache = RefCache(STATIONS_PATH, "ref_stations.json", _compact_stations)
+platforms_cache = RefCache(PLATFORMS_PATH, "ref_platforms.json", _compact_platforms)
+
+
+def get_station_mapping():
+    """Retrieve station mappings, from the flash cache where possible.
+
+    Returns:
+        Dictionary of station names to station codes.
+    """
+
+    return stations_cache.get() or {}
 
 
 def get_platform_info(station_code):
@@ -34,18 +202,125 @@ def get_platform_info(station_code):
     Returns:
         List of helper text strings for each platform
     """
+
+    platforms_data = platforms_cache.get() or {}
+    return platforms_data.get(station_code, [])
+
+
+async def _fetch_departures(client, path):
+    sent = ticks_ms()
+    response = await client.get(path)
+    received = ticks_ms()
+    if response.status_code != 200:
+        await response.close()
+        raise OSError(f"HTTP {response.status_code}")
+    server_clock.add_date(_header(response, "Date"), sent, received)
+
+    # Parse as the body arrives, yielding to other tasks between chunks.
+    parser = DepartureParser()
+    trains = []
+    while True:
+        chunk = await response.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        trains.extend(parser.feed(chunk))
+    await response.close()
+    server_clock.add_event(parser.latest_event, received)
+    return trains
+
+
+async def fetch_departures(station_code, platform_num, timeout=REQUEST_TIMEOUT, client=None):
+    """Fetch the departures for a platform without blocking the event loop.
+
+    Args:
+        station_code: Three letter station code (e.g. 'MTS')
+        platform_num: The platform number to query.
+        timeout: Seconds allowed for the whole request.
+        client: AsyncHTTPClient to use; defaults to the first shared one.
+
+    Returns:
+        List of train tuples, as DepartureParser.feed().
+
+    Raises OSError or uasyncio.TimeoutError on failure, after dropping the
+    connection so the next request starts clean, or Refused at once, with
+    no request made, if the governor won't let it go.
+    """
+
+    if client is None:
+        client = async_clients[0]
+    path = f"/api/times/{station_code}/{platform_num}"
+    governor.check(path)
     try:
-        response = urequests.get('https://metro-rti.nexus.org.uk/api/stations/platforms')
-        platforms_data = response.json()
+        trains = await uasyncio.wait_for(_fetch_departures(client, path), timeout)
+    except Exception:
+        governor.failure(path)
+        await client.close()
+        raise
+    governor.success(path)
+    return trains
+
+
+async def close_clients():
+    """Close every kept-alive connection to the API, so none are left open
+    on a link that's about to go, as when the radio's turned off."""
+
+    for async_client in async_clients:
+        await async_client.close()
+    client.close()
+
+
+def reopen_ms():
+    """Milliseconds it would take to open again the API connections open
+    now, as after they've been closed for the radio to go off."""
+
+    total = 0
+    for open_client in async_clients + [client]:
+        if open_client.connected():
+            total += HANDSHAKE_MS if open_client.connect_ms is None else open_client.connect_ms
+    return total
+
+
+async def fetch_subscriptions(subscriptions, concurrency=MAX_CONCURRENT, timeout=REQUEST_TIMEOUT):
+    """Fetch departures for several platforms concurrently.
+
+    Up to `concurrency` requests are in flight at once, each on its own kept-
+    alive connection, so total time is close to the slowest request rather
+    than the sum of them all.
+
+    Args:
+        subscriptions: List of (station_code, platform_num) tuples.
+        concurrency: Most requests to have in flight at once.
+        timeout: Seconds allowed for each request.
+
+    Returns:
+        DepartureTable of every subscription that succeeded, sorted by
+        predicted time, with each departure's `subscription` set to the
+        index of its subscription in the list.
+        Dictionary of subscription to exception, for any that failed.
+    """
 
-        if station_code not in platforms_data:
-            return []
+    pending = list(subscriptions)
+    results = {}
+    errors = {}
 
-        station_platforms = platforms_data[station_code]
-        helper_texts = [platform['helperText'] for platform in station_platforms]
+    async def worker(client):
+        while pending:
+            subscription = pending.pop(0)
+            try:
+                results[subscription] = await fetch_departures(
+                    subscription[0], subscription[1], timeout, client
+                )
+            except Exception as e:
+                errors[subscription] = e
 
-        return helper_texts
+    workers = min(concurrency, len(pending))
+    while len(async_clients) < workers:
+        async_clients.append(AsyncHTTPClient(API_HOST, timeout=REQUEST_TIMEOUT))
+    await uasyncio.gather(*[worker(async_clients[i]) for i in range(workers)])
 
-    except Exception as e:
-        print(f"Error fetching platform data: {e}")
-        return []
+    departures = DepartureTable()
+    for index, subscription in enumerate(subscriptions):
+        for train in results.get(subscription, ()):
+            departures.add(train, index)
+    departures.sort()
+    return departures, errors
@@ -1,13 +1,30 @@
 import rp2
 import network
 import machine
+import time
 import uasyncio
 
 
+# Power management modes for WLAN.config(pm=...), as the port names them:
+# power saving off, as we've always had it, and power save. Firmware too old
+# to have PM_POWERSAVE can't idle in power save, so gaps are spent off.
+PM_NONE = getattr(network.WLAN, "PM_NONE", 0xa11140)
+PM_POWERSAVE = getattr(network.WLAN, "PM_POWERSAVE", None)
+
+# Current the radio draws, in mA: associated with power saving off, in
+# power save, and while connecting. These are guesses, not measured on the
+# board; pass radio_ma to NetworkManager to use figures measured on yours.
+ON_MA = 45
+POWERSAVE_MA = 3
+CONNECT_MA = 60
+# Milliseconds a reconnect is taken to cost until one has been timed.
+RECONNECT_MS = 3000
+
+
 class NetworkManager:
     _ifname = ("Client", "Access Point")
 
-    def __init__(self, country="GB", client_timeout=60, access_point_timeout=5, status_handler=None, error_handler=None):
+    def __init__(self, country="GB", client_timeout=60, access_point_timeout=5, status_handler=None, error_handler=None, static_ip=None, lease_s=None, duty_cycle=False, keep_s=None, radio_ma=(ON_MA, POWERSAVE_MA, CONNECT_MA), before_off=None, reopen_ms=None):
         rp2.country(country)
         self._ap_if = network.WLAN(network.AP_IF)
         self._sta_if = network.WLAN(network.STA_IF)
@@ -19,6 +36,48 @@ class NetworkManager:
         self._error_handler = error_handler
         self.UID = ("{:02X}" * 8).format(*machine.unique_id())
 
+        # Set while the client link is up, for tasks to await.
+        self.link = uasyncio.Event()
+        # For reconnecting fast: a fixed (ip, mask, gateway, dns) to skip
+        # DHCP with, or else the last lease, if lease_s says how long the
+        # DHCP server's leases last; and the access point found by the scan
+        # in client(), (bssid, channel, rssi), to skip the driver's scan.
+        self._static_ip = static_ip
+        self._lease_s = lease_s
+        self._lease = None
+        self._lease_at = 0
+        # Whether the interface has a fixed address set, from either.
+        self._addressed = False
+        self._ap = None
+        # Connect metrics: attempts, failures, links lost, and how long
+        # each successful connect took, in ms.
+        self.attempts = 0
+        self.failures = 0
+        self.drops = 0
+        self.connect_ms = []
+
+        # Duty cycling: with it on, the radio is only fully up between
+        # acquire() and release(). Idle gaps shorter than keep_s seconds
+        # are spent in power save, and longer ones with it off; None works
+        # keep_s out from how long reconnects take, and the radio's current
+        # in mA (on, power save, connecting). before_off is awaited before
+        # the radio's turned off, to close sockets left open on the link,
+        # and reopen_ms says how many ms it would take to open them again,
+        # which power save, keeping them, saves too.
+        self.duty_cycle = duty_cycle
+        self.keep_s = keep_s
+        self.radio_ma = radio_ma
+        self._before_off = before_off
+        self._reopen_ms = reopen_ms
+        self._holds = 0
+        self._parked = False
+        self._wake = uasyncio.Event()
+        self._next_use = None
+        # Milliseconds spent in each radio state, for duty_report().
+        self.radio_ms = {"on": 0, "powersave": 0, "off": 0}
+        self._state = "on"
+        self._since = time.ticks_ms()
+
     def isconnected(self):
         return self._sta_if.isconnected() or self._ap_if.isconnected()
 
@@ -50,6 +109,23 @@ class NetworkManager:
         if self._ap_if.isconnected():
             self._ap_if.disconnect()
 
+    def power_down(self):
+        """Disconnect and turn the radio off; client() or reconnect() turns
+        it back on."""
+        self.link.clear()
+        self._holds = 0
+        self._parked = False
+        self._enter("off")
+        self.disconnect()
+        self._sta_if.active(False)
+        self._ap_if.active(False)
+
+    def _enter(self, state):
+        now = time.ticks_ms()
+        self.radio_ms[self._state] += time.ticks_diff(now, self._since)
+        self._state = state
+        self._since = now
+
     async def wait(self, mode):
         while not self.isconnected():
             self._handle_status(mode, None)
@@ -74,11 +150,13 @@ class NetworkManager:
         self._ap_if.active(False)
 
         self._sta_if.active(True)
-        self._sta_if.config(pm=0xa11140)
+        self._sta_if.config(pm=PM_NONE)
         self._sta_if.connect(ssid, psk)
 
         try:
             await uasyncio.wait_for(self.wait(network.STA_IF), self._client_timeout)
+            self._linked()
+            self._find_ap(ssid)
             self._handle_status(network.STA_IF, True)
 
         except uasyncio.TimeoutError:
@@ -86,6 +164,222 @@ class NetworkManager:
             self._handle_status(network.STA_IF, False)
             self._handle_error(network.STA_IF, "WIFI Client Failed")
 
+    def _linked(self):
+        """Note the link up, and the lease to reconnect fast with."""
+        self.link.set()
+        if self._static_ip is None and self._lease_s is not None:
+            self._lease = self._sta_if.ifconfig()
+            self._lease_at = time.ticks_ms()
+
+    def _find_ap(self, ssid):
+        """Scan for the strongest access point with our SSID, to rejoin by
+        BSSID. The scan blocks for a second or two, so it's only done here,
+        at setup, and never while reconnecting."""
+        try:
+            for found in self._sta_if.scan():
+                if found[0].decode() == ssid and (self._ap is None or found[3] > self._ap[2]):
+                    self._ap = (found[1], found[2], found[3])
+        except OSError:
+            pass
+
+    async def _connected(self):
+        while not self._sta_if.isconnected():
+            if self._sta_if.status() < 0:
+                raise OSError(self._sta_if.status())
+            await uasyncio.sleep_ms(100)
+
+    async def reconnect(self, ssid, psk, timeout=15):
+        """Try once to bring the client link back, returning whether it came.
+
+        Joins the access point found at setup, by BSSID, and uses the
+        static IP, so there's no scan or DHCP to wait for. The last DHCP
+        lease is reused too, but only within half of lease_s, when a DHCP
+        client would first renew it, so the address is still ours. Any
+        failed try goes back to DHCP, and one with the access point in
+        sight forgets it and joins by SSID from then on, rather than
+        scanning again.
+        """
+        self.attempts += 1
+        fast = self._ap is not None
+        ifconfig = self._static_ip
+        if ifconfig is None and self._lease is not None:
+            if time.ticks_diff(time.ticks_ms(), self._lease_at) < self._lease_s * 500:
+                ifconfig = self._lease
+            else:
+                self._lease = None
+        self._enter("on")
+        started = time.ticks_ms()
+        try:
+            self._sta_if.active(True)
+            if ifconfig is None and self._addressed:
+                self._use_dhcp()
+            self._sta_if.config(pm=PM_NONE)
+            if ifconfig is not None:
+                # A fixed address skips DHCP.
+                self._sta_if.ifconfig(ifconfig)
+                self._addressed = True
+            if fast:
+                self._sta_if.connect(ssid, psk, bssid=self._ap[0])
+            else:
+                self._sta_if.connect(ssid, psk)
+            await uasyncio.wait_for(self._connected(), timeout)
+        except (uasyncio.TimeoutError, OSError):
+            missing = self._sta_if.status() == network.STAT_NO_AP_FOUND
+            self._sta_if.disconnect()
+            self.failures += 1
+            # The address may have gone to someone else meanwhile.
+            self._lease = None
+            if not missing:
+                # Perhaps the access point has changed.
+                self._ap = None
+            return False
+        self.connect_ms.append(time.ticks_diff(time.ticks_ms(), started))
+        self._linked()
+        return True
+
+    def _use_dhcp(self):
+        """Undo a fixed address left from before. Not with ifconfig("dhcp"),
+        which blocks for up to 10 s waiting on a lease that can't come
+        before the link's up, but with ipconfig() where the port has it,
+        and otherwise by turning the interface off and on again."""
+        ipconfig = getattr(self._sta_if, "ipconfig", None)
+        if ipconfig is not None:
+            ipconfig(dhcp4=True)
+        else:
+            self._sta_if.active(False)
+            self._sta_if.active(True)
+        self._addressed = False
+
+    async def supervise(self, ssid, psk, check_ms=2000, timeout=15, backoff=2, max_backoff=120):
+        """Keep the client link up, as a background task.
+
+        Checks it every check_ms, and when it's down reconnects, waiting
+        twice as long after each failed try, from backoff up to max_backoff
+        seconds. `link` is set while it's up, so others can wait on that
+        rather than polling.
+        """
+        delay = backoff
+        while True:
+            if self._parked:
+                # Off between uses, or on its way there; wait to be wanted
+                # again.
+                await self._wake.wait()
+                self._wake.clear()
+                continue
+            if self._sta_if.isconnected():
+                self.link.set()
+                delay = backoff
+                await uasyncio.sleep_ms(check_ms)
+                continue
+            if self.link.is_set():
+                self.link.clear()
+                self.drops += 1
+                self._handle_status(network.STA_IF, False)
+            if await self.reconnect(ssid, psk, timeout):
+                if self._parked:
+                    # Given up on while it was connecting.
+                    self._park()
+                    continue
+                self._handle_status(network.STA_IF, True)
+            else:
+                await uasyncio.sleep(delay)
+                delay = min(max_backoff, delay * 2)
+
+    async def link_up(self):
+        """Wait until the client link is up."""
+        await self.link.wait()
+
+    async def acquire(self):
+        """Wait for the client link to be up, and keep it fully up until
+        release(). When duty cycling, this brings the radio back out of
+        power save, or has supervise() reconnect if it was off."""
+        self._holds += 1
+        if self.duty_cycle:
+            if self._parked:
+                self._parked = False
+                self._wake.set()
+            elif self._state == "powersave":
+                self._sta_if.config(pm=PM_NONE)
+                self._enter("on")
+        await self.link.wait()
+
+    def reconnect_ms(self):
+        """How long reconnecting is expected to take, from recent ones."""
+        recent = self.connect_ms[-5:]
+        return sum(recent) // len(recent) if recent else RECONNECT_MS
+
+    def keep(self, idle_s):
+        """Whether to spend an idle gap of idle_s seconds in power save,
+        rather than off and reconnecting after."""
+        if PM_POWERSAVE is None:
+            return False
+        if self.keep_s is not None:
+            return idle_s < self.keep_s
+        on_ma, powersave_ma, connect_ma = self.radio_ma
+        reopen_ms = self._reopen_ms() if self._reopen_ms is not None else 0
+        return idle_s * powersave_ma * 1000 < self.reconnect_ms() * connect_ma + reopen_ms * on_ma
+
+    def release(self, next_in=None):
+        """Done with the link, for now. When duty cycling and nothing else
+        holds it, the radio goes into power save or off, by keep(), until
+        it's next wanted: in next_in seconds if given, or else when the last
+        caller to say said it would be."""
+        self._holds = max(0, self._holds - 1)
+        now = time.ticks_ms()
+        if next_in is not None:
+            self._next_use = time.ticks_add(now, int(next_in * 1000))
+        if not self.duty_cycle or self._holds:
+            return
+        idle_s = None
+        if self._next_use is not None:
+            idle_s = time.ticks_diff(self._next_use, now) / 1000
+        if idle_s is not None and self.keep(idle_s):
+            if self._sta_if.isconnected():
+                self._sta_if.config(pm=PM_POWERSAVE)
+                self._enter("powersave")
+            return
+        self._park()
+
+    def _park(self):
+        """Turn the client interface off until the next acquire(), once
+        before_off has closed what was using it."""
+        self._parked = True
+        self.link.clear()
+        uasyncio.create_task(self._off())
+
+    async def _off(self):
+        if self._before_off is not None:
+            try:
+                await self._before_off()
+            except Exception as e:
+                print(f"Closing before the radio goes off: {e}")
+        if not self._parked:
+            # Wanted again meanwhile.
+            return
+        self._sta_if.disconnect()
+        self._sta_if.active(False)
+        self._enter("off")
+
+    def lead_s(self):
+        """Seconds early to acquire() the link, to have it on time."""
+        return self.reconnect_ms() / 1000 if self._parked else 0
+
+    def duty_report(self):
+        self._enter(self._state)
+        total = max(1, sum(self.radio_ms.values()))
+        share = ", ".join(f"{state} {ms * 100 // total}%" for state, ms in self.radio_ms.items())
+        connecting = sum(self.connect_ms)
+        on_ma, powersave_ma, connect_ma = self.radio_ma
+        ma = (self.radio_ms["on"] * on_ma + self.radio_ms["powersave"] * powersave_ma + connecting * (connect_ma - on_ma)) / total
+        return f"radio {share}; reconnects {self.reconnect_ms()} ms; about {ma:.1f} mA"
+
+    def report(self):
+        if self.connect_ms:
+            last = f"last connect {self.connect_ms[-1]} ms, mean {sum(self.connect_ms) // len(self.connect_ms)} ms"
+        else:
+            last = "no reconnects"
+        return f"{self.drops} drops, {self.attempts} reconnects ({self.failures} failed), {last}"
+
     async def access_point(self):
         if self._ap_if.isconnected():
             self._handle_status(network.AP_IF, True)
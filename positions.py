@@ -0,0 +1,81 @@
+"""Map times past the hour to places on the LED ring, between LEDs if need be.
+
+minute_to_position() works from whole minutes and snaps to one LED, so with
+96 LEDs to 60 minutes a train can sit most of an LED from where it should,
+then jump as the minute turns. PositionTable precomputes, for every STEP
+seconds of the hour, the LED a time falls on and how far it is towards the
+next one, so a train can be drawn across two LEDs for one array lookup.
+"""
+
+from array import array
+
+
+# Seconds of the hour per table entry. At 96 LEDs, one LED is 37.5 s.
+STEP = 5
+
+
+class PositionTable:
+    """Lookup from seconds past the hour to (LED, weight).
+
+    The weight, 0-255, is how far the time is from the LED towards the next
+    one, in 256ths. The strip's length and offset are built in; setting
+    either rebuilds the table.
+
+    Args:
+        num_leds: The number of LEDs on the clock face.
+        offset: The offset of the LEDs, as for minute_to_position().
+        step: Seconds of the hour per table entry.
+    """
+
+    def __init__(self, num_leds, offset=0, step=STEP):
+        self._num_leds = num_leds
+        self._offset = offset
+        self.step = step
+        self._table = None
+        self._build()
+
+    def _build(self):
+        num_leds = self._num_leds
+        slots = 3600 // self.step
+        table = array("L", [0] * slots)
+        # Fixed point, 8 fractional bits: position * 256.
+        scale = num_leds * 256
+        offset = self._offset * 256
+        for slot in range(slots):
+            fixed = slot * self.step * scale // 3600 + offset
+            table[slot] = ((fixed >> 8) % num_leds) << 8 | (fixed & 0xFF)
+        self._table = table
+
+    @property
+    def num_leds(self):
+        return self._num_leds
+
+    @num_leds.setter
+    def num_leds(self, value):
+        if value != self._num_leds:
+            self._num_leds = value
+            self._build()
+
+    @property
+    def offset(self):
+        return self._offset
+
+    @offset.setter
+    def offset(self, value):
+        if value != self._offset:
+            self._offset = value
+            self._build()
+
+    def lookup(self, seconds):
+        """Return (led, weight) for a time.
+
+        Args:
+            seconds: Seconds since the epoch, or past the hour.
+
+        Returns:
+            The LED the time falls on, and how far towards the next LED it
+            is, from 0 to 255.
+        """
+
+        entry = self._table[int(seconds) % 3600 // self.step]
+        return entry >> 8, entry & 0xFF
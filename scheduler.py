@@ -0,0 +1,105 @@
+"""Adaptive polling: decide when to next ask the API for departures.
+
+Polling on a flat two minutes is too slow when a train is three minutes out
+and wasteful when the next one is 25 minutes away. Instead, while the next
+train worth showing is further off than `close`, we wait until it's about to
+come within it, and from then on a fraction of the time until it's due,
+within sensible limits. We back off when requests fail.
+
+That trades freshness between trains, when the display only has the tracked
+trains creeping round, for freshness and fewer requests overall.
+"""
+
+from random import uniform
+
+
+class PollScheduler:
+    """Pick the delay before the next departures poll.
+
+    Args:
+        min_interval: Shortest delay between polls, in seconds.
+        max_interval: Longest delay between successful polls, in seconds.
+        fraction: Share of the wait for the next relevant train to sleep for,
+            once it's within `close`.
+        relevant_from: Trains due sooner than this (in seconds) are ignored
+            when choosing the delay; they're already at the platform.
+        close: Seconds before a train from which to keep polling. Until then
+            we wait for it to come within this.
+        jitter: Random spread applied to each delay, as a fraction (0.1 = ±10%).
+        backoff: Multiplier applied to the delay for each consecutive failure.
+        max_backoff: Longest delay after failures, in seconds.
+        fixed_interval: The flat interval we're comparing against, in seconds,
+            and poll at when no relevant train is listed.
+    """
+
+    def __init__(self, min_interval=30, max_interval=600, fraction=0.5, relevant_from=60,
+                 jitter=0.1, backoff=2, max_backoff=900, fixed_interval=120, close=300):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.fraction = fraction
+        self.relevant_from = relevant_from
+        self.close = close
+        self.jitter = jitter
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.fixed_interval = fixed_interval
+
+        self.failures = 0
+        # Polls made, and the total time they covered, for savings reporting.
+        self.polls = 0
+        self.elapsed = 0
+
+    def _jittered(self, delay):
+        if self.jitter:
+            delay *= uniform(1 - self.jitter, 1 + self.jitter)
+        return delay
+
+    def success(self, waits):
+        """Record a successful poll and return the delay before the next one.
+
+        Args:
+            waits: Seconds until each departure, e.g. dueIn * 60 or the
+            predicted time less the current time.
+
+        Returns:
+            Seconds to wait before polling again.
+        """
+
+        self.failures = 0
+        upcoming = [wait for wait in waits if wait >= self.relevant_from]
+        if not upcoming:
+            # Nothing listed, or only trains at the platform; one may be
+            # listed any time, so don't go dark on it for long.
+            delay = self._jittered(self.fixed_interval)
+        elif min(upcoming) > self.close + self.min_interval:
+            # Jittered early rather than late, so we're back as it comes close.
+            delay = (min(upcoming) - self.close) * (1 - uniform(0, 2 * self.jitter))
+        else:
+            delay = self._jittered(min(upcoming) * self.fraction)
+        delay = min(self.max_interval, max(self.min_interval, delay))
+        return self._record(delay)
+
+    def failure(self):
+        """Record a failed poll and return the delay before trying again."""
+
+        self.failures += 1
+        delay = self.min_interval * self.backoff ** (self.failures - 1)
+        delay = min(self.max_backoff, self._jittered(delay))
+        return self._record(delay)
+
+    def _record(self, delay):
+        self.polls += 1
+        self.elapsed += delay
+        return delay
+
+    def saved(self):
+        """Requests saved compared with polling every fixed_interval seconds.
+
+        Negative if we've made more requests than fixed polling would have.
+        """
+
+        return self.elapsed / self.fixed_interval - self.polls
+
+    def report(self):
+        fixed = self.elapsed / self.fixed_interval
+        return f"{self.polls} polls over {self.elapsed:.0f} s, {fixed:.0f} at fixed {self.fixed_interval} s, saved {self.saved():.0f}"
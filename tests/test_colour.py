@@ -0,0 +1,26 @@
+from colour import GAMMA16, Colour, hsv8
+from framebuffer import FrameBuffer, hsv_to_rgb
+
+
+def test_hsv8_matches_float_conversion():
+    for h in range(0, 256, 5):
+        for s in range(0, 256, 15):
+            for v in range(0, 256, 15):
+                expected = hsv_to_rgb(h / 256, s / 255, v / 255)
+                assert max(abs(a - b) for a, b in zip(hsv8(h, s, v), expected)) <= 2, (h, s, v)
+
+
+def test_dithering_averages_to_gamma_level():
+    # Over the 8-frame cycle, dithering should average out to the
+    # gamma-corrected level, fractional part and all.
+    framebuffer = FrameBuffer(8)
+    colour = Colour(framebuffer)
+    for level in range(0, 256, 3):
+        totals = [0] * 8
+        for _ in range(8):
+            colour.fill_rgb(level, 0, 0)
+            colour.next_frame()
+            for i in range(8):
+                totals[i] += framebuffer.pixels[i * 3]
+        for total in totals:
+            assert abs(total * 32 - GAMMA16[level]) <= 256, (level, total)
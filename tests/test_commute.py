@@ -0,0 +1,55 @@
+import emulator
+from conftest import forget_clock_modules
+from commute import CommuteSchedule
+from emulator.server import StandInServer
+from isotime import days_since_epoch
+
+# Monday 2025-01-06, and on through the week.
+MONDAY = days_since_epoch(2025, 1, 6) * 86400
+
+
+def test_active_in_weekday_windows():
+    schedule = CommuteSchedule()
+    assert not schedule.active(MONDAY + 7 * 3600 - 1)
+    assert schedule.active(MONDAY + 7 * 3600) and schedule.active(MONDAY + 8 * 3600 + 1799)
+    assert not schedule.active(MONDAY + 8 * 3600 + 1800)
+    # Saturday.
+    assert not schedule.active(MONDAY + 5 * 86400 + 7 * 3600)
+
+
+def test_until_change_skips_days_off_and_weekends():
+    schedule = CommuteSchedule(overrides={(2025, 1, 8): ()})
+    assert schedule.until_change(MONDAY + 8 * 3600) == 1800
+    # Wednesday is a day off, so Tuesday's window ends and Thursday's is next.
+    assert schedule.until_change(MONDAY + 86400 + 8 * 3600 + 1800) == 2 * 86400 - 5400
+    # Friday's ends, and then not until Monday.
+    assert schedule.until_change(MONDAY + 4 * 86400 + 8 * 3600 + 1800) == 3 * 86400 - 5400
+    assert CommuteSchedule(windows=()).until_change(MONDAY) is None
+
+
+def test_main_sleeps_between_windows(minutes=10):
+    # The last minutes of Monday's window, the night, and the first minutes
+    # of Tuesday's.
+    forget_clock_modules()
+    start = MONDAY + 8 * 3600 + 30 * 60 - minutes * 60
+    emulation = emulator.install(start=start, end=MONDAY + 86400 + 7 * 3600 + minutes * 60)
+    try:
+        with StandInServer(times=emulator.live_times(emulation.clock)) as server:
+            emulator.use_stand_in(server)
+            emulator.run_script("main.py")
+        strip = emulation.led_strips[0]
+        radio_on = emulation.network.interfaces[0].radio_on()
+        sleeps = emulation.machine.sleeps
+    finally:
+        emulator.uninstall()
+
+    active = 2 * minutes * 60
+    assert sleeps and all(kind == "light" for kind, _ in sleeps)
+    # Asleep through the night between the windows...
+    night = 86400 - 90 * 60
+    assert night - 600 < sum(ms for _, ms in sleeps) // 1000 <= night, sleeps
+    # ...and lit again once awake.
+    assert strip.lit()
+    assert radio_on < active + 600, radio_on
+    # Polled only in the windows: at most every 30 s through them.
+    assert 0 < server.requests <= active // 30, server.requests
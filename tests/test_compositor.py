@@ -0,0 +1,51 @@
+import random
+
+from compositor import ADD, MAX, NORMAL, Compositor, Layer
+from framebuffer import FrameBuffer
+
+
+def layers(count, num_leds):
+    """A stack like the clock's: an ambient arc at the bottom, sparse on top."""
+
+    stack = []
+    for z in range(count):
+        layer = Layer(num_leds, z, opacity=255 - z * 20, blend=(NORMAL, ADD, MAX)[z % 3])
+        if z == 0:
+            for i in range(num_leds // 3, num_leds // 2):
+                layer.set_rgb(i, 40, 20, 0)
+        else:
+            for i in range(z, num_leds, num_leds // 4):
+                layer.set_rgb(i, 10 * z, 200, 255 - 30 * z)
+        stack.append(layer)
+    return stack
+
+
+def test_incremental_matches_full_composite(num_leds=96):
+    random.seed(2)
+    stack = layers(6, num_leds)
+    compositor = Compositor(num_leds)
+    for layer in stack:
+        compositor.add(layer)
+    framebuffer = FrameBuffer(num_leds)
+    for step in range(200):
+        layer = random.choice(stack)
+        change = random.randrange(4)
+        if change == 0:
+            layer.opacity = random.randrange(256)
+        elif change == 1:
+            layer.visible = not layer.visible
+        else:
+            layer.set_rgb(random.randrange(num_leds), random.randrange(256), 0, random.randrange(256))
+        if step % 50 == 49:
+            compositor.remove(layer)
+            compositor.add(layer)
+        compositor.compose(framebuffer)
+        fresh = Compositor(num_leds)
+        for layer in stack:
+            fresh.add(layer)
+            layer.mark(0, num_leds)
+        expected = FrameBuffer(num_leds)
+        fresh.compose(expected)
+        assert framebuffer.pixels == expected.pixels, step
+        for layer in stack:
+            layer.take_dirty()
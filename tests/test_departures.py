@@ -0,0 +1,16 @@
+import io
+import json
+
+from departures import iter_departures
+
+
+def test_stream_matches_json(times_body):
+    expected = [train["actualPredictedTime"] for train in json.loads(times_body)]
+    assert [train[2] for train in iter_departures(io.BytesIO(times_body))] == expected
+
+
+def test_stream_matches_json_many_records(times_body):
+    sample = json.loads(times_body)
+    body = json.dumps([sample[i % len(sample)] for i in range(200)]).encode()
+    expected = [train["actualPredictedTime"] for train in json.loads(body)]
+    assert [train[2] for train in iter_departures(io.BytesIO(body))] == expected
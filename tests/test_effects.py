@@ -0,0 +1,30 @@
+import random
+
+from effects import fade_to
+
+
+def move_to_target(current, target, up, down):
+    # examples/sparkles.py's loop, on its lists of [r, g, b] lists.
+    for i in range(len(current)):
+        for c in range(3):
+            if current[i][c] < target[i][c]:
+                current[i][c] = min(current[i][c] + up, target[i][c])
+            elif current[i][c] > target[i][c]:
+                current[i][c] = max(current[i][c] - down, target[i][c])
+
+
+def test_fade_to_steps_as_the_examples_do(num_leds=96):
+    random.seed(3)
+    current = [[random.randrange(256) for c in range(3)] for i in range(num_leds)]
+    target = [[random.randrange(256) for c in range(3)] for i in range(num_leds)]
+    flat = bytearray(sum(current, []))
+    flat_target = bytearray(sum(target, []))
+    for step in range(40):
+        move_to_target(current, target, 7, 3)
+        fade_to(flat, flat_target, 7, 3)
+        assert flat == bytearray(sum(current, [])), step
+
+
+def test_fade_to_reports_nothing_left_to_do():
+    target = bytearray(range(30))
+    assert fade_to(bytearray(target), target, 7, 3) == 0
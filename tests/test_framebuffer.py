@@ -0,0 +1,63 @@
+import random
+
+from colour import Colour
+from compositor import Compositor, Layer
+from framebuffer import MA_IDLE, MA_PER_CHANNEL, FrameBuffer
+
+
+class PixelStrip:
+    """Stands in for plasma.WS2812, keeping what it's sent."""
+
+    def __init__(self, num_leds):
+        self.pixels = bytearray(num_leds * 3)
+
+    def set_rgb(self, index, r, g, b):
+        self.pixels[index * 3] = r
+        self.pixels[index * 3 + 1] = g
+        self.pixels[index * 3 + 2] = b
+
+
+def current_ma(pixels):
+    """The current a frame draws, worked out from scratch."""
+
+    return len(pixels) // 3 * MA_IDLE + sum(pixels) * MA_PER_CHANNEL // 255
+
+
+def test_power_budget(num_leds=96, budget=400):
+    # The running estimate should always match adding up every pixel, and
+    # what reaches the strip should keep within budget, however it's drawn.
+    random.seed(4)
+    strip = PixelStrip(num_leds)
+    framebuffer = FrameBuffer(num_leds, budget)
+    colour = Colour(framebuffer)
+    layer = Layer(num_leds)
+    compositor = Compositor(num_leds)
+    compositor.add(layer)
+    limited = 0
+    for frame in range(500):
+        change = random.randrange(6)
+        if change == 0:
+            framebuffer.fill(random.randrange(256), random.randrange(256), random.randrange(256))
+        elif change == 1:
+            framebuffer.clear()
+        elif change == 2:
+            colour.fill_hsv(random.randrange(256), 255, random.randrange(256))
+            colour.next_frame()
+        elif change == 3:
+            for _ in range(random.randrange(10)):
+                framebuffer.set_rgb(random.randrange(num_leds), 255, 255, random.randrange(256))
+        elif change == 4:
+            layer.set_rgb(random.randrange(num_leds), random.randrange(256), 0, 0)
+            compositor.compose(framebuffer)
+        else:
+            framebuffer.budget_ma = random.choice((budget, budget // 2, None))
+        framebuffer.show(strip)
+        assert framebuffer.estimate_ma() == current_ma(framebuffer.pixels), frame
+        if framebuffer.budget_ma is not None:
+            # Rounding can put it a milliamp or two over.
+            assert current_ma(strip.pixels) <= framebuffer.budget_ma + 2, frame
+        if framebuffer.scale < 256:
+            limited += 1
+        else:
+            assert strip.pixels == framebuffer.pixels, frame
+    assert limited, "some frames should have needed dimming"
@@ -0,0 +1,34 @@
+import time
+
+try:
+    import uasyncio
+except ImportError:
+    import asyncio as uasyncio
+
+
+def run_frames(cost_us, seconds=10):
+    from frames import FrameScheduler
+
+    frames = FrameScheduler(60)
+
+    def render(deadline):
+        time.sleep_us(cost_us(frames.frames))
+
+    async def timed():
+        try:
+            await uasyncio.wait_for(frames.run(render), seconds)
+        except uasyncio.TimeoutError:
+            pass
+
+    uasyncio.run(timed())
+    return frames.stats()
+
+
+def test_cheap_frames_keep_the_rate(emulation):
+    assert run_frames(lambda frame: 1000)["rate"] == 60
+
+
+def test_rate_recovers_after_a_slow_patch(emulation):
+    stats = run_frames(lambda frame: 40000 if frame < 60 else 1000)
+    assert stats["rate"] == 60, stats
+    assert stats["skipped"], stats
@@ -0,0 +1,117 @@
+import time
+
+try:
+    import uasyncio
+except ImportError:
+    import asyncio as uasyncio
+
+import emulator
+from emulator.server import StandInServer
+from governor import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, TokenBucket
+
+
+def test_bucket_allows_a_burst_then_one_a_refill():
+    bucket = TokenBucket(3, 1000)
+    assert [bucket.take(0) for _ in range(4)] == [True, True, True, False]
+    assert not bucket.take(999) and bucket.take(1000) and not bucket.take(1500)
+
+
+def test_breaker_opens_half_opens_and_closes():
+    # Three failures open a breaker; the trial after it has been open a
+    # while reopens it for twice as long if it fails, and closes it if not.
+    breaker = CircuitBreaker(3, 1000, 3000)
+    for ticks in (0, 10, 20):
+        assert breaker.allow(ticks)
+        breaker.failure(ticks)
+    assert breaker.state == OPEN and not breaker.allow(1019)
+    assert breaker.allow(1020) and breaker.state == HALF_OPEN and not breaker.allow(1021)
+    breaker.failure(1100)
+    assert breaker.state == OPEN and not breaker.allow(3099) and breaker.allow(3100)
+    breaker.success()
+    assert breaker.state == CLOSED and breaker.allow(3101)
+
+
+def test_failing_endpoint_is_held_off_and_found_again(emulation, minutes=60, outage=(5, 35)):
+    # One platform of two failing for 30 minutes, polled every 30 s.
+    import metro_api
+    from governor import Refused
+
+    clock = emulation.clock
+    start = clock.wall()
+    failing = "/api/times/WTL/2"
+    kinds = (503, "timeout", "reset")
+    down = [False]
+    faults = []
+    stats = {"refused": 0, "refused ms": 0, "recovered": None}
+
+    def fault(path):
+        if down[0] and path.startswith(failing):
+            faults.append(kinds[len(faults) % len(kinds)])
+            return faults[-1]
+        return None
+
+    async def poll(server):
+        metro_api.async_clients = [server.async_client() for _ in range(2)]
+        while clock.wall() < start + minutes * 60:
+            minute = (clock.wall() - start) / 60
+            down[0] = outage[0] <= minute < outage[1]
+            began = time.ticks_ms()
+            departures, errors = await metro_api.fetch_subscriptions([("WTL", 1), ("WTL", 2)], timeout=0.5)
+            took = time.ticks_diff(time.ticks_ms(), began)
+            assert ("WTL", 1) not in errors, errors
+            error = errors.get(("WTL", 2))
+            if isinstance(error, Refused):
+                stats["refused"] += 1
+                stats["refused ms"] += took
+            elif error is None and minute > outage[1] and stats["recovered"] is None:
+                stats["recovered"] = minute - outage[1]
+            await uasyncio.sleep(30)
+        for client in metro_api.async_clients:
+            await client.close()
+
+    with StandInServer(times=emulator.live_times(clock), clock=clock, fault=fault, stall=1.0) as server:
+        uasyncio.run(poll(server))
+
+    # Polled 60 times through the outage, without a governor every poll
+    # would fail; the breaker holds most of them back.
+    assert 0 < len(faults) <= 12, faults
+    # Refused without a connect attempt, so without waiting on the network.
+    assert stats["refused"] and stats["refused ms"] < stats["refused"] * 10, stats
+    # The half-open trial finds it back within the longest a breaker stays open.
+    assert stats["recovered"] is not None and stats["recovered"] <= 15.5, stats
+
+
+def test_budget_sized_for_every_platform(emulation, stand_in, count=4, minutes=10):
+    import main
+    import metro_api
+    from governor import BURST, REFILL_MS, Refused, RequestGovernor
+
+    clock = emulation.clock
+    subscriptions = [("WTL", platform) for platform in range(1, count + 1)]
+
+    def poll(governor):
+        # Every platform, at the fastest poll rate, for a few minutes.
+        metro_api.governor = governor
+        refused = [0]
+
+        async def run():
+            end = clock.wall() + minutes * 60
+            while clock.wall() < end:
+                departures, errors = await metro_api.fetch_subscriptions(subscriptions)
+                refused[0] += sum(1 for e in errors.values() if isinstance(e, Refused))
+                await uasyncio.sleep(main.POLL_MIN)
+            await metro_api.close_clients()
+
+        uasyncio.run(run())
+        return refused[0]
+
+    # The default budget alone can't keep up with four platforms...
+    assert poll(RequestGovernor())
+    # ...but sized for them, as main.py does, none are refused.
+    governor = RequestGovernor()
+    governor.size(count, main.POLL_MIN)
+    assert poll(governor) == 0
+    # One platform needs no more than the default.
+    governor = RequestGovernor()
+    governor.size(1, main.POLL_MIN)
+    assert (governor.budget.burst, governor.budget.refill_ms) == (BURST, REFILL_MS)
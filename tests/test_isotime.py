@@ -0,0 +1,63 @@
+import calendar
+import time
+
+import pytest
+
+from isotime import http_date_to_epoch, iso_to_epoch
+
+
+def utc(*fields):
+    return calendar.timegm(fields + (0, 0, 0))
+
+
+def local(seconds):
+    """UK local time at a UTC instant, as (hour, minute, second)."""
+
+    from timebase import uk_offset
+
+    return time.gmtime(seconds + uk_offset(seconds))[3:6]
+
+
+# The API's timestamps are in UK local time, with its offset from UTC:
+# (timestamp, the UTC instant, UK local time then).
+CASES = [
+    # Spring forward, 2025-03-30: 00:59:59 GMT is followed by 02:00:00 BST.
+    ("2025-03-30T00:59:59.0000000+00:00", utc(2025, 3, 30, 0, 59, 59), (0, 59, 59)),
+    ("2025-03-30T02:00:00.0000000+01:00", utc(2025, 3, 30, 1, 0, 0), (2, 0, 0)),
+    ("2025-03-30T02:30:00.0000000+01:00", utc(2025, 3, 30, 1, 30, 0), (2, 30, 0)),
+    # Fall back, 2025-10-26: 01:00-02:00 comes round twice, BST then GMT.
+    ("2025-10-26T00:59:59.0000000+01:00", utc(2025, 10, 25, 23, 59, 59), (0, 59, 59)),
+    ("2025-10-26T01:30:00.0000000+01:00", utc(2025, 10, 26, 0, 30, 0), (1, 30, 0)),
+    ("2025-10-26T01:59:59.0000000+01:00", utc(2025, 10, 26, 0, 59, 59), (1, 59, 59)),
+    ("2025-10-26T01:00:00.0000000+00:00", utc(2025, 10, 26, 1, 0, 0), (1, 0, 0)),
+    ("2025-10-26T01:30:00.0000000+00:00", utc(2025, 10, 26, 1, 30, 0), (1, 30, 0)),
+    ("2025-10-26T02:00:00.0000000+00:00", utc(2025, 10, 26, 2, 0, 0), (2, 0, 0)),
+]
+
+
+@pytest.mark.parametrize("timestamp, expected, expected_local", CASES, ids=[case[0][:19] for case in CASES])
+def test_across_the_clock_changes(timestamp, expected, expected_local):
+    assert iso_to_epoch(timestamp) == expected
+    assert local(expected) == expected_local
+
+
+def test_repeated_hour_is_an_hour_apart():
+    first = iso_to_epoch("2025-10-26T01:30:00.0000000+01:00")
+    second = iso_to_epoch("2025-10-26T01:30:00.0000000+00:00")
+    assert second - first == 3600
+    assert local(first) == local(second)
+
+
+@pytest.mark.parametrize("offset, z", [
+    ("2025-10-26T01:30:00.0000000+01:00", "2025-10-26T00:30:00.0000000Z"),
+    ("2025-03-30T02:00:00+01:00", "2025-03-30T01:00:00Z"),
+    ("2025-01-04T08:50:28.0000000+00:00", "2025-01-04T08:50:28.0000000Z"),
+    ("2025-01-04T03:50:28.0000000-05:00", "2025-01-04T08:50:28Z"),
+])
+def test_z_matches_the_offset_form(offset, z):
+    assert iso_to_epoch(offset) == iso_to_epoch(z)
+
+
+def test_http_date():
+    assert http_date_to_epoch("Sun, 26 Oct 2025 01:30:00 GMT") == utc(2025, 10, 26, 1, 30, 0)
+    assert http_date_to_epoch("Sun, 26 Oct 2025 01:30:00 BST") is None
@@ -0,0 +1,92 @@
+import io
+
+from departures import DepartureTable, iter_departures
+
+
+class CountingStrip:
+    """Stands in for plasma.WS2812, counting the calls made to it. It has no
+    get(), so nothing can read pixels back from the strip."""
+
+    def __init__(self, num_leds):
+        self.num_leds = num_leds
+        self.calls = 0
+
+    def set_rgb(self, index, r, g, b):
+        self.calls += 1
+
+
+def test_failed_fetches_redraw_last_good_departures(emulation, times_body, failures=6, interval=120):
+    import main
+    from framebuffer import FrameBuffer
+
+    table = DepartureTable()
+    for train in iter_departures(io.BytesIO(times_body)):
+        table.add(train)
+    table.sort()
+    start = table.times[0] - 60
+    strip = CountingStrip(main.NUM_LEDS)
+    framebuffer = FrameBuffer(main.NUM_LEDS)
+    last_good = main.LastGoodDepartures()
+
+    def draw(now, status):
+        main.update_display(now, now // 60 % 60, table.times if status else (), status, strip, framebuffer, last_good)
+        return [i for i in range(main.NUM_LEDS) if any(framebuffer.get(i))]
+
+    assert draw(start, False) == [], "nothing to show before the first good fetch"
+    lit = draw(start, True)
+    assert lit and all(r and not b for r, g, b in (framebuffer.get(i) for i in lit))
+
+    brightness = None
+    for failure in range(1, failures + 1):
+        stale = draw(start + failure * interval, False)
+        # Still showing the trains yet to leave, in blue, dimmer each time...
+        assert set(stale) <= set(lit) | {(i + 1) % main.NUM_LEDS for i in lit}, stale
+        pixels = [framebuffer.get(i) for i in stale]
+        assert all(b and not r for r, g, b in pixels), pixels
+        level = max(b for r, g, b in pixels) if pixels else 0
+        assert brightness is None or level <= brightness
+        brightness = level
+
+    # ...and back to red once a fetch works again.
+    assert draw(start + (failures + 1) * interval, True)
+    assert all(framebuffer.get(i)[0] for i in range(main.NUM_LEDS) if any(framebuffer.get(i)))
+
+
+def test_failed_platform_keeps_its_last_trains(emulation, stand_in):
+    import emulator
+    import main
+    from framebuffer import FrameBuffer
+
+    try:
+        import uasyncio
+    except ImportError:
+        import asyncio as uasyncio
+
+    # Trains from each platform every 12 minutes, six minutes apart.
+    platforms = {1: emulator.live_times(emulation.clock), 2: emulator.live_times(emulation.clock, phase=360)}
+    stand_in.times = lambda station_code, platform: platforms[platform](station_code, platform)
+    subscriptions = [("WTL", 1), ("WTL", 2)]
+
+    async def scenario():
+        fresh = await main.get_departures(subscriptions)
+        stand_in.fault = lambda path: 503 if path.startswith("/api/times/WTL/2") else None
+        await uasyncio.sleep(60)
+        return fresh, await main.get_departures(subscriptions, fresh[0])
+
+    (table, status, failed), (merged, partial, stale) = uasyncio.run(scenario())
+    assert status and not failed
+    assert stand_in.faults == 1
+    # The platform that failed keeps the trains it had, marked stale...
+    assert partial and stale == {1}
+    assert [d.time for d in merged if d.subscription == 1] == [d.time for d in table if d.subscription == 1]
+    assert len(merged) == len(table) and list(merged.times) == sorted(merged.times)
+
+    # ...which are drawn in blue, and the other platform's in red.
+    strip = CountingStrip(main.NUM_LEDS)
+    framebuffer = FrameBuffer(main.NUM_LEDS)
+    now = int(emulation.clock.wall())
+    flags = [i in stale for i in merged.subscription]
+    main.update_display(now, now // 60 % 60, merged.times, partial, strip, framebuffer, main.LastGoodDepartures(), stale=flags)
+    pixels = [framebuffer.get(i) for i in range(main.NUM_LEDS) if any(framebuffer.get(i))]
+    assert any(r and not b for r, g, b in pixels), pixels
+    assert any(b and not r for r, g, b in pixels), pixels
@@ -0,0 +1,41 @@
+try:
+    import uasyncio
+except ImportError:
+    import asyncio as uasyncio
+
+import pytest
+
+from conftest import forget_clock_modules
+from emulator.server import StandInServer
+
+
+@pytest.mark.parametrize("count", [1, 2, 8])
+def test_fetch_subscriptions_gets_every_platform(count):
+    forget_clock_modules()
+    import metro_api
+    from governor import RequestGovernor
+    from timesource import ServerClock
+
+    def latency(path):
+        # 100 ms plus 25 ms per platform number, so endpoints differ.
+        return 0.1 + 0.025 * int(path.rsplit("/", 1)[1])
+
+    subscriptions = [("WTL", platform) for platform in range(1, count + 1)]
+
+    async def run_all(server):
+        metro_api.async_clients = [server.async_client() for _ in range(count)]
+        results = []
+        for concurrency in (1, count):
+            results.append(await metro_api.fetch_subscriptions(subscriptions, concurrency))
+        for client in metro_api.async_clients:
+            await client.close()
+        return results
+
+    with StandInServer(delay=latency) as server:
+        metro_api.server_clock = ServerClock()
+        # Budgeted for polling `count` platforms every 30 s, as main.py does.
+        metro_api.governor = RequestGovernor()
+        metro_api.governor.size(count, 30)
+        for departures, errors in uasyncio.run(run_all(server)):
+            assert not errors and len(departures) == 4 * count, errors
+    forget_clock_modules()
@@ -0,0 +1,296 @@
+import pytest
+
+try:
+    import uasyncio
+except ImportError:
+    import asyncio as uasyncio
+
+from scheduler import PollScheduler
+
+
+def test_supervisor_rides_out_outages(emulation, minutes=60):
+    from network_manager import NetworkManager
+
+    clock = emulation.clock
+    wlan = emulation.network.WLAN(emulation.network.STA_IF)
+    start = clock.monotonic()
+    # A blip, ten minutes of the router rebooting, and another blip.
+    outages = [(start + 300, start + 310), (start + 900, start + 1500), (start + 2000, start + 2005)]
+    wlan.outages = list(outages)
+    # Made in the loop it runs in, as its Event needs on CPython 3.9.
+    nm = None
+    back = []
+    wakes = [0]
+
+    async def pipeline():
+        while clock.monotonic() < start + minutes * 60:
+            if not nm.link.is_set():
+                wakes[0] += 1
+                await nm.link_up()
+            await uasyncio.sleep(30)
+
+    async def watch():
+        for _, end in outages:
+            while clock.monotonic() < end or not wlan.isconnected():
+                await uasyncio.sleep(0.5)
+            back.append(clock.monotonic() - end)
+
+    async def scenario():
+        nonlocal nm
+        nm = NetworkManager("GB")
+        await nm.client("emulator", "emulator")
+        cold = clock.monotonic() - start
+        supervisor = uasyncio.create_task(nm.supervise("emulator", "emulator"))
+        watcher = uasyncio.create_task(watch())
+        await pipeline()
+        supervisor.cancel()
+        watcher.cancel()
+        await uasyncio.sleep(0)
+        return cold
+
+    cold = uasyncio.run(scenario())
+
+    # Each outage noticed, and the link back within the longest backoff.
+    assert nm.drops == len(outages), nm.report()
+    assert len(back) == len(outages) and all(delay < 125 for delay in back), back
+    # The pipeline saw the longer outages, and slept through each.
+    assert 0 < wakes[0] <= len(outages), wakes
+    # Reconnects are quicker than the first connect.
+    assert max(nm.connect_ms) < cold * 1000, (nm.connect_ms, cold)
+    # Backing off through the long outage, rather than trying all the time.
+    assert nm.attempts < 20, nm.report()
+    # The scan, which blocks, was done once at setup and never again.
+    assert wlan.scans == 1, wlan.scans
+
+
+def test_lease_reused_only_while_surely_ours(emulation):
+    from network_manager import NetworkManager
+
+    wlan = emulation.network.WLAN(emulation.network.STA_IF)
+
+    async def scenario():
+        # Made in the loop it runs in, as its Event needs on CPython 3.9.
+        nm = NetworkManager("GB", lease_s=600)
+        await nm.client("emulator", "emulator")
+        used = []
+
+        async def reconnect():
+            wlan.disconnect()
+            ok = await nm.reconnect("emulator", "emulator", timeout=5)
+            used.append(wlan._static)
+            return ok
+
+        # Straight away, the address is reused...
+        assert await reconnect()
+        # ...but not once half the lease has gone; DHCP gives a new one...
+        await uasyncio.sleep(301)
+        assert await reconnect()
+        # ...which a try soon after uses, and after it fails, doesn't; nor
+        # the access point, with it in sight.
+        wlan.connect_delay = 100
+        assert not await reconnect()
+        wlan.connect_delay = 2.0
+        assert await reconnect()
+        assert nm._ap is None
+        return used
+
+    assert uasyncio.run(scenario()) == [True, False, True, False]
+    assert wlan.scans == 1
+
+
+def test_back_to_dhcp_without_blocking(emulation):
+    from network_manager import NetworkManager
+
+    clock = emulation.clock
+    wlan = emulation.network.WLAN(emulation.network.STA_IF)
+    gaps = []
+
+    async def ticker():
+        last = clock.monotonic()
+        while True:
+            await uasyncio.sleep(0.5)
+            gaps.append(clock.monotonic() - last)
+            last = clock.monotonic()
+
+    async def scenario():
+        nm = NetworkManager("GB", lease_s=600)
+        await nm.client("emulator", "emulator")
+        wlan.disconnect()
+        assert await nm.reconnect("emulator", "emulator", timeout=5)
+        assert wlan._static
+        # Half the lease gone: the fixed address is undone, not waited on.
+        await uasyncio.sleep(301)
+        wlan.disconnect()
+        ticks = uasyncio.create_task(ticker())
+        await uasyncio.sleep(0)
+        ok = await nm.reconnect("emulator", "emulator", timeout=5)
+        ticks.cancel()
+        dhcp = not wlan._static
+        # And an interface that raises is a failed try, not the end.
+        def refuse(*args, **kwargs):
+            raise OSError("Wifi Internal Error")
+        wlan.connect = refuse
+        wlan.disconnect()
+        return ok and dhcp, await nm.reconnect("emulator", "emulator", timeout=5), nm
+
+    ok, refused, nm = uasyncio.run(scenario())
+    assert ok
+    assert max(gaps) < 1, gaps
+    assert not refused and nm.failures == 1, nm.report()
+
+
+def test_lease_not_reused_without_its_length(emulation):
+    from network_manager import NetworkManager
+
+    wlan = emulation.network.WLAN(emulation.network.STA_IF)
+
+    async def scenario():
+        nm = NetworkManager("GB")
+        await nm.client("emulator", "emulator")
+        wlan.disconnect()
+        return await nm.reconnect("emulator", "emulator")
+
+    assert uasyncio.run(scenario()) and not wlan._static
+
+
+def duty(emulation, keep_s, delays, minutes=60, headway=12 * 60):
+    """Fetch on the poll schedule for trains every headway seconds, with the
+    radio managed by keep_s: None for always on, or "auto"."""
+
+    import network_manager
+    from network_manager import NetworkManager
+
+    clock = emulation.clock
+    wlan = emulation.network.WLAN(emulation.network.STA_IF)
+    wlan.connect_delay, wlan.scan_delay, wlan.dhcp_delay, wlan.jitter = delays
+    start = clock.monotonic()
+    # Unjittered, so every mode polls at the same times.
+    scheduler = PollScheduler(30, 600, jitter=0)
+    late = []
+    nm = None
+
+    async def fetches():
+        planned = clock.monotonic()
+        while planned < start + minutes * 60:
+            try:
+                await uasyncio.wait_for(nm.acquire(), 20)
+            except uasyncio.TimeoutError:
+                pass
+            late.append(max(0, clock.monotonic() - planned))
+            await uasyncio.sleep(0.4)
+            now = planned - start
+            delay = scheduler.success([headway - now % headway, 2 * headway - now % headway])
+            nm.release(delay)
+            planned += delay
+            await uasyncio.sleep(max(0, planned - clock.monotonic() - nm.lead_s()))
+
+    async def scenario():
+        nonlocal nm
+        # With the router's day-long DHCP leases given, for reconnects that
+        # skip DHCP too.
+        nm = NetworkManager("GB", lease_s=86400, duty_cycle=keep_s is not None, keep_s=None if keep_s == "auto" else keep_s)
+        await nm.client("emulator", "emulator")
+        supervisor = uasyncio.create_task(nm.supervise("emulator", "emulator"))
+        await fetches()
+        supervisor.cancel()
+        await uasyncio.sleep(0)
+
+    uasyncio.run(scenario())
+    on = wlan.radio_on(network_manager.PM_NONE)
+    powersave = wlan.radio_on(network_manager.PM_POWERSAVE)
+    connecting = sum(nm.connect_ms) / 1000
+    on_ma, powersave_ma, connect_ma = nm.radio_ma
+    charge = on * on_ma + powersave * powersave_ma + connecting * (connect_ma - on_ma)
+    return {"mah": charge / 3600, "reconnects": nm.attempts, "fetches": len(late),
+            "late": sum(late) / len(late), "worst": max(late)}
+
+
+def test_parking_closes_connections_first(emulation, stand_in):
+    import metro_api
+    from network_manager import NetworkManager
+
+    wlan = emulation.network.WLAN(emulation.network.STA_IF)
+
+    async def scenario():
+        nm = NetworkManager("GB", duty_cycle=True, keep_s=0, before_off=metro_api.close_clients)
+        await nm.client("emulator", "emulator")
+        await nm.acquire()
+        await metro_api.fetch_departures("WTL", 1)
+        # Kept alive for the next fetch...
+        assert metro_api.async_clients[0]._writer is not None
+        nm.release(600)
+        await uasyncio.sleep(1)
+        return nm
+
+    nm = uasyncio.run(scenario())
+    # ...until the radio went off, and closed first.
+    assert metro_api.async_clients[0]._writer is None
+    assert nm._parked and not wlan.active()
+
+
+def test_power_save_keeps_connections(emulation, stand_in):
+    import metro_api
+    import network_manager
+    from network_manager import NetworkManager
+
+    wlan = emulation.network.WLAN(emulation.network.STA_IF)
+    # Opening a connection takes as long as a TLS handshake on the board.
+    stand_in.handshake = 2
+
+    async def scenario():
+        nm = NetworkManager("GB", lease_s=86400, duty_cycle=True, before_off=metro_api.close_clients, reopen_ms=metro_api.reopen_ms)
+        await nm.client("emulator", "emulator")
+        # A reconnect timed, as one is before the first poll gap.
+        wlan.disconnect()
+        await nm.reconnect("emulator", "emulator")
+        await nm.acquire()
+        await metro_api.fetch_departures("WTL", 1)
+        # A gap that reconnecting alone would be worth parking for, but
+        # not with the handshake to do again after.
+        gap = nm.reconnect_ms() * nm.radio_ma[2] // (nm.radio_ma[1] * 1000) + 10
+        nm.release(gap)
+        await uasyncio.sleep(gap)
+        # Straight back, with no supervisor to bring it back from off.
+        await uasyncio.wait_for(nm.acquire(), 1)
+        await metro_api.fetch_departures("WTL", 1)
+        nm.release()
+        return nm, gap
+
+    nm, gap = uasyncio.run(scenario())
+    assert not nm._parked and wlan.radio_on(network_manager.PM_POWERSAVE) > gap - 1
+    # The connection kept alive through the gap was used again after it.
+    assert metro_api.async_clients[0].connects == 1
+    assert stand_in.requests == 2
+
+
+# Seconds to connect from scratch, saved by a known BSSID, saved by a known
+# address, and at random on top: a good access point and a slow one.
+RADIOS = [(3.0, 1.2, 1.0, 1.0), (12.0, 3.0, 4.0, 4.0)]
+
+
+@pytest.mark.parametrize("delays", RADIOS, ids=["quick AP", "slow AP"])
+def test_duty_cycle(delays):
+    import emulator
+    from conftest import forget_clock_modules
+
+    results = {}
+    for name, keep_s in (("always on", None), ("power save", 10 ** 6), ("off", 0), ("auto", "auto")):
+        forget_clock_modules()
+        emulation = emulator.install()
+        try:
+            results[name] = duty(emulation, keep_s, delays)
+        finally:
+            emulator.uninstall()
+
+    always = results["always on"]
+    for name, result in results.items():
+        # The same fetches, with the link on time give or take the jitter;
+        # only the first reconnect, with none yet to go by, can be later.
+        assert result["fetches"] == always["fetches"], (name, result, always)
+        assert result["late"] < delays[3] / 4 and result["worst"] < delays[0] / 2, (name, result)
+    # Turning the radio down between fetches saves most of its charge, and
+    # weighing up each gap saves at least as much as either way alone.
+    assert results["auto"]["mah"] < always["mah"] / 3, results
+    assert results["auto"]["mah"] <= min(results["power save"]["mah"], results["off"]["mah"]) * 1.05, results
+    assert results["power save"]["reconnects"] == 0, results["power save"]
+    assert results["off"]["reconnects"] >= results["off"]["fetches"] - 1, results["off"]
@@ -0,0 +1,107 @@
+import socket
+import struct
+import sys
+import threading
+import time
+import types
+
+try:
+    import uasyncio
+except ImportError:
+    import asyncio as uasyncio
+
+import pytest
+
+from conftest import forget_clock_modules
+
+
+class SNTPServer:
+    """Answers SNTP queries on localhost with `now`, after `delay` seconds,
+    or not at all if `answer` is False."""
+
+    def __init__(self, now, delay=0.0, answer=True):
+        self.now = now
+        self.delay = delay
+        self.answer = answer
+        self.queries = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.1)
+        self.port = self.sock.getsockname()[1]
+        self._stop = False
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop = True
+        self._thread.join()
+        self.sock.close()
+
+    def _serve(self):
+        while not self._stop:
+            try:
+                query, addr = self.sock.recvfrom(48)
+            except socket.timeout:
+                continue
+            self.queries += 1
+            if not self.answer or query[0] & 7 != 3:
+                continue
+            time.sleep(self.delay)
+            reply = bytearray(48)
+            reply[0] = 0x1C
+            reply[40:44] = struct.pack("!I", self.now + 2208988800)
+            self.sock.sendto(reply, addr)
+
+
+@pytest.fixture
+def timebase(monkeypatch):
+    forget_clock_modules()
+    ntptime = types.ModuleType("ntptime")
+    ntptime.host = "127.0.0.1"
+    monkeypatch.setitem(sys.modules, "ntptime", ntptime)
+    import timebase
+
+    yield timebase
+    forget_clock_modules()
+
+
+async def ticking(coro):
+    """Run coro, counting how often a 10 ms ticker got to run meanwhile."""
+
+    ticks = [0]
+
+    async def ticker():
+        while True:
+            ticks[0] += 1
+            await uasyncio.sleep(0.01)
+
+    task = uasyncio.create_task(ticker())
+    try:
+        return await coro, ticks[0]
+    finally:
+        task.cancel()
+
+
+def test_ntp_time_awaits_the_reply(timebase, monkeypatch):
+    with SNTPServer(1767225600, delay=0.3) as server:
+        monkeypatch.setattr(timebase, "NTP_PORT", server.port)
+        now, ticks = uasyncio.run(ticking(timebase.ntp_time()))
+    assert now == 1767225600
+    # Other tasks ran while the reply was on its way.
+    assert ticks >= 10, ticks
+    assert timebase._ntp_addr == ("127.0.0.1", server.port)
+
+
+def test_sync_gives_up_on_a_silent_server(timebase, monkeypatch):
+    with SNTPServer(1767225600, answer=False) as server:
+        monkeypatch.setattr(timebase, "NTP_PORT", server.port)
+        clock = timebase.Timebase(timeout=0.5, set_rtc=None)
+        synced, ticks = uasyncio.run(ticking(clock.sync()))
+    assert not synced and clock.failures == 1 and server.queries == 1
+    assert ticks >= 20, ticks
+    # Looked up again next time, in case the server's gone for good.
+    assert timebase._ntp_addr is None
+
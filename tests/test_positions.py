@@ -0,0 +1,20 @@
+from positions import PositionTable
+
+
+def ring_error(position, exact, num_leds):
+    """Distance around the ring between two positions, in LEDs."""
+
+    error = abs(position - exact) % num_leds
+    return min(error, num_leds - error)
+
+
+def test_lookup_within_a_step_through_rebuilds():
+    table = PositionTable(96, 1)
+    for num_leds, offset in ((96, 1), (144, 1), (300, 5), (96, 0)):
+        table.num_leds = num_leds
+        table.offset = offset
+        tolerance = table.step * num_leds / 3600 + 1 / 256
+        for seconds in range(0, 7200, 7):
+            led, weight = table.lookup(seconds)
+            exact = (seconds % 3600 * num_leds / 3600 + offset) % num_leds
+            assert ring_error(led + weight / 256, exact, num_leds) <= tolerance, (num_leds, offset, seconds)
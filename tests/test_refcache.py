@@ -0,0 +1,79 @@
+import json
+import os
+
+import pytest
+
+from emulator.server import REF_MODIFIED
+
+# (getter, argument, cache, file, endpoint, a value it should give)
+CACHES = [
+    ("get_station_mapping", (), "stations_cache", "ref_stations.json", "/api/stations", ("Airport", "APT")),
+    ("get_platform_info", ("APT",), "platforms_cache", "ref_platforms.json", "/api/stations/platforms",
+     (0, "Towards South Hylton")),
+]
+
+
+@pytest.fixture
+def metro_api(stand_in, tmp_path, monkeypatch):
+    # The caches' files are relative to where the clock runs from.
+    monkeypatch.chdir(tmp_path)
+    import metro_api
+
+    return metro_api
+
+
+def lookup(metro_api, getter, args):
+    return getattr(metro_api, getter)(*args)
+
+
+@pytest.mark.parametrize("getter, args, cache, filename, endpoint, expected", CACHES, ids=["stations", "platforms"])
+def test_cold_then_warm_boot(metro_api, stand_in, getter, args, cache, filename, endpoint, expected):
+    # Nothing on flash: fetched, and written there compacted.
+    data = lookup(metro_api, getter, args)
+    assert data[expected[0]] == expected[1]
+    assert stand_in.paths == [endpoint]
+    with open(filename) as f:
+        entry = json.load(f)
+    assert entry["etag"] and entry["last_modified"] == REF_MODIFIED
+
+    # After a reboot, memory's gone but the file isn't: no request.
+    getattr(metro_api, cache)._entry = None
+    assert lookup(metro_api, getter, args) == data
+    assert stand_in.requests == 1
+
+
+@pytest.mark.parametrize("validator", ["etag", "last_modified"])
+def test_expired_copy_revalidated(metro_api, stand_in, emulation, validator):
+    stations = metro_api.get_station_mapping()
+    cache = metro_api.stations_cache
+    # Keep just the one validator, to see each one's sent and honoured.
+    cache._entry["etag" if validator == "last_modified" else "last_modified"] = None
+    fetched = cache._entry["fetched"]
+
+    emulation.clock.advance(metro_api.REF_TTL + 1)
+    assert cache.expired()
+    assert metro_api.get_station_mapping() == stations
+    assert stand_in.requests == 2 and stand_in.not_modified == 1
+    # Good for another TTL, on flash too.
+    assert not cache.expired()
+    with open("ref_stations.json") as f:
+        assert json.load(f)["fetched"] > fetched
+    metro_api.get_station_mapping()
+    assert stand_in.requests == 2
+
+
+def test_failed_refresh_serves_stale_copy(metro_api, stand_in, emulation):
+    stations = metro_api.get_station_mapping()
+    emulation.clock.advance(metro_api.REF_TTL + 1)
+    stand_in.fault = lambda path: 503
+
+    assert metro_api.get_station_mapping() == stations
+    assert stand_in.faults == 1
+    # Still stale, so tried again next time.
+    assert metro_api.stations_cache.expired()
+
+
+def test_nothing_cached_and_no_api(metro_api, stand_in):
+    stand_in.fault = lambda path: 503
+    assert metro_api.get_station_mapping() == {}
+    assert not os.path.exists("ref_stations.json")
@@ -0,0 +1,93 @@
+try:
+    import uasyncio
+except ImportError:
+    import asyncio as uasyncio
+
+import emulator
+
+
+def test_bst_changes_at_one_utc_on_the_last_sundays():
+    from timebase import DST_CHANGES, uk_offset
+
+    spring = 1743296400  # 2025-03-30 01:00 UTC
+    autumn = 1761440400  # 2025-10-26 01:00 UTC
+    assert spring in DST_CHANGES and autumn in DST_CHANGES
+    assert (uk_offset(spring - 1), uk_offset(spring), uk_offset(autumn - 1), uk_offset(autumn)) == (0, 3600, 3600, 0)
+
+
+def test_keeps_time_through_drift_and_an_outage(emulation, days=3, drift=150e-6):
+    # A crystal 150 ppm fast, and NTP out for 12 hours on the second day.
+    from timebase import Timebase
+
+    clock = emulation.clock
+    ntptime = emulation.modules["ntptime"]
+    clock.ticks_drift = drift
+    clock.rtc_drift = drift
+    timebase = Timebase()
+    errors = []
+    outage = (86400, 86400 + 12 * 3600)
+
+    async def watch():
+        while clock.wall() < emulator.DEFAULT_START + days * 86400:
+            await uasyncio.sleep(600)
+            elapsed = clock.wall() - emulator.DEFAULT_START
+            ntptime.fail = outage[0] <= elapsed < outage[1]
+            calls = ntptime.calls
+            for _ in range(100):
+                timebase.now()
+            # Reading the time never goes to NTP.
+            assert ntptime.calls == calls
+            errors.append((elapsed, abs(timebase.now_ms() / 1000 - clock.wall())))
+
+    async def main():
+        task = uasyncio.create_task(timebase.run())
+        await watch()
+        task.cancel()
+
+    uasyncio.run(main())
+
+    settled = [error for elapsed, error in errors if elapsed > 12 * 3600]
+    assert abs(timebase.drift_ppm - drift * 1e6) < 50, timebase.drift_ppm
+    assert max(settled) < 2, max(settled)
+
+
+def test_boot_sync_isnt_repeated_at_once(emulation):
+    from timebase import Timebase
+
+    ntptime = emulation.modules["ntptime"]
+    timebase = Timebase(resync=600)
+
+    async def main():
+        assert await timebase.sync()
+        task = uasyncio.create_task(timebase.run())
+        await uasyncio.sleep(599)
+        calls = ntptime.calls
+        await uasyncio.sleep(2)
+        task.cancel()
+        return calls
+
+    assert uasyncio.run(main()) == 1
+    assert ntptime.calls == 2
+
+
+def test_sync_waits_without_blocking(emulation):
+    # NTP never answers; frames go on being drawn meanwhile.
+    from timebase import Timebase
+
+    emulation.modules["ntptime"].fail = True
+    timebase = Timebase(timeout=2)
+    frames = [0]
+
+    async def render():
+        while True:
+            frames[0] += 1
+            await uasyncio.sleep(1 / 60)
+
+    async def main():
+        task = uasyncio.create_task(render())
+        synced = await timebase.sync()
+        task.cancel()
+        return synced
+
+    assert not uasyncio.run(main())
+    assert timebase.failures == 1 and frames[0] >= 100, frames
@@ -0,0 +1,80 @@
+import pytest
+
+try:
+    import uasyncio
+except ImportError:
+    import asyncio as uasyncio
+
+import emulator
+from emulator.server import StandInServer
+from timesource import ServerClock
+
+
+def test_reading_is_the_middle_of_the_round_trip():
+    server_clock = ServerClock()
+    for i in range(5):
+        assert server_clock.add(1000 + i, 1000 * i, 1000 * i + 400)
+    assert not server_clock.add(2000, 5000, 5000 + 6000), "too slow a round trip to be useful"
+    # The median shrugs off an odd one.
+    server_clock.add(99999, 4500, 4500)
+    assert server_clock.now_ms(4200) == 1004 * 1000 + 500
+    server_clock.add_event(1010, 4200)
+    assert server_clock.now_ms(4200) == 1010 * 1000, "lastEventTime is a lower bound"
+
+
+@pytest.mark.parametrize("rtc, ntp_fails, ntp_delay, ntp_skew, server_skew", [
+    pytest.param(0, False, 0, 0, 0, id="NTP fine"),
+    pytest.param(-3 * 3600, True, 0, 0, 0, id="RTC 3 h out, NTP down"),
+    pytest.param(-3 * 3600, False, 5, 0, 0, id="RTC 3 h out, NTP slow"),
+    pytest.param(0, False, 0, 3600, 0, id="NTP 1 h out"),
+    pytest.param(0, False, 0, 0, 20, id="server 20 s out"),
+])
+def test_time_right_by_the_first_fetch(emulation, rtc, ntp_fails, ntp_delay, ntp_skew, server_skew, minutes=15):
+    import metro_api
+    from timebase import DISAGREE_SAMPLES, Timebase
+
+    clock = emulation.clock
+    clock.rtc_offset = rtc
+    ntptime = emulation.modules["ntptime"]
+    ntptime.fail = ntp_fails
+    ntptime.delay = ntp_delay
+    ntptime.skew = ntp_skew
+    timebase = Timebase(resync=120, server=metro_api.server_clock)
+    start = clock.wall()
+    first = [None]
+    fetched = [None]
+    errors = []
+
+    async def scenario(server):
+        client = server.async_client()
+        task = uasyncio.create_task(timebase.run())
+        while clock.wall() < start + minutes * 60:
+            try:
+                await metro_api.fetch_departures("WTL", 1, client=client)
+            except Exception:
+                pass
+            timebase.check()
+            if fetched[0] is None:
+                fetched[0] = clock.wall() - start
+            # How far out a frame drawn now would be.
+            error = abs(timebase.now_ms() / 1000 - clock.wall())
+            errors.append(error)
+            if first[0] is None and error < 2:
+                first[0] = clock.wall() - start
+            await uasyncio.sleep(30)
+        task.cancel()
+        await client.close()
+
+    with StandInServer(times=emulator.live_times(clock, skew=server_skew), clock=clock, skew=server_skew) as server:
+        uasyncio.run(scenario(server))
+
+    worst = max(errors[len(errors) // 2:])
+    if server_skew:
+        # Within what we'd overrule NTP for, so NTP is kept.
+        assert timebase.source == "ntp" and worst < 2, worst
+    elif ntp_skew:
+        # Overruled once enough fetches agree, 30 s apart.
+        assert first[0] is not None and first[0] <= fetched[0] + 30 * (DISAGREE_SAMPLES - 1) + 1, first[0]
+        assert timebase.source == "api" and worst < 2, worst
+    else:
+        assert first[0] == fetched[0] and worst < 2, (first[0], worst)
@@ -0,0 +1,52 @@
+import time
+
+
+def test_trains_move_between_fetches(emulation):
+    # Imported here, so it picks up the emulator's clock.
+    from compositor import Layer
+    from positions import PositionTable
+    from tracking import RECONCILE_MS, TrainTracker
+
+    num_leds = 96
+    positions = PositionTable(num_leds, 1)
+    layer = Layer(num_leds)
+
+    def lit():
+        return [i for i in range(num_leds) if any(layer.get(i))]
+
+    tracker = TrainTracker()
+    now = time.time()
+    tracker.update([now + 30, now + 400], now, (255, 0, 0), time.ticks_ms())
+    tracker.draw(layer, positions, time.ticks_ms())
+    both = lit()
+
+    # The first train pulses as it arrives, quicker the closer it gets...
+    def levels(seconds):
+        seen = set()
+        for _ in range(seconds * 50):
+            time.sleep_ms(20)
+            tracker.draw(layer, positions, time.ticks_ms())
+            seen.add(max(layer.get(both[0])))
+        return seen
+
+    assert tracker.due(time.ticks_ms())
+    assert len(levels(2)) > 10
+    # ...then goes, with no fetch in between.
+    time.sleep(30)
+    assert tracker.due(time.ticks_ms())
+    tracker.draw(layer, positions, time.ticks_ms())
+    assert lit() and set(lit()) < set(both), (lit(), both)
+    later = lit()
+    time.sleep(5)
+    assert not tracker.due(time.ticks_ms())
+
+    # A changed prediction eases across, rather than jumping.
+    now = time.time()
+    tracker.update([now + 340 + 300], now, (255, 0, 0), time.ticks_ms())
+    seen = set()
+    while tracker.due(time.ticks_ms()):
+        tracker.draw(layer, positions, time.ticks_ms())
+        seen.add(tuple(lit()))
+        time.sleep_ms(100)
+    assert len(seen) > 4 and lit() != later, seen
+    assert time.ticks_diff(time.ticks_ms(), tracker._ticks) <= RECONCILE_MS + 100
@@ -0,0 +1,357 @@
+"""Wall time for the clock, kept by time.ticks_ms() and corrected by NTP.
+
+Setting the RTC from NTP once at boot and trusting it from then on leaves
+the time drifting for as long as the board stays up, and one NTP failure at
+boot leaves it wrong for good. A Timebase instead anchors UTC to
+time.ticks_ms(), resyncs with NTP from a background task on a schedule, and
+learns how fast the board's crystal runs so the time stays close between
+syncs. Reading the time is only arithmetic: nothing that draws a frame
+waits on the network, and the NTP exchange itself is awaited on a
+non-blocking socket rather than blocking the loop as ntptime.time() does.
+
+If NTP can't be reached, or gives a time the Metro API's server disagrees
+with, the time is taken from the API's responses instead (see timesource.py),
+so the first frame doesn't wait on NTP to be right.
+
+UK local time comes from a table of when BST starts and ends, worked out
+once at import, rather than from date arithmetic on every call.
+"""
+
+import errno
+import struct
+import time
+
+try:
+    import uasyncio
+except ImportError:
+    import asyncio as uasyncio
+
+from isotime import days_since_epoch
+
+
+# Seconds to wait for NTP to answer, and between looks for its reply.
+NTP_TIMEOUT = 2
+NTP_POLL = 0.05
+NTP_PORT = 123
+# Seconds from 1900, where NTP counts from, to the epoch time.time() counts
+# from: 1970, or 2000 on older MicroPython ports.
+NTP_DELTA = 3155673600 if time.gmtime(0)[0] == 2000 else 2208988800
+
+# Seconds between NTP resyncs once synced...
+RESYNC = 6 * 60 * 60
+# ...and before the first retry after a failure, doubling up to RESYNC.
+RETRY = 30
+# Shortest span between syncs that drift is worked out over. NTP gives whole
+# seconds, so shorter spans say more about rounding than about the crystal.
+DRIFT_SPAN = 60 * 60
+# Largest drift believed, in parts per million.
+DRIFT_MAX = 1000
+# Milliseconds the API's time can differ from ours before we take it, when
+# NTP hasn't given us the time...
+ADOPT_MS = 1500
+# ...and when it has, so NTP is overruled only when it's clearly wrong, and
+# by at least this many readings.
+DISAGREE_MS = 30000
+DISAGREE_SAMPLES = 3
+# Milliseconds after which the anchor is moved on, well inside the ±6 days
+# time.ticks_diff() can measure.
+REBASE_MS = 24 * 60 * 60 * 1000
+
+# Years the BST table covers.
+DST_YEARS = (2024, 2050)
+
+
+def _last_sunday(year, month):
+    """Days since the epoch of the last Sunday of a 31-day month."""
+
+    days = days_since_epoch(year, month, 31)
+    # The epoch's weekday, Monday = 0, as time.gmtime() numbers them.
+    return days - (days + time.gmtime(0)[6] + 1) % 7
+
+
+def _dst_table(first, last):
+    """BST starts and ends, in UTC seconds, in order: 01:00 UTC on the last
+    Sundays of March and October."""
+
+    table = []
+    for year in range(first, last + 1):
+        table.append(_last_sunday(year, 3) * 86400 + 3600)
+        table.append(_last_sunday(year, 10) * 86400 + 3600)
+    return table
+
+
+DST_CHANGES = _dst_table(*DST_YEARS)
+
+
+def uk_offset(utc):
+    """Seconds UK local time is ahead of UTC at a time: 3600 in BST, else 0."""
+
+    # Even entries start BST, odd ones end it, so count how many have passed.
+    lo = 0
+    hi = len(DST_CHANGES)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if DST_CHANGES[mid] <= utc:
+            lo = mid + 1
+        else:
+            hi = mid
+    return 3600 if lo % 2 else 0
+
+
+# The NTP server's address. Looking it up blocks, so it's kept, and only
+# looked up again after a query fails.
+_ntp_addr = None
+
+
+async def ntp_time():
+    """NTP time in seconds, from ntptime.host.
+
+    The same SNTP exchange as ntptime.time(), but on a non-blocking socket,
+    looked at every NTP_POLL seconds, so other tasks run while the reply is
+    on its way. It waits for as long as that takes: bound it with
+    uasyncio.wait_for().
+    """
+
+    global _ntp_addr
+    import ntptime
+    import socket
+
+    if _ntp_addr is None:
+        _ntp_addr = socket.getaddrinfo(ntptime.host, NTP_PORT)[0][-1]
+    query = bytearray(48)
+    # Version 3, from a client.
+    query[0] = 0x1B
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    reply = None
+    try:
+        sock.setblocking(False)
+        sock.sendto(query, _ntp_addr)
+        while reply is None:
+            try:
+                reply = sock.recv(48)
+            except OSError as e:
+                if e.args[0] != errno.EAGAIN:
+                    raise
+                await uasyncio.sleep(NTP_POLL)
+    finally:
+        sock.close()
+        if reply is None:
+            # Failed or given up on; the pool may hand out another server.
+            _ntp_addr = None
+    return struct.unpack("!I", reply[40:44])[0] - NTP_DELTA
+
+
+def _set_rtc(utc):
+    from machine import RTC
+
+    year, month, day, hour, minute, second, weekday = time.gmtime(utc)[:7]
+    RTC().datetime((year, month, day, weekday, hour, minute, second, 0))
+
+
+class Timebase:
+    """UTC and UK local time, anchored to time.ticks_ms().
+
+    Until the first sync, the time is whatever the RTC says. Await sync() to
+    try NTP now, or run() as a task to keep syncing in the background.
+
+    Args:
+        resync: Seconds between syncs.
+        retry: Seconds before retrying a failed sync, doubling each time.
+        query: Async function returning NTP time in seconds; ntp_time() by
+            default, looked up when called.
+        timeout: Seconds to wait for the query before giving up on it.
+        set_rtc: Function setting the RTC to a UTC time after each sync, so
+            code reading time.time() agrees; None to leave the RTC alone.
+        server: A timesource.ServerClock to fall back on, or None.
+    """
+
+    def __init__(self, resync=RESYNC, retry=RETRY, query=None, timeout=NTP_TIMEOUT, set_rtc=_set_rtc, server=None):
+        self.resync = resync
+        self.retry = retry
+        self._query = query
+        self.timeout = timeout
+        self._set_rtc = set_rtc
+        self.server = server
+        # Where the time last came from: "rtc", "ntp" or "api".
+        self.source = "rtc"
+
+        # UTC in milliseconds at _ticks; None until the first sync.
+        self._wall_ms = None
+        self._ticks = 0
+        # How fast ticks run against true time, in parts per million, and
+        # how many syncs that's been worked out from.
+        self.drift_ppm = 0
+        self._drift_samples = 0
+        # The last sync: true time then, and raw ticks counted since.
+        self._synced_ms = None
+        self._raw_since = 0
+        # time.ticks_ms() at the last NTP sync, or None before one.
+        self._synced_ticks = None
+
+        self.syncs = 0
+        # Failed syncs in a row.
+        self.failures = 0
+        # Seconds our time was out by at the last sync.
+        self.error = None
+
+    def synced(self):
+        return self._wall_ms is not None
+
+    def _anchor(self, utc_ms, ticks, source):
+        self._wall_ms = utc_ms
+        self._ticks = ticks
+        self.source = source
+        if self._set_rtc is not None:
+            self._set_rtc(utc_ms // 1000)
+
+    def _elapsed_ms(self, ticks):
+        """Raw ticks since the anchor, and the same corrected for drift."""
+
+        raw = time.ticks_diff(ticks, self._ticks)
+        return raw, raw - raw * self.drift_ppm // 1000000
+
+    def now_ms(self):
+        """UTC now, in milliseconds since the epoch."""
+
+        if self._wall_ms is None:
+            return time.time() * 1000
+        ticks = time.ticks_ms()
+        raw, elapsed = self._elapsed_ms(ticks)
+        if raw > REBASE_MS:
+            self._wall_ms += elapsed
+            self._ticks = ticks
+            self._raw_since += raw
+            return self._wall_ms
+        return self._wall_ms + elapsed
+
+    def now(self):
+        """UTC now, in seconds since the epoch."""
+
+        return self.now_ms() // 1000
+
+    def local(self, utc=None):
+        """UK local time, in seconds since the epoch; now if utc is None."""
+
+        if utc is None:
+            utc = self.now()
+        return utc + uk_offset(utc)
+
+    def localtime(self):
+        """UK local time as a time.gmtime() tuple."""
+
+        return time.gmtime(self.local())
+
+    def _learn_drift(self, true_ms, ticks):
+        if self._synced_ms is None:
+            return
+        raw = self._raw_since + time.ticks_diff(ticks, self._ticks)
+        span = true_ms - self._synced_ms
+        if span < DRIFT_SPAN * 1000:
+            return
+        measured = (raw - span) * 1000000 // span
+        if -DRIFT_MAX <= measured <= DRIFT_MAX:
+            # Averaged with what we had, to smooth out NTP's rounding.
+            if self._drift_samples:
+                measured = (self.drift_ppm + measured) // 2
+            self.drift_ppm = measured
+            self._drift_samples += 1
+
+    async def sync(self):
+        """Ask NTP for the time once, and take it if it answers within
+        `timeout` seconds.
+
+        Returns:
+            True if the time was synced.
+        """
+
+        query = self._query or ntp_time
+        try:
+            true = await uasyncio.wait_for(query(), self.timeout)
+        except uasyncio.TimeoutError:
+            self.failures += 1
+            print(f"NTP sync failed: no answer in {self.timeout} s")
+            return False
+        except Exception as e:
+            self.failures += 1
+            print(f"NTP sync failed: {e}")
+            return False
+
+        ticks = time.ticks_ms()
+        true_ms = true * 1000
+        if self.server is not None and len(self.server) >= DISAGREE_SAMPLES:
+            api_ms = self.server.now_ms(ticks)
+            if abs(true_ms - api_ms) > DISAGREE_MS:
+                self.failures += 1
+                print(f"NTP disagrees with the API by {(true_ms - api_ms) // 1000} s; ignoring it")
+                return False
+        if self._wall_ms is not None:
+            self.error = (self.now_ms() - true_ms) / 1000
+            if self.source == "ntp":
+                self._learn_drift(true_ms, ticks)
+        self._anchor(true_ms, ticks, "ntp")
+        self._synced_ms = true_ms
+        self._synced_ticks = ticks
+        self._raw_since = 0
+        self.syncs += 1
+        self.failures = 0
+        return True
+
+    def check(self):
+        """Compare our time with the API server's, and take the server's
+        if NTP hasn't set ours, or has set it wrong.
+
+        Call after each fetch. Returns True if the time was changed.
+        """
+
+        if self.server is None:
+            return False
+        ticks = time.ticks_ms()
+        api_ms = self.server.now_ms(ticks)
+        if api_ms is None:
+            return False
+        off = self.now_ms() - api_ms
+        if self.source == "ntp":
+            if abs(off) <= DISAGREE_MS or len(self.server) < DISAGREE_SAMPLES:
+                return False
+        elif abs(off) <= ADOPT_MS:
+            return False
+        print(f"Taking the time from the API, {off // 1000} s from ours")
+        self.error = off / 1000
+        self._anchor(api_ms, ticks, "api")
+        # Drift is only worked out between NTP syncs.
+        self._synced_ms = None
+        return True
+
+    async def run(self, radio=None, link_wait=20):
+        """Keep syncing: at once, then every `resync` seconds, retrying
+        failures sooner. If the last sync worked and was under `resync`
+        seconds ago, as after a sync at boot, the first waits until it's due.
+
+        With a radio (a NetworkManager), each sync acquires the link first,
+        waiting up to `link_wait` seconds for it, and releases it after.
+        """
+
+        if self.failures == 0 and self._synced_ticks is not None:
+            since = time.ticks_diff(time.ticks_ms(), self._synced_ticks) // 1000
+            # Negative once ticks_ms() has wrapped, after days asleep.
+            if 0 <= since < self.resync:
+                await uasyncio.sleep(self.resync - since)
+        while True:
+            if radio is not None:
+                try:
+                    await uasyncio.wait_for(radio.acquire(), link_wait)
+                except uasyncio.TimeoutError:
+                    pass
+            if await self.sync():
+                delay = self.resync
+            else:
+                delay = min(self.resync, self.retry * 2 ** min(self.failures - 1, 10))
+            if radio is not None:
+                # Syncs are rare; the fetches say when the radio's next wanted.
+                radio.release()
+            await uasyncio.sleep(delay)
+
+    def report(self):
+        error = "n/a" if self.error is None else f"{self.error:+.1f} s"
+        return (f"from {self.source}, {self.syncs} syncs, {self.failures} failing, "
+                f"last error {error}, drift {self.drift_ppm} ppm")
@@ -0,0 +1,136 @@
+"""Read the time off the Metro API's own responses.
+
+If NTP is blocked or slow at boot, the RTC can be hours out, and every train
+with it. But each departures response carries fresh readings of the
+server's clock: the HTTP Date header, stamped as the response is made, and
+the trains' lastEventTime values, which can't be later than it. ServerClock
+collects these. It corrects each Date reading for the request's round trip
+by taking it as the time halfway through, and keeps the median of the last
+few, so one slow or odd response doesn't move it.
+
+Readings are kept against time.ticks_ms(), not the wall clock, so they stay
+good whatever the wall clock is doing.
+"""
+
+import time
+
+from isotime import http_date_to_epoch
+
+
+# Date readings kept for the median.
+SAMPLES = 9
+# Readings from requests slower than this, in ms, are too vague to keep:
+# the response could have been stamped anywhere in the round trip.
+MAX_RTT_MS = 5000
+# Readings older than this, in ms, are dropped, well inside the ±6 days
+# time.ticks_diff() can measure.
+MAX_AGE_MS = 24 * 60 * 60 * 1000
+
+
+def ticks_ms():
+    """time.ticks_ms(), looked up at call time so the emulator's is used.
+
+    The network code also runs under plain CPython (see benchmark.py), which
+    has no ticks functions; there, milliseconds of time.monotonic() stand
+    in, as all that matters is that readings agree with each other.
+    """
+
+    if hasattr(time, "ticks_ms"):
+        return time.ticks_ms()
+    return int(time.monotonic() * 1000)
+
+
+def ticks_diff(end, start):
+    """time.ticks_diff(), or plain subtraction alongside ticks_ms()'s stand-in."""
+
+    if hasattr(time, "ticks_diff"):
+        return time.ticks_diff(end, start)
+    return end - start
+
+
+class ServerClock:
+    """An estimate of the API server's time, from its responses.
+
+    Args:
+        size: Date readings to take the median of.
+        max_rtt_ms: Slowest round trip, in ms, to take a reading from.
+    """
+
+    def __init__(self, size=SAMPLES, max_rtt_ms=MAX_RTT_MS):
+        self.size = size
+        self.max_rtt_ms = max_rtt_ms
+        # (server time in ms, ticks_ms() then) for each Date reading...
+        self._samples = []
+        # ...and for the latest lastEventTime, a lower bound.
+        self._event = None
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, server, sent, received):
+        """Take a reading of the server's clock.
+
+        Args:
+            server: The server's time, in whole epoch seconds.
+            sent: ticks_ms() as the request went.
+            received: ticks_ms() as the response arrived.
+
+        Returns:
+            Whether the reading was kept.
+        """
+
+        rtt = ticks_diff(received, sent)
+        if rtt < 0 or rtt > self.max_rtt_ms:
+            return False
+        # Dates are truncated to the second, so on average half a second on.
+        self._samples.append((server * 1000 + 500, sent + rtt // 2))
+        if len(self._samples) > self.size:
+            self._samples.pop(0)
+        return True
+
+    def add_date(self, date, sent, received):
+        """Take a reading from an HTTP Date header; see add()."""
+
+        server = http_date_to_epoch(date) if date else None
+        if server is None:
+            return False
+        return self.add(server, sent, received)
+
+    def add_event(self, event, received):
+        """Note a lastEventTime, in epoch seconds, seen in a response
+        arriving at ticks_ms() `received`."""
+
+        if event is None:
+            return
+        if self._event is None or event * 1000 > self._project(self._event, received):
+            self._event = (event * 1000, received)
+
+    @staticmethod
+    def _project(reading, ticks):
+        server_ms, then = reading
+        return server_ms + ticks_diff(ticks, then)
+
+    def now_ms(self, ticks=None):
+        """The server's time now, in epoch milliseconds, or None if there
+        have been no readings.
+
+        Args:
+            ticks: ticks_ms() now; read if None.
+        """
+
+        if ticks is None:
+            ticks = ticks_ms()
+        self._samples = [s for s in self._samples if ticks_diff(ticks, s[1]) < MAX_AGE_MS]
+        if self._event is not None and ticks_diff(ticks, self._event[1]) >= MAX_AGE_MS:
+            self._event = None
+
+        estimate = None
+        if self._samples:
+            estimates = sorted(self._project(s, ticks) for s in self._samples)
+            estimate = estimates[len(estimates) // 2]
+        if self._event is not None:
+            # The server can't be behind an event it has already reported.
+            bound = self._project(self._event, ticks)
+            if estimate is None or bound > estimate:
+                estimate = bound
+        return estimate
@@ -0,0 +1,161 @@
+"""Keep the trains on the ring moving between departure fetches.
+
+Fetches come minutes apart, and between them the display used to sit still:
+a train that had left stayed lit until the next fetch, and when predictions
+changed the train jumped to its new place. TrainTracker keeps each train's
+predicted time and works the display out afresh every frame, against a clock
+that runs on from the last fetch by time.ticks_ms(). Trains drop off as they
+leave, ease across to their new predictions over a few seconds when a fetch
+changes them, and pulse, faster as they get closer, once they're nearly due.
+
+Times are whole seconds since the epoch and ticks are milliseconds, all
+integers: the board's floats can't hold an epoch time to the second.
+"""
+
+import time
+
+from effects import Pulse
+
+
+# Milliseconds taken to ease a train to a changed prediction.
+RECONCILE_MS = 3000
+# Furthest, in seconds, a prediction can move and still be taken for the
+# same train.
+MATCH = 300
+# Trains due within this many seconds pulse...
+URGENT = 120
+# ...once every this many milliseconds when they first become urgent, and
+# speeding up to this as they arrive.
+PULSE_SLOW_MS = 2000
+PULSE_FAST_MS = 400
+
+# Brightness through one pulse: never fully off, so the train stays put.
+_PULSE = Pulse(64, low=96, high=255)
+
+
+class TrainTracker:
+    """The trains being shown, worked out from the latest predictions.
+
+    Call update() with each fetch's train times, then draw() a frame at a
+    time; due() says whether a frame would look any different from the
+    last.
+
+    Args:
+        reconcile_ms: Milliseconds to ease a train to a changed prediction.
+        urgent: Seconds before a train is due that it starts to pulse.
+    """
+
+    def __init__(self, reconcile_ms=RECONCILE_MS, urgent=URGENT):
+        self.reconcile_ms = reconcile_ms
+        self.urgent = urgent
+        # Predicted times, and where each train was drawn when they came in.
+        self.times = []
+        self._from = []
+        self.colour = (0, 0, 0)
+        self.colours = None
+        # Wall time of the last update, and time.ticks_ms() then.
+        self._wall = 0
+        self._ticks = 0
+        # When the first train drawn last frame is due to leave.
+        self._leaves = None
+
+    def now(self, ticks):
+        """The wall time, in seconds, run on from the last update."""
+
+        return self._wall + time.ticks_diff(ticks, self._ticks) // 1000
+
+    def _progress(self, ticks):
+        """How far through easing to the latest predictions, 0-256."""
+
+        elapsed = time.ticks_diff(ticks, self._ticks)
+        if elapsed >= self.reconcile_ms:
+            return 256
+        f = elapsed * 256 // self.reconcile_ms
+        # Ease in and out, so trains don't lurch.
+        return f * f * (768 - 2 * f) >> 16
+
+    def shown(self, ticks):
+        """Times each train is drawn at, part way to its prediction."""
+
+        f = self._progress(ticks)
+        if f == 256:
+            return self.times
+        return [start + ((end - start) * f >> 8) for start, end in zip(self._from, self.times)]
+
+    def update(self, times, now, colour, ticks, colours=None):
+        """Take new predicted train times.
+
+        Each is matched, in order, to a train already shown within MATCH
+        seconds of it, which moves across to it rather than jumping;
+        unmatched times appear in place.
+
+        Args:
+            times: Train times, in seconds since the epoch, sorted.
+            now: The wall time, in seconds since the epoch.
+            colour: (r, g, b) to draw the trains in.
+            ticks: time.ticks_ms() at `now`.
+            colours: Optional (r, g, b) for each train, instead of colour.
+        """
+
+        # Trains drawn as already gone have left, whatever comes in now.
+        shown = [t for t in self.shown(ticks) if t >= now]
+        starts = []
+        j = 0
+        for t in times:
+            # Trains keep their order, so walk both lists together.
+            while j < len(shown) and shown[j] < t - MATCH:
+                j += 1
+            if j < len(shown) and shown[j] <= t + MATCH:
+                starts.append(shown[j])
+                j += 1
+            else:
+                starts.append(t)
+        self.times = list(times)
+        self._from = starts
+        self.colour = colour
+        self.colours = colours
+        self._wall = now
+        self._ticks = ticks
+
+    def due(self, ticks):
+        """Whether the next frame would differ: trains easing, pulsing, or
+        just gone."""
+
+        if time.ticks_diff(ticks, self._ticks) < self.reconcile_ms and self._from != self.times:
+            return True
+        now = self.now(ticks)
+        if self._leaves is not None and now > self._leaves:
+            return True
+        for t in self.times:
+            if 0 <= t - now <= self.urgent:
+                return True
+        return False
+
+    def draw(self, layer, positions, ticks):
+        """Draw the trains into a Layer, as of `ticks`.
+
+        Args:
+            layer: The Layer (or any Canvas) to draw into; it's cleared first.
+            positions: PositionTable to place the trains with.
+            ticks: time.ticks_ms() now.
+        """
+
+        now = self.now(ticks)
+        r, g, b = self.colour
+        layer.clear()
+        self._leaves = None
+        for i, t in enumerate(self.shown(ticks)):
+            wait = t - now
+            if wait < 0:
+                continue
+            if self.colours is not None:
+                r, g, b = self.colours[i]
+            if self._leaves is None:
+                self._leaves = t
+            position, weight = positions.lookup(t)
+            if wait <= self.urgent:
+                period = PULSE_FAST_MS + (PULSE_SLOW_MS - PULSE_FAST_MS) * wait // self.urgent
+                level = _PULSE.at(ticks % period * 256 // period) + 1
+                layer.draw_between(position, weight, r * level >> 8, g * level >> 8, b * level >> 8)
+            else:
+                layer.draw_between(position, weight, r, g, b)